@@ -0,0 +1,169 @@
+#----------------------------------------------------------------------------#
+# Non-blocking JSON logging.
+#----------------------------------------------------------------------------#
+import atexit
+import copy
+import json
+import logging
+import queue
+import random
+import time
+import traceback
+import uuid
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+
+from flask import g, has_request_context, request
+from flask.logging import default_handler
+
+# Attributes every LogRecord has; anything else on a record came in through `extra`.
+RECORD_ATTRIBUTES = frozenset(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with `extra` fields at the top level"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.utcfromtimestamp(record.created).isoformat() + 'Z',
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in RECORD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = exception_fields(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def exception_fields(exc_info):
+    exc_type, exc_value, exc_traceback = exc_info
+    return {
+        'type': exc_type.__name__,
+        'message': str(exc_value),
+        'traceback': ''.join(traceback.format_exception(exc_type, exc_value, exc_traceback)),
+    }
+
+
+class RequestContextFilter(logging.Filter):
+    """Stamp records logged while handling a request with its id and route"""
+
+    def filter(self, record):
+        if has_request_context():
+            record.request_id = getattr(g, 'request_id', None)
+            record.route = request.endpoint
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only a fraction of the records logged with `extra={'sampled': True}`"""
+
+    def __init__(self, rate):
+        super(SamplingFilter, self).__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if getattr(record, 'sampled', False):
+            return random.random() < self.rate
+        return True
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Hands records to the listener thread and drops them when the queue is full.
+
+    A request thread never waits on the log file: formatting the exception is the only
+    work done here, because the traceback cannot be read once the record leaves.
+    """
+
+    def __init__(self, log_queue):
+        super(NonBlockingQueueHandler, self).__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exception = exception_fields(record.exc_info)
+            record.exc_info = None
+            record.exc_text = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class RequestLogger(object):
+    """Request ids, sampled access logs and a queue-backed JSON log file"""
+
+    def __init__(self, app=None):
+        self.handler = None
+        self.listener = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('LOG_FILE', 'error.log')
+        app.config.setdefault('LOG_LEVEL', 'INFO')
+        app.config.setdefault('LOG_QUEUE_SIZE', 10000)
+        app.config.setdefault('LOG_REQUEST_SAMPLE_RATE', 0.05)
+        app.config.setdefault('LOG_SLOW_REQUEST_MS', 500)
+        self.slow_request_ms = app.config['LOG_SLOW_REQUEST_MS']
+
+        file_handler = logging.FileHandler(app.config['LOG_FILE'])
+        file_handler.setFormatter(JsonFormatter())
+        self.handler = NonBlockingQueueHandler(queue.Queue(app.config['LOG_QUEUE_SIZE']))
+        self.handler.addFilter(RequestContextFilter())
+        self.handler.addFilter(SamplingFilter(app.config['LOG_REQUEST_SAMPLE_RATE']))
+        self.listener = QueueListener(self.handler.queue, file_handler)
+        self.listener.start()
+        atexit.register(self.listener.stop)
+
+        if not app.debug:
+            # Flask's default handler writes to stderr synchronously.
+            app.logger.removeHandler(default_handler)
+        app.logger.setLevel(app.config['LOG_LEVEL'])
+        app.logger.addHandler(self.handler)
+
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+        self.logger = app.logger
+        app.extensions['applog'] = self
+
+    def after_fork(self):
+        """Restart the listener in a forked worker: threads do not survive fork()"""
+        self.handler.queue = queue.Queue(self.handler.queue.maxsize)
+        self.listener = QueueListener(self.handler.queue, *self.listener.handlers)
+        self.listener.start()
+        atexit.register(self.listener.stop)
+
+    def before_request(self):
+        g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+        g.log_started = time.perf_counter()
+
+    def after_request(self, response):
+        started = getattr(g, 'log_started', None)
+        if started is None:
+            return response
+
+        latency_ms = (time.perf_counter() - started) * 1000
+        # Slow and failed requests are always logged; the rest are sampled.
+        self.logger.info(
+            '%s %s %s',
+            request.method,
+            request.path,
+            response.status_code,
+            extra={
+                'status': response.status_code,
+                'latency_ms': round(latency_ms, 3),
+                'db_queries': getattr(g, 'db_queries', None),
+                'db_ms': round(getattr(g, 'db_time', 0.0) * 1000, 3),
+                'sampled': (latency_ms < self.slow_request_ms and response.status_code < 500),
+            })
+        response.headers['X-Request-ID'] = g.request_id
+        return response
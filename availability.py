@@ -0,0 +1,192 @@
+#----------------------------------------------------------------------------#
+# Recurring artist availability.
+#----------------------------------------------------------------------------#
+#  An artist available "every Friday evening" is stored as one rule, an RRULE with a
+#  start date, a time window and exception dates, rather than one row per date. Rules
+#  are only expanded over the window a request asks about, and the expansions are
+#  cached per (artist, window) until the artist changes.
+import re
+from collections import namedtuple, OrderedDict
+from datetime import datetime
+
+from dateutil import rrule as rrules
+
+import search_cache
+from models import Artist, ArtistAvailabilityRule
+
+FREQUENCIES = ('WEEKLY', 'MONTHLY')
+
+# Rule parts a window of whole days can be built from; the times come from the rule's
+# own time_from and time_to.
+PARTS = ('FREQ', 'INTERVAL', 'UNTIL', 'COUNT', 'BYDAY', 'BYMONTHDAY', 'BYMONTH', 'BYSETPOS', 'WKST')
+
+DAY_NAMES = {
+    'MO': 'Monday',
+    'TU': 'Tuesday',
+    'WE': 'Wednesday',
+    'TH': 'Thursday',
+    'FR': 'Friday',
+    'SA': 'Saturday',
+    'SU': 'Sunday',
+}
+
+ORDINALS = {1: '1st', 2: '2nd', 3: '3rd', 4: '4th', 5: '5th', -1: 'last', -2: 'second to last'}
+
+Rule = namedtuple('Rule', 'id artist_id rrule dtstart time_from time_to exdates')
+
+Occurrence = namedtuple('Occurrence', 'date time_from time_to rule_id')
+
+
+def rule_parts(text):
+    """Split "FREQ=WEEKLY;BYDAY=FR" into an ordered {part: value}, raising ValueError"""
+    text = (text or '').strip().upper()
+    if text.startswith('RRULE:'):
+        text = text[len('RRULE:'):]
+    parts = OrderedDict()
+    for item in filter(None, text.split(';')):
+        name, separator, value = item.partition('=')
+        if not separator or not value or name not in PARTS or name in parts:
+            raise ValueError('unsupported rule part: ' + item)
+        parts[name] = value
+    if parts.get('FREQ') not in FREQUENCIES:
+        raise ValueError('FREQ must be one of ' + ', '.join(FREQUENCIES))
+    if 'UNTIL' in parts:
+        # Availability is in local time, like show start times.
+        parts['UNTIL'] = parts['UNTIL'].rstrip('Z')
+    return parts
+
+
+def normalize_rrule(text, dtstart):
+    """The canonical form of an RRULE, raising ValueError when it cannot be expanded"""
+    rrule = ';'.join('{}={}'.format(name, value) for name, value in rule_parts(text).items())
+    rrules.rrulestr(rrule, dtstart=datetime.combine(dtstart, datetime.min.time()))
+    return rrule
+
+
+def parse_exdates(exdates):
+    if not exdates:
+        return frozenset()
+    return frozenset(
+        datetime.strptime(value.strip().replace('/', '-'), '%Y-%m-%d').date()
+        for value in exdates.split(','))
+
+
+def format_exdates(values):
+    """Store exception dates, given as dates or YYYY-MM-DD strings, in a rule's exdates"""
+    dates = parse_exdates(','.join(str(value) for value in values))
+    return ','.join(sorted(value.isoformat() for value in dates)) or None
+
+
+def expand(rule, start, end):
+    """Yield the occurrences of `rule` on the days from `start` to `end`, both included"""
+    exdates = parse_exdates(rule.exdates)
+    recurrence = rrules.rrulestr(rule.rrule,
+                                 dtstart=datetime.combine(rule.dtstart, datetime.min.time()))
+    for occurrence in recurrence.between(datetime.combine(start, datetime.min.time()),
+                                         datetime.combine(end, datetime.min.time()),
+                                         inc=True):
+        if occurrence.date() not in exdates:
+            yield Occurrence(occurrence.date(), rule.time_from, rule.time_to, rule.id)
+
+
+def describe_day(value):
+    match = re.match(r'^([+-]?\d+)?([A-Z]{2})$', value)
+    if match is None:
+        return value
+    ordinal, day = match.groups()
+    name = DAY_NAMES.get(day, day)
+    if ordinal is None:
+        return name
+    return '{} {}'.format(ORDINALS.get(int(ordinal), ordinal), name)
+
+
+def describe(rrule):
+    """A rule in words, e.g. "Every 2 weeks on Friday until 2027/10/19" """
+    parts = rule_parts(rrule)
+    interval = int(parts.get('INTERVAL', 1))
+    unit = 'week' if parts['FREQ'] == 'WEEKLY' else 'month'
+    text = 'Every ' + (unit if interval == 1 else '{} {}s'.format(interval, unit))
+    if 'BYDAY' in parts:
+        text += ' on ' + ', '.join(describe_day(day) for day in parts['BYDAY'].split(','))
+    if 'BYMONTHDAY' in parts:
+        text += ' on day ' + parts['BYMONTHDAY'].replace(',', ', ')
+    if 'UNTIL' in parts:
+        until = datetime.strptime(parts['UNTIL'][:8], '%Y%m%d')
+        text += ' until ' + until.strftime('%Y/%m/%d')
+    if 'COUNT' in parts:
+        text += ', {} times'.format(parts['COUNT'])
+    return text
+
+
+# Namespaced per artist, so an artist's changes invalidate its expansions alone.
+expansions = search_cache.SearchCache(max_entries=4096, ttl=300)
+
+
+def init_app(app):
+    expansions.max_entries = app.config['AVAILABILITY_CACHE_SIZE']
+    expansions.ttl = app.config['AVAILABILITY_CACHE_TTL']
+    metrics = app.extensions.get('metrics')
+    if metrics is not None:
+        metrics.register_cache('availability', lambda: (expansions.hits, expansions.misses))
+
+
+def load_rules(artist_ids):
+    """Artist id -> its rules, for those of `artist_ids` seeking venues"""
+    rules = {}
+    query = ArtistAvailabilityRule.query.join(Artist).with_entities(
+        ArtistAvailabilityRule.id, ArtistAvailabilityRule.artist_id, ArtistAvailabilityRule.rrule,
+        ArtistAvailabilityRule.dtstart, ArtistAvailabilityRule.time_from,
+        ArtistAvailabilityRule.time_to,
+        ArtistAvailabilityRule.exdates).filter(Artist.seeking_venue == True,
+                                               ArtistAvailabilityRule.artist_id.in_(artist_ids))
+    for row in query:
+        rules.setdefault(row.artist_id, []).append(Rule(*row))
+    return rules
+
+
+def occurrences(windows):
+    """{artist_id: (start, end)} -> {artist_id: (Occurrence, ...)} sorted by date and time.
+
+    Only the rules of artists seeking venues count. Cached windows are served without a
+    query; the rules of all the others are loaded together.
+    """
+    results = {}
+    missing = {}
+    generations = {}
+    for artist_id, window in windows.items():
+        cached, generations[artist_id] = expansions.get(artist_id, window)
+        if cached is None:
+            missing[artist_id] = window
+        else:
+            results[artist_id] = cached
+
+    if missing:
+        rules = load_rules(list(missing))
+        for artist_id, (start, end) in missing.items():
+            expanded = tuple(
+                sorted(occurrence for rule in rules.get(artist_id, ())
+                       for occurrence in expand(rule, start, end)))
+            expansions.set(artist_id, (start, end), expanded, generations[artist_id])
+            results[artist_id] = expanded
+    return results
+
+
+def covers(artist_occurrences, start_time):
+    """Whether one of an artist's occurrences includes the datetime `start_time`"""
+    return any(occurrence.date == start_time.date() and
+               occurrence.time_from <= start_time.time() <= occurrence.time_to
+               for occurrence in artist_occurrences)
+
+
+def is_available(artist_id, start_time):
+    day = start_time.date()
+    return covers(occurrences({artist_id: (day, day)}).get(artist_id, ()), start_time)
+
+
+def serialize_occurrence(occurrence):
+    return {
+        'date': occurrence.date.strftime("%Y/%m/%d"),
+        'time_from': occurrence.time_from.strftime("%H:%M"),
+        'time_to': occurrence.time_to.strftime("%H:%M"),
+        'rule_id': occurrence.rule_id,
+    }
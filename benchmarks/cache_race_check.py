@@ -0,0 +1,218 @@
+"""Check that the caches never keep a result computed before an invalidation.
+
+    python benchmarks/cache_race_check.py [--threads 8] [--writes 2000]
+
+Interleaves loads with invalidations, first step by step and then from competing
+threads, and exits non-zero when a stale result is still served once the writes have
+stopped. The identity cache reads from a dict standing in for the database.
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import identity  # noqa: E402
+import search_cache  # noqa: E402
+
+
+def check_search_cache_steps():
+    cache = search_cache.SearchCache()
+    # Looked up and computed before a write commits, stored after its invalidation.
+    _, generation = cache.get('venues', 'jazz')
+    cache.invalidate('venues')
+    cache.set('venues', 'jazz', 'before the write', generation)
+    cached, generation = cache.get('venues', 'jazz')
+    if cached is not None:
+        return 'a result computed before the invalidation was stored under the new generation'
+
+    cache.set('venues', 'jazz', 'after the write', generation)
+    if cache.get('venues', 'jazz')[0] != 'after the write':
+        return 'a result computed after the invalidation was not stored'
+
+
+def check_search_cache_threads(threads, writes, seed):
+    cache = search_cache.SearchCache(max_entries=64, ttl=3600)
+    version = [0]
+    done = threading.Event()
+
+    def write():
+        for _ in range(writes):
+            version[0] += 1
+            cache.invalidate('venues')
+            time.sleep(0)
+        done.set()
+
+    def read(rng):
+        while not done.is_set():
+            term = rng.choice(('jazz', 'rock', 'blues'))
+            cached, generation = cache.get('venues', term)
+            if cached is None:
+                loaded = version[0]
+                time.sleep(rng.random() / 10000)
+                cache.set('venues', term, loaded, generation)
+            time.sleep(0)
+
+    rng = random.Random(seed)
+    readers = [
+        threading.Thread(target=read, args=(random.Random(rng.random()),)) for _ in range(threads)
+    ]
+    for reader in readers:
+        reader.start()
+    write()
+    for reader in readers:
+        reader.join()
+
+    for term in ('jazz', 'rock', 'blues'):
+        cached = cache.get('venues', term)[0]
+        if cached is not None and cached != version[0]:
+            return 'search cache served version {} of {} after the writes stopped'.format(
+                cached, version[0])
+
+
+class FakeDatabase(object):
+    """Venue id -> name, read by the identity cache in place of load_snapshots"""
+
+    def __init__(self, names, delay=0):
+        self.names = dict(names)
+        self.delay = delay
+        self.during_load = None
+
+    def load_snapshots(self, kind, ids):
+        loaded = {
+            venue_id: venue_snapshot(venue_id, self.names[venue_id])
+            for venue_id in ids
+            if venue_id in self.names
+        }
+        if self.during_load is not None:
+            self.during_load()
+        time.sleep(random.random() * self.delay)
+        return loaded
+
+
+def venue_snapshot(venue_id, name):
+    fields = dict.fromkeys(identity.VenueSnapshot._fields)
+    fields.update(id=venue_id, name=name, genres=())
+    return identity.VenueSnapshot(**fields)
+
+
+class SharedStore(identity.MemoryStore):
+    """A MemoryStore passed off as shared, for the version checks"""
+
+    shared = True
+
+
+def identity_name(cache, venue_id):
+    return cache.get(identity.VENUE, venue_id).name
+
+
+def check_identity_cache_steps():
+    database = FakeDatabase({1: 'before'})
+    identity.load_snapshots = database.load_snapshots
+    for store in (identity.MemoryStore(), SharedStore()):
+        cache = identity.IdentityCache()
+        cache.store = store
+        database.names[1] = 'before'
+
+        # Read before a write commits, returned after its invalidation.
+        def write():
+            database.names[1] = 'after'
+            cache.invalidate(identity.VENUE, 1)
+
+        database.during_load = write
+        identity_name(cache, 1)
+        database.during_load = None
+        if identity_name(cache, 1) != 'after':
+            return 'a snapshot read before the invalidation was kept ({})'.format(
+                type(store).__name__)
+
+    # Another worker's write, seen only once the L1 entry is older than the TTL.
+    cache = identity.IdentityCache()
+    cache.ttl = 0.01
+    identity_name(cache, 1)
+    database.names[1] = 'elsewhere'
+    time.sleep(0.02)
+    if identity_name(cache, 1) != 'elsewhere':
+        return "another worker's write was not seen after the TTL with a per-process store"
+
+
+def check_identity_cache_threads(threads, writes, seed, rounds=20):
+    rng = random.Random(seed)
+    # Readers ask for the hot venues; writes to the cold ones push the hot venues'
+    # invalidations out of the cache's bounded record of them while loads are in flight.
+    hot = [1, 2]
+    cold = list(range(3, 11))
+    database = FakeDatabase({venue_id: 0 for venue_id in hot + cold}, delay=0.001)
+    identity.load_snapshots = database.load_snapshots
+    cache = identity.IdentityCache()
+    cache.store = SharedStore()
+    cache.ttl = 3600
+    cache.max_entries = 4
+
+    def write(count):
+        for _ in range(count):
+            for venue_id in [rng.choice(hot)] + rng.sample(cold, 4):
+                database.names[venue_id] += 1
+                cache.invalidate(identity.VENUE, venue_id)
+                time.sleep(0)
+
+    def read(rng, done):
+        while not done.is_set():
+            cache.get_many(identity.VENUE, hot)
+            time.sleep(rng.random() / 10000)
+
+    # Once the readers stop, nothing is in flight and every snapshot must be current.
+    for _ in range(rounds):
+        done = threading.Event()
+        readers = [
+            threading.Thread(target=read, args=(random.Random(rng.random()), done))
+            for _ in range(threads)
+        ]
+        for reader in readers:
+            reader.start()
+        write(max(1, writes // rounds))
+        done.set()
+        for reader in readers:
+            reader.join()
+
+        delay, database.delay = database.delay, 0
+        for venue_id in hot:
+            cached = identity_name(cache, venue_id)
+            if cached != database.names[venue_id]:
+                return 'identity cache served version {} of {} after the writes stopped'.format(
+                    cached, database.names[venue_id])
+        database.delay = delay
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--writes', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    checks = [
+        ('search cache, step by step', check_search_cache_steps),
+        ('search cache, threads',
+         lambda: check_search_cache_threads(args.threads, args.writes, args.seed)),
+        ('identity cache, step by step', check_identity_cache_steps),
+        ('identity cache, threads',
+         lambda: check_identity_cache_threads(args.threads, args.writes, args.seed)),
+    ]
+    failed = False
+    for label, check in checks:
+        started = time.perf_counter()
+        problem = check()
+        print('{:<32} {:<6} {:.2f} s'.format(label, 'FAIL' if problem else 'ok',
+                                             time.perf_counter() - started))
+        if problem:
+            print('    ' + problem)
+            failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
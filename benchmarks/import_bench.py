@@ -0,0 +1,67 @@
+"""Benchmark cold-start time: imports plus app construction, in fresh interpreters.
+
+    python benchmarks/import_bench.py [--runs 10] [--top 15]
+
+Each scenario runs in a new Python process so nothing is already imported. Reports the
+median and best wall time per scenario, then the slowest imports of a full app build as
+measured by `python -X importtime`.
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+SCENARIOS = [
+    ('import models', 'import models'),
+    ('create_app(api only)', 'import factory; factory.create_app(blueprints=["api"])'),
+    ('create_app(no admin)',
+     'import factory; factory.create_app(blueprints=["venues", "artists", "shows", "api"])'),
+    ('create_app()', 'import factory; factory.create_app()'),
+]
+
+TIMER = '''
+import time
+started = time.perf_counter()
+{}
+print(time.perf_counter() - started)
+'''
+
+
+def run(code, *flags):
+    return subprocess.run([sys.executable] + list(flags) + ['-c', code],
+                          cwd=ROOT,
+                          stdout=subprocess.PIPE,
+                          stderr=subprocess.PIPE,
+                          universal_newlines=True,
+                          check=True)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--top', type=int, default=15)
+    args = parser.parse_args()
+
+    for label, code in SCENARIOS:
+        samples = [float(run(TIMER.format(code)).stdout) for _ in range(args.runs)]
+        print('{:<24} median {:7.1f} ms  best {:7.1f} ms'.format(label,
+                                                                 statistics.median(samples) * 1e3,
+                                                                 min(samples) * 1e3))
+
+    # Lines look like "import time:  self [us] | cumulative | name".
+    imports = []
+    for line in run(SCENARIOS[-1][1], '-X', 'importtime').stderr.splitlines():
+        match = re.match(r'import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)', line)
+        if match and 0 < len(match.group(3)) <= 2:
+            imports.append((int(match.group(2)), match.group(4)))
+    print('\nslowest imports made directly by create_app() and its modules:')
+    for cumulative, name in sorted(imports, reverse=True)[:args.top]:
+        print('  {:<32} {:7.1f} ms'.format(name, cumulative / 1e3))
+
+
+if __name__ == '__main__':
+    main()
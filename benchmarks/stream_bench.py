@@ -0,0 +1,158 @@
+"""Benchmark streamed against buffered rendering of the listing pages.
+
+    python benchmarks/stream_bench.py [--rows 50000] [--runs 3]
+
+Fills a SQLite database with --rows venues, artists and upcoming shows, then requests
+/venues, /artists and /shows in fresh interpreters, once through the streamed views and
+once through buffered equivalents (the whole result list loaded, the whole page rendered
+with render_template). Reports time to first byte, total time and how far the request
+raised the process's peak RSS.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+ROUTES = ['/venues', '/artists', '/shows']
+
+SETUP = '''
+import config
+config.SQLALCHEMY_DATABASE_URI = {uri!r}
+config.SESSION_STORE = 'memory'
+config.RATELIMIT_ENABLED = False
+import factory
+app = factory.create_app(blueprints=['venues', 'artists', 'shows'])
+'''
+
+SEED = SETUP + '''
+import random
+from datetime import datetime, timedelta
+from models import db, Artist, Show, Venue
+
+STATES = ['CA', 'NY', 'TX', 'IL', 'WA', 'TN', 'LA', 'CO', 'OR', 'MA']
+rng = random.Random(1)
+with app.app_context():
+    db.create_all()
+    venues, artists, shows = [], [], []
+    start = datetime.now() + timedelta(days=1)
+    for i in range({rows}):
+        state = rng.choice(STATES)
+        city = 'City {{}}'.format(rng.randint(0, 20))
+        venues.append({{'name': 'Venue {{}}'.format(i), 'city': city, 'state': state,
+                        'address': '{{}} Main St'.format(i), 'phone': '555-0100'}})
+        artists.append({{'name': 'Artist {{}}'.format(i), 'city': city, 'state': state,
+                         'phone': '555-0100', 'image_link': 'https://example.com/{{}}.jpg'.format(i)}})
+    db.session.execute(Venue.__table__.insert(), venues)
+    db.session.execute(Artist.__table__.insert(), artists)
+    for i in range({rows}):
+        shows.append({{'venue_id': rng.randint(1, {rows}), 'artist_id': rng.randint(1, {rows}),
+                       'start_time': start + timedelta(minutes=i)}})
+    db.session.execute(Show.__table__.insert(), shows)
+    db.session.commit()
+'''
+
+MEASURE = SETUP + '''
+import json
+import resource
+import time
+from datetime import datetime
+
+from flask import render_template
+from loading import policy_query
+from indexes import upcoming_show_counts
+from models import Artist, Show, Venue
+
+
+def buffered_venues():
+    # The /venues view as it was before streaming.
+    venues = policy_query(Venue).all()
+    upcoming_shows = upcoming_show_counts(Show.venue_id)
+    areas = {{}}
+    for venue in venues:
+        venue.num_upcoming_shows = upcoming_shows.get(venue.id, 0)
+        areas.setdefault((venue.city, venue.state), {{
+            'city': venue.city, 'state': venue.state, 'venues': []
+        }})['venues'].append(venue)
+    return render_template('pages/venues.html', areas=areas.values())
+
+
+def buffered_artists():
+    return render_template('pages/artists.html', artists=policy_query(Artist).all())
+
+
+def buffered_shows():
+    shows = Show.query.join(Venue).join(Artist).with_entities(
+        Show.venue_id, Venue.name.label('venue_name'), Show.artist_id,
+        Artist.name.label('artist_name'), Artist.image_link.label('artist_image_link'),
+        Show.start_time).filter(Show.start_time > datetime.now()).order_by(Show.start_time).all()
+    return render_template('pages/shows.html', shows=shows)
+
+
+if {buffered!r}:
+    app.view_functions['venues.venues'] = buffered_venues
+    app.view_functions['artists.artists'] = buffered_artists
+    app.view_functions['shows.shows'] = buffered_shows
+
+for name in app.jinja_env.list_templates():
+    app.jinja_env.get_template(name)
+client = app.test_client()
+baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+started = time.perf_counter()
+response = client.get({route!r}, buffered=False)
+first_byte = None
+size = 0
+for chunk in response.response:
+    if chunk and first_byte is None:
+        first_byte = time.perf_counter() - started
+    size += len(chunk)
+response.close()
+total = time.perf_counter() - started
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{'ttfb': first_byte, 'total': total, 'rss_kb': peak - baseline, 'bytes': size}}))
+'''
+
+
+def run(code):
+    result = subprocess.run([sys.executable, '-c', code],
+                            cwd=ROOT,
+                            stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE,
+                            universal_newlines=True,
+                            check=True)
+    return result.stdout.strip().splitlines()[-1]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        uri = 'sqlite:///' + os.path.join(directory, 'bench.db')
+        subprocess.run(
+            [sys.executable, '-c', SEED.format(uri=uri, rows=args.rows)], cwd=ROOT, check=True)
+
+        for route in ROUTES:
+            for label, buffered in (('buffered', True), ('streamed', False)):
+                samples = [
+                    json.loads(run(MEASURE.format(uri=uri, route=route, buffered=buffered)))
+                    for _ in range(args.runs)
+                ]
+                print('{:<9} {:<9} ttfb {:8.1f} ms  total {:8.1f} ms  peak rss +{:7.1f} MB  '
+                      '{:6.1f} MB sent'.format(
+                          route, label,
+                          statistics.median(sample['ttfb'] for sample in samples) * 1e3,
+                          statistics.median(sample['total'] for sample in samples) * 1e3,
+                          max(sample['rss_kb'] for sample in samples) / 1024,
+                          samples[0]['bytes'] / 1024 / 1024))
+
+
+if __name__ == '__main__':
+    main()
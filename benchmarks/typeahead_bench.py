@@ -0,0 +1,100 @@
+"""Benchmark the typeahead prefix index at catalogue scale.
+
+    python benchmarks/typeahead_bench.py [--names 100000] [--queries 20000]
+
+Builds an index of synthetic venue and artist names, then times cold (first lookup of
+a prefix) and warm lookups, and incremental writes interleaved with lookups.
+"""
+import argparse
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import typeahead  # noqa: E402
+
+WORDS = [
+    'the', 'blue', 'red', 'jazz', 'club', 'hall', 'room', 'lounge', 'house', 'bar', 'cafe', 'stage',
+    'theatre', 'collective', 'band', 'trio', 'quartet', 'orchestra', 'sound', 'records', 'garden',
+    'cellar', 'attic', 'electric', 'acoustic', 'velvet', 'moon', 'sun'
+]
+CITIES = [
+    'San Francisco, CA', 'New York, NY', 'Austin, TX', 'Chicago, IL', 'Seattle, WA',
+    'Nashville, TN', 'New Orleans, LA', 'Denver, CO', 'Portland, OR', 'Boston, MA'
+]
+
+
+def random_name(rng):
+    words = rng.sample(WORDS, rng.randint(1, 3))
+    words.append(''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 8))))
+    return ' '.join(word.capitalize() for word in words)
+
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p / 100))]
+
+
+def report(label, samples):
+    print('{:<28} mean {:8.1f} us  p50 {:8.1f} us  p99 {:8.1f} us'.format(
+        label,
+        sum(samples) / len(samples) * 1e6,
+        percentile(samples, 50) * 1e6,
+        percentile(samples, 99) * 1e6))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--names', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    half = args.names // 2
+    venues = [(i, random_name(rng), rng.choice(CITIES), rng.randint(0, 50)) for i in range(half)]
+    artists = [(i, random_name(rng), rng.choice(CITIES), rng.randint(0, 50))
+               for i in range(args.names - half)]
+
+    index = typeahead.Typeahead()
+    started = time.perf_counter()
+    index.build(venues, artists)
+    print('built {} names ({} keys) in {:.2f} s'.format(args.names, len(index.index._keys),
+                                                        time.perf_counter() - started))
+
+    names = [name for _, name, _, _ in venues + artists]
+    prefixes = []
+    for _ in range(args.queries):
+        word = rng.choice(rng.choice(names).split(' '))
+        prefixes.append(word[:rng.randint(1, min(4, len(word)))])
+
+    cold, warm = [], []
+    seen = set()
+    for prefix in prefixes:
+        started = time.perf_counter()
+        index.search(prefix, limit=10)
+        elapsed = time.perf_counter() - started
+        (warm if prefix in seen else cold).append(elapsed)
+        seen.add(prefix)
+
+    writes, mixed = [], []
+    for i, prefix in enumerate(prefixes):
+        if i % 10 == 0:
+            started = time.perf_counter()
+            index.put_venue(rng.randrange(half), random_name(rng), rng.choice(CITIES), 1)
+            writes.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        index.search(prefix, limit=10)
+        mixed.append(time.perf_counter() - started)
+
+    report('search (cold prefix)', cold)
+    report('search (warm prefix)', warm)
+    report('search (with 10% writes)', mixed)
+    report('put_venue', writes)
+
+
+if __name__ == '__main__':
+    main()
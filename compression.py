@@ -0,0 +1,186 @@
+#----------------------------------------------------------------------------#
+# Response compression.
+#----------------------------------------------------------------------------#
+#  Gzip always, and Brotli when the optional `brotli` package is installed. Buffered
+#  responses are compressed in one go when they are big enough to be worth it; streamed
+#  responses are compressed chunk by chunk, flushing after each so the client still
+#  receives every chunk as soon as it is produced.
+import mimetypes
+import os
+import time
+import zlib
+
+from flask import request, safe_join, send_from_directory
+from werkzeug.exceptions import NotFound
+
+import metrics
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+GZIP = 'gzip'
+BROTLI = 'br'
+
+# Suffixes of precompressed static files, by encoding.
+STATIC_SUFFIXES = {BROTLI: '.br', GZIP: '.gz'}
+
+
+class Encoder(object):
+    """Incremental compressor for one response"""
+
+    def __init__(self, encoding, level):
+        self.encoding = encoding
+        if encoding == BROTLI:
+            self._compressor = brotli.Compressor(quality=level)
+        else:
+            # wbits 31: a gzip header and trailer around a 32K-window deflate stream.
+            self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        if self.encoding == BROTLI:
+            return self._compressor.process(data)
+        return self._compressor.compress(data)
+
+    def flush(self):
+        if self.encoding == BROTLI:
+            return self._compressor.flush()
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        if self.encoding == BROTLI:
+            return self._compressor.finish()
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class Compress(object):
+    """Negotiated gzip/Brotli for dynamic responses and precompressed static files"""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('COMPRESS_GZIP_LEVEL', 6)
+        app.config.setdefault('COMPRESS_BROTLI_QUALITY', 4)
+        app.config.setdefault('COMPRESS_MIN_SIZE', 500)
+        app.config.setdefault('COMPRESS_MIMETYPES',
+                              ('text/html', 'text/css', 'text/plain', 'text/calendar',
+                               'application/json', 'application/javascript'))
+        self.levels = {
+            GZIP: app.config['COMPRESS_GZIP_LEVEL'],
+            BROTLI: app.config['COMPRESS_BROTLI_QUALITY'],
+        }
+        self.min_size = app.config['COMPRESS_MIN_SIZE']
+        self.mimetypes = frozenset(app.config['COMPRESS_MIMETYPES'])
+        self.encodings = [BROTLI, GZIP] if brotli is not None else [GZIP]
+
+        self.seconds = self.bytes_in = self.bytes_out = None
+        app_metrics = app.extensions.get('metrics')
+        if app_metrics is not None:
+            self.seconds = app_metrics.registry.register(
+                metrics.Counter('fyyur_compression_seconds_total',
+                                'CPU time spent compressing responses.', ('encoding',)))
+            self.bytes_in = app_metrics.registry.register(
+                metrics.Counter('fyyur_compression_input_bytes_total',
+                                'Response bytes before compression.', ('encoding',)))
+            self.bytes_out = app_metrics.registry.register(
+                metrics.Counter('fyyur_compression_output_bytes_total',
+                                'Response bytes after compression.', ('encoding',)))
+
+        self.static_folder = app.static_folder
+        if app.has_static_folder and 'static' in app.view_functions:
+            self._send_static_file = app.send_static_file
+            app.view_functions['static'] = self.send_static_file
+
+        app.after_request(self.after_request)
+        app.extensions['compress'] = self
+
+    def negotiate(self, encodings=None):
+        """The client's preferred encoding out of `encodings`, or None"""
+        return request.accept_encodings.best_match(encodings or self.encodings)
+
+    def record(self, encoding, seconds, bytes_in, bytes_out):
+        if self.seconds is not None:
+            self.seconds.inc((encoding,), seconds)
+            self.bytes_in.inc((encoding,), bytes_in)
+            self.bytes_out.inc((encoding,), bytes_out)
+
+    def after_request(self, response):
+        if (response.status_code < 200 or response.status_code in (204, 206, 304) or
+                response.direct_passthrough or 'Content-Encoding' in response.headers or
+                response.mimetype not in self.mimetypes):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        encoding = self.negotiate()
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            response.response = self.compress_stream(encoding, response.response)
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < self.min_size:
+                return response
+            response.set_data(self.compress(encoding, data))
+
+        response.headers['Content-Encoding'] = encoding
+        # The compressed body differs byte for byte, so a strong validator no longer holds.
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+    def compress(self, encoding, data):
+        started = time.process_time()
+        encoder = Encoder(encoding, self.levels[encoding])
+        compressed = encoder.compress(data) + encoder.finish()
+        self.record(encoding, time.process_time() - started, len(data), len(compressed))
+        return compressed
+
+    def compress_stream(self, encoding, chunks):
+        encoder = Encoder(encoding, self.levels[encoding])
+        try:
+            for chunk in chunks:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode('utf-8')
+                if not chunk:
+                    continue
+                started = time.process_time()
+                compressed = encoder.compress(chunk) + encoder.flush()
+                self.record(encoding, time.process_time() - started, len(chunk), len(compressed))
+                yield compressed
+
+            started = time.process_time()
+            compressed = encoder.finish()
+            self.record(encoding, time.process_time() - started, 0, len(compressed))
+            yield compressed
+        finally:
+            if hasattr(chunks, 'close'):
+                chunks.close()
+
+    def send_static_file(self, filename):
+        """Serve `filename.br` or `filename.gz` in place of a static file when present"""
+        encodings = [
+            encoding for encoding in (BROTLI, GZIP)
+            if os.path.isfile(safe_join(self.static_folder, filename + STATIC_SUFFIXES[encoding]))
+        ]
+        encoding = self.negotiate(encodings) if encodings else None
+        if encoding is None:
+            response = self._send_static_file(filename)
+        else:
+            try:
+                response = send_from_directory(self.static_folder,
+                                               filename + STATIC_SUFFIXES[encoding],
+                                               mimetype=mimetypes.guess_type(filename)[0] or
+                                               'application/octet-stream')
+            except NotFound:
+                response = self._send_static_file(filename)
+            else:
+                response.headers['Content-Encoding'] = encoding
+        if encodings:
+            response.vary.add('Accept-Encoding')
+        return response
@@ -1,8 +1,32 @@
 import os
-SECRET_KEY = os.urandom(32)
 # Grabs the folder where the script runs.
 basedir = os.path.abspath(os.path.dirname(__file__))
 
+
+def load_secret_key(path):
+    """SECRET_KEY from the environment, else from `path`, which is created on first use.
+
+    Every process must sign with the same key, so it cannot be generated per process.
+    """
+    if os.environ.get('SECRET_KEY'):
+        return os.environ['SECRET_KEY']
+    if not os.path.exists(path):
+        scratch = '{}.{}'.format(path, os.getpid())
+        with open(os.open(scratch, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'wb') as f:
+            f.write(os.urandom(32))
+        try:
+            # Atomic: of several processes starting at once, only the first link wins.
+            os.link(scratch, path)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(scratch)
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+SECRET_KEY = load_secret_key(os.path.join(basedir, '.secret_key'))
+
 # Enable debug mode.
 DEBUG = True
 
@@ -11,3 +35,126 @@ SQLALCHEMY_TRACK_MODIFICATIONS = False
 
 # Connect to the database
 SQLALCHEMY_DATABASE_URI = 'postgres://fyyur_db_user@localhost:5432/fyyur_db'
+
+# Server-side sessions: 'memory' (this process only) or 'sqlite' (shared on this host).
+# The session cookie only carries an opaque id. SESSION_LIFETIME is in seconds.
+SESSION_STORE = 'sqlite'
+SESSION_SQLITE_PATH = os.path.join(basedir, 'sessions.db')
+SESSION_LIFETIME = 86400
+SESSION_SWEEP_INTERVAL = 300
+
+# Blueprints registered by create_app(); see views.BLUEPRINTS.
+BLUEPRINTS = ('venues', 'artists', 'shows', 'api', 'images', 'admin')
+
+# Token buckets per limit class, as (tokens per second, burst capacity), applied per
+# client address across the class's routes and to all clients of each route.
+RATELIMIT_ENABLED = True
+RATELIMITS = {
+    'search': {
+        'client': (1, 10),
+        'route': (50, 100)
+    },
+    'write': {
+        'client': (0.5, 5),
+        'route': (20, 40)
+    },
+}
+# Rate-limited requests allowed in flight per process before shedding with 503.
+RATELIMIT_MAX_CONCURRENT = 16
+
+# Reverse proxies (e.g. nginx) in front of the app whose X-Forwarded-For and
+# X-Forwarded-Proto headers are trusted, so that clients are told apart by their own
+# address. 0 trusts none; set it only when every request comes through the proxies.
+PROXY_COUNT = int(os.environ.get('PROXY_COUNT', 0))
+
+# Seconds before the typeahead index is rebuilt to refresh its upcoming-show counts.
+TYPEAHEAD_REBUILD_INTERVAL = 3600
+
+# Seconds between checks of whether another process has changed the data behind this
+# process's in-memory indexes.
+INDEX_CHECK_INTERVAL = 5
+
+# Search result cache: maximum entries and seconds an entry stays fresh.
+SEARCH_CACHE_SIZE = 1024
+SEARCH_CACHE_TTL = 60
+
+# Expanded recurring availability, cached per (artist, window): maximum entries and
+# seconds an entry stays fresh.
+AVAILABILITY_CACHE_SIZE = 4096
+AVAILABILITY_CACHE_TTL = 300
+
+# Venue and artist snapshots by id: a per-process LRU of IDENTITY_CACHE_SIZE entries, each
+# revalidated against the shared store after IDENTITY_CACHE_TTL seconds. The store is
+# 'memory' (this process only, so entries are reloaded from the database after
+# IDENTITY_CACHE_TTL instead) or an identity.CacheStore shared by the workers.
+IDENTITY_CACHE_STORE = 'memory'
+IDENTITY_CACHE_SIZE = 10000
+IDENTITY_CACHE_TTL = 5
+IDENTITY_STORE_TTL = 3600
+
+# `flask shows archive` moves shows older than this out of the hot shows table.
+SHOW_ARCHIVE_AFTER_DAYS = 180
+
+# Largest id list accepted by the bulk delete endpoints.
+BULK_DELETE_MAX_IDS = 1000
+
+# JSON log file, written from a background thread. Requests that are neither slow nor
+# failed are only logged at the sample rate.
+LOG_FILE = os.path.join(basedir, 'error.log')
+LOG_LEVEL = 'INFO'
+LOG_QUEUE_SIZE = 10000
+LOG_REQUEST_SAMPLE_RATE = 0.05
+LOG_SLOW_REQUEST_MS = 500
+
+# Most shows accepted by one POST /shows/batch request.
+SHOW_BATCH_MAX_ITEMS = 500
+
+# Raise instead of logging a warning when a view exceeds its @query_budget. Always on
+# when the app is testing.
+QUERY_BUDGET_RAISE = False
+
+# Response compression. Brotli is offered when the brotli package is installed; bodies
+# under COMPRESS_MIN_SIZE bytes are sent as they are.
+COMPRESS_GZIP_LEVEL = 6
+COMPRESS_BROTLI_QUALITY = 4
+COMPRESS_MIN_SIZE = 500
+COMPRESS_MIMETYPES = ('text/html', 'text/css', 'text/plain', 'text/calendar', 'application/json',
+                      'application/javascript')
+
+# Image proxy: resized variants of image links, cached on disk up to IMAGE_CACHE_MAX_BYTES.
+# Links resolving to private addresses are refused unless IMAGE_ALLOW_PRIVATE_HOSTS is
+# set; IMAGE_FETCHER replaces the HTTP fetcher with any callable from URL to bytes.
+IMAGE_CACHE_DIR = os.path.join(basedir, 'instance', 'images')
+IMAGE_CACHE_MAX_BYTES = 256 * 1024 * 1024
+IMAGE_FETCH_TIMEOUT = 10
+IMAGE_MAX_BYTES = 10 * 1024 * 1024
+IMAGE_ALLOW_PRIVATE_HOSTS = False
+IMAGE_FETCHER = None
+
+# Streamed listing pages (/venues, /artists, /shows): rows fetched per database round
+# trip, and bytes of rendered HTML buffered per chunk sent.
+STREAM_BATCH_SIZE = 500
+STREAM_CHUNK_SIZE = 16 * 1024
+
+# Optional regional shards for the listing and search pages, off while SHARDS is empty.
+# Each shard names a database URL and the states it holds; SHARD_DEFAULT holds the rest.
+# Locally, SQLite files will do:
+#   SHARDS = {
+#       'west': {'uri': 'sqlite:///shards/west.db', 'states': ('CA', 'OR', 'WA', 'NV')},
+#       'rest': {'uri': 'sqlite:///shards/rest.db'},
+#   }
+#   SHARD_DEFAULT = 'rest'
+SHARDS = {}
+SHARD_DEFAULT = None
+SHARD_WORKERS = 8
+SHARD_BATCH_SIZE = 500
+
+# Show events over Server-Sent Events (GET /shows/events): events kept for clients
+# resuming with Last-Event-ID, and seconds between keepalive comments and before a
+# dropped client reconnects.
+SSE_BACKLOG = 1000
+SSE_KEEPALIVE = 15
+SSE_RETRY = 3
+# Open streams per process before further subscribers are answered 503. gunicorn.conf.py
+# sets it below the thread count of gthread workers.
+SSE_MAX_SUBSCRIBERS = int(os.environ.get('SSE_MAX_SUBSCRIBERS', 100))
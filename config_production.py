@@ -0,0 +1,7 @@
+# Settings for the production entrypoint (wsgi.py), layered over config.py.
+from config import *
+
+DEBUG = False
+
+# Workers serve HTTP only; commands run with the default config through app.py.
+BLUEPRINTS = ('venues', 'artists', 'shows', 'api', 'images')
@@ -0,0 +1,154 @@
+#----------------------------------------------------------------------------#
+# Show events for Server-Sent Events subscribers.
+#----------------------------------------------------------------------------#
+#  The write hooks publish to an in-process hub that keeps the most recent events in a
+#  ring buffer. Subscribers block on one shared condition between events, so an idle
+#  subscriber is a parked thread, or a parked greenlet under a gevent worker, where the
+#  threading primitives are patched.
+#
+#  The hub is per process: a subscriber only receives the shows created or deleted through
+#  the same worker process.
+#
+#  Event ids are "<stream>-<sequence>". The stream token changes with every process, so
+#  a client resuming with an id from another process or an older run gets a `reset`
+#  event, as does one that fell further behind than the buffer reaches.
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import metrics
+
+
+class TooManySubscribers(Exception):
+    pass
+
+
+class EventHub(object):
+
+    def __init__(self, backlog=1000):
+        self.backlog = backlog
+        self._reset()
+
+    def _reset(self):
+        self.pid = os.getpid()
+        self.stream = '{:x}{:x}'.format(self.pid, int(time.time() * 1000))
+        self.subscribers = 0
+        self._condition = threading.Condition()
+        self._events = deque(maxlen=self.backlog)
+        self._last_seq = 0
+
+    def _check_fork(self):
+        # Locks and buffered events belong to the process that made them.
+        if self.pid != os.getpid():
+            self._reset()
+
+    @property
+    def last_seq(self):
+        self._check_fork()
+        return self._last_seq
+
+    def event_id(self, seq):
+        return '{}-{}'.format(self.stream, seq)
+
+    def parse_event_id(self, event_id):
+        """The sequence number of an id from this stream, or None"""
+        stream, _, seq = (event_id or '').rpartition('-')
+        if stream != self.stream or not seq.isdigit():
+            return None
+        return int(seq)
+
+    def publish(self, event, data):
+        self._check_fork()
+        with self._condition:
+            self._last_seq += 1
+            encoded = json.dumps(data, separators=(',', ':'))
+            self._events.append((self._last_seq, event, data, encoded))
+            self._condition.notify_all()
+
+    def wait(self, after_seq, timeout):
+        """Events published after `after_seq`, waiting up to `timeout` seconds for one.
+
+        Returns [] on timeout, and None when events after `after_seq` have already been
+        dropped from the buffer.
+        """
+        self._check_fork()
+        with self._condition:
+            if self._last_seq <= after_seq:
+                self._condition.wait(timeout)
+            if self._events and self._events[0][0] > after_seq + 1:
+                return None
+            return [event for event in self._events if event[0] > after_seq]
+
+    @contextmanager
+    def subscription(self, limit=None):
+        """Count a subscriber in, raising TooManySubscribers when `limit` are already in"""
+        self._check_fork()
+        with self._condition:
+            if limit is not None and self.subscribers >= limit:
+                raise TooManySubscribers
+            self.subscribers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self.subscribers -= 1
+
+
+show_events = EventHub()
+
+
+def init_app(app):
+    show_events.backlog = app.config['SSE_BACKLOG']
+    show_events._reset()
+    app_metrics = app.extensions.get('metrics')
+    if app_metrics is not None:
+        app_metrics.registry.register(
+            metrics.Gauge('fyyur_sse_subscribers', 'Open show event streams.', (),
+                          lambda: {(): show_events.subscribers}))
+
+
+def format_event(event_id, event, data):
+    return 'id: {}\nevent: {}\ndata: {}\n\n'.format(event_id, event, data)
+
+
+def stream_events(hub, last_event_id, keepalive, retry, matches=None, max_subscribers=None):
+    """An SSE stream of `hub`, resuming after `last_event_id` when it is still known.
+
+    `matches(data)` selects the events sent; the others are skipped. The subscription is
+    taken at once, so TooManySubscribers is raised here, before the response starts, when
+    `max_subscribers` streams are already open.
+    """
+    stream = generate_events(hub, last_event_id, keepalive, retry, matches, max_subscribers)
+    next(stream)
+    return stream
+
+
+def generate_events(hub, last_event_id, keepalive, retry, matches, max_subscribers):
+    with hub.subscription(max_subscribers):
+        # Primed by stream_events(); closing the stream from here on releases the place.
+        yield None
+        yield 'retry: {}\n\n'.format(int(retry * 1000))
+
+        after_seq = hub.parse_event_id(last_event_id) if last_event_id else hub.last_seq
+        if after_seq is None or after_seq > hub.last_seq:
+            after_seq = hub.last_seq
+            yield format_event(hub.event_id(after_seq), 'reset', '{}')
+
+        while True:
+            events = hub.wait(after_seq, keepalive)
+            if events is None:
+                after_seq = hub.last_seq
+                yield format_event(hub.event_id(after_seq), 'reset', '{}')
+            elif not events:
+                yield ': keepalive\n\n'
+            else:
+                chunk = []
+                for seq, event, data, encoded in events:
+                    if matches is None or matches(data):
+                        chunk.append(format_event(hub.event_id(seq), event, encoded))
+                    after_seq = seq
+                if chunk:
+                    yield ''.join(chunk)
@@ -0,0 +1,192 @@
+#----------------------------------------------------------------------------#
+# Faceted venue and artist search.
+#----------------------------------------------------------------------------#
+#  One statement returns a page of matches, the total number of matches through
+#  count(*) OVER (), and the facet counts over all matches. The counts are grouped with
+#  GROUPING SETS where the database has them, and otherwise (SQLite) with a UNION ALL of
+#  one GROUP BY per facet over the same matches; either way the matches are only
+#  selected once and no facet value costs a query of its own.
+from datetime import datetime
+
+from models import db, Artist, ArtistGenre, Show, Venue, VenueGenre
+
+FACETS = ('genre', 'state', 'city', 'seeking', 'upcoming')
+
+# Facets whose values are true or false.
+FLAGS = ('seeking', 'upcoming')
+
+# Namespace -> (model, genre model, genre owner column, seeking flag, show owner column)
+SOURCES = {
+    'venues': (Venue, VenueGenre, VenueGenre.venue_id, Venue.seeking_talent, Show.venue_id),
+    'artists': (Artist, ArtistGenre, ArtistGenre.artist_id, Artist.seeking_venue, Show.artist_id),
+}
+
+GROUPING_SETS_DIALECTS = ('postgresql', 'oracle', 'mssql')
+
+
+def parse_flag(value):
+    if value is None or value == '':
+        return None
+    return value.lower() in ('true', '1', 'yes')
+
+
+def parse_filters(args):
+    """The facet filters of a query string: genre may repeat, the others are single values"""
+    filters = {
+        'genre': sorted(set(genre for genre in args.getlist('genre') if genre)),
+        'state': args.get('state') or None,
+        'city': args.get('city') or None,
+        'seeking': parse_flag(args.get('seeking')),
+        'upcoming': parse_flag(args.get('upcoming')),
+    }
+    return {name: value for name, value in filters.items() if value not in (None, [])}
+
+
+def cache_variant(filters, limit=None, offset=0):
+    """A hashable form of a search's filters and page, for the search cache"""
+    return tuple((name, tuple(value) if isinstance(value, list) else value)
+                 for name, value in sorted(filters.items())) + (limit, offset)
+
+
+def match_query(namespace, term, filters, now):
+    """Select the matching entities with the columns the facets group by"""
+    model, genre_model, genre_owner, seeking, show_owner = SOURCES[namespace]
+    upcoming = db.select([show_owner.label('owner_id'),
+                          db.func.count().label('shows')
+                         ]).where(Show.start_time > now).group_by(show_owner).alias('upcoming')
+    num_upcoming_shows = db.func.coalesce(upcoming.c.shows, 0)
+
+    query = db.select([
+        model.id,
+        model.name,
+        model.state,
+        model.city_and_state.label('city'),
+        seeking.label('seeking'),
+        (num_upcoming_shows > 0).label('upcoming'),
+        num_upcoming_shows.label('num_upcoming_shows'),
+    ]).select_from(model.__table__.outerjoin(upcoming, upcoming.c.owner_id == model.id))
+
+    if term:
+        query = query.where(
+            db.or_(model.name.ilike('%' + term + '%'),
+                   db.func.lower(model.city_and_state) == term))
+    for genre in filters.get('genre', ()):
+        query = query.where(
+            model.id.in_(
+                db.select([genre_owner
+                          ]).where(db.func.lower(genre_model.genre_name) == genre.lower())))
+    if 'state' in filters:
+        query = query.where(db.func.upper(model.state) == filters['state'].upper())
+    if 'city' in filters:
+        query = query.where(db.func.lower(model.city_and_state) == filters['city'].lower())
+    if 'seeking' in filters:
+        query = query.where(seeking == filters['seeking'])
+    if 'upcoming' in filters:
+        query = query.where((num_upcoming_shows > 0) == filters['upcoming'])
+    return query
+
+
+def facet_columns(matches, genres):
+    return [
+        ('genre', genres.c.genre_name),
+        ('state', matches.c.state),
+        ('city', matches.c.city),
+        ('seeking', matches.c.seeking),
+        ('upcoming', matches.c.upcoming),
+    ]
+
+
+def facet_rows(namespace, matches, dialect):
+    """Select the (section, value, count) of every facet value among `matches`"""
+    _, genre_model, genre_owner, _, _ = SOURCES[namespace]
+    genres = db.select([genre_owner.label('owner_id'), genre_model.genre_name]).alias('genres')
+    tagged = matches.outerjoin(genres, genres.c.owner_id == matches.c.id)
+    columns = facet_columns(matches, genres)
+
+    count = db.func.count(db.distinct(matches.c.id)).label('count')
+
+    def facet_select(section, value):
+        # Laid out like the rows of the page of matches they are sent with.
+        return db.select([
+            section.label('section'),
+            db.cast(value, db.String).label('value'),
+            db.cast(db.null(), db.String).label('name'),
+            db.cast(db.null(), db.Integer).label('num_upcoming_shows'),
+            count,
+        ])
+
+    if dialect in GROUPING_SETS_DIALECTS:
+        grouped = [(db.func.grouping(column) == 0, name, column) for name, column in columns]
+        section = db.case([(is_grouped, name) for is_grouped, name, _ in grouped])
+        value = db.case([
+            (is_grouped, db.cast(column, db.String)) for is_grouped, _, column in grouped
+        ])
+        return [
+            facet_select(section, value).select_from(tagged).group_by(
+                db.func.grouping_sets(*[db.tuple_(column) for _, column in columns]))
+        ]
+
+    # Only the genre facet needs the genres; the others count the matches themselves.
+    return [
+        facet_select(db.literal(name),
+                     column).select_from(tagged if name == 'genre' else matches).group_by(column)
+        for name, column in columns
+    ]
+
+
+def parse_value(name, value):
+    if name in FLAGS:
+        return value.lower() in ('true', '1')
+    return value
+
+
+def search(namespace, term, filters=None, limit=None, offset=0):
+    """Matches of a normalized search term and facet filters, with their facet counts.
+
+    Returns {"count", "data", "facets"}: `data` holds the page of matches from `offset`,
+    all of them when `limit` is None, ordered by id; `facets` maps each facet to its
+    values and their counts among all matches, most frequent first.
+    """
+    filters = filters or {}
+    matches = match_query(namespace, term, filters, datetime.now()).cte('matches')
+
+    page = db.select([
+        matches.c.id,
+        matches.c.name,
+        matches.c.num_upcoming_shows,
+        db.func.count().over().label('total'),
+    ]).order_by(matches.c.id).limit(limit).offset(offset or None).alias('page')
+    rows = db.select([
+        db.literal('match').label('section'),
+        db.cast(page.c.id, db.String).label('value'),
+        page.c.name.label('name'),
+        page.c.num_upcoming_shows.label('num_upcoming_shows'),
+        page.c.total.label('count'),
+    ])
+
+    dialect = db.session.get_bind().dialect.name
+
+    total = None
+    data = []
+    facets = {name: [] for name in FACETS}
+    for row in db.session.execute(db.union_all(rows, *facet_rows(namespace, matches, dialect))):
+        if row.section == 'match':
+            total = row.count
+            data.append({
+                "id": int(row.value),
+                "name": row.name,
+                "num_upcoming_shows": row.num_upcoming_shows,
+            })
+        elif row.value is not None:
+            facets[row.section].append({
+                'value': parse_value(row.section, row.value),
+                'count': row.count,
+            })
+
+    for values in facets.values():
+        values.sort(key=lambda facet: (-facet['count'], str(facet['value'])))
+    if total is None:
+        # An empty page: every match is either upcoming or not, so the facet adds up.
+        total = sum(facet['count'] for facet in facets['upcoming'])
+    data.sort(key=lambda match: match['id'])
+    return {"count": total, "data": data, "facets": facets}
@@ -0,0 +1,109 @@
+#----------------------------------------------------------------------------#
+# Application factory.
+#----------------------------------------------------------------------------#
+import os
+
+from flask import Flask, render_template
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+import applog
+import availability
+import compression
+import events
+import identity
+import indexes
+import metrics
+import ratelimit
+import sessions
+import sharding
+import views
+from loading import policy_query, query_budget
+from models import db, Artist, Venue
+from views.helpers import facet_selected, facet_url, format_datetime, image_url
+
+#----------------------------------------------------------------------------#
+# Controllers.
+#----------------------------------------------------------------------------#
+
+
+@query_budget(4)
+def index():
+    recent_artists = policy_query(Artist).order_by(Artist.id.desc()).limit(10).all()
+    recent_venues = policy_query(Venue).order_by(Venue.id.desc()).limit(10).all()
+    return render_template('pages/home.html',
+                           recent_artists=recent_artists,
+                           recent_venues=recent_venues)
+
+
+def not_found_error(error):
+    return render_template('errors/404.html'), 404
+
+
+def server_error(error):
+    return render_template('errors/500.html'), 500
+
+
+#----------------------------------------------------------------------------#
+# App Config.
+#----------------------------------------------------------------------------#
+
+
+def create_app(config='config', blueprints=None):
+    """Build the app with the named blueprints, by default those in BLUEPRINTS.
+
+    Blueprint modules are imported as they are registered, so an app built with only
+    ['api'] never loads the form, template-view or command code.
+    """
+    app = Flask('fyyur', root_path=os.path.dirname(os.path.abspath(__file__)))
+    app.config.from_object(config)
+    if app.config['PROXY_COUNT']:
+        proxies = app.config['PROXY_COUNT']
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxies, x_proto=proxies)
+    db.init_app(app)
+    ratelimit.RateLimiter(app)
+    metrics.AppMetrics(app, db)
+    applog.RequestLogger(app)
+    compression.Compress(app)
+    sessions.ServerSessions(app)
+    sharding.shards.init_app(app)
+    indexes.init_app(app)
+    events.init_app(app)
+    availability.init_app(app)
+    identity.entities.init_app(app)
+
+    app.jinja_env.filters['datetime'] = format_datetime
+    app.jinja_env.globals['image_url'] = image_url
+    app.jinja_env.globals['facet_url'] = facet_url
+    app.jinja_env.globals['facet_selected'] = facet_selected
+    app.add_url_rule('/', 'index', index)
+    app.register_error_handler(404, not_found_error)
+    app.register_error_handler(500, server_error)
+    views.register_blueprints(app, app.config['BLUEPRINTS'] if blueprints is None else blueprints)
+    return app
+
+
+def warm_up(app):
+    """Load everything that is otherwise loaded on first use.
+
+    Run in a pre-fork server's master so that workers share the result copy-on-write
+    instead of each building it after the fork.
+    """
+    import babel.dates  # noqa: F401
+    import dateutil.parser  # noqa: F401
+    import geo
+
+    geo.city_centroids()
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+
+    with app.app_context():
+        try:
+            indexes.ensure_typeahead_index()
+            indexes.ensure_match_index()
+        except Exception:
+            # The indexes are built on first use anyway; don't fail the boot over them.
+            app.logger.exception('Index warm-up failed')
+        finally:
+            db.session.remove()
+            # Leave no pooled connections for the workers to inherit.
+            db.get_engine(app).dispose()
@@ -0,0 +1,148 @@
+#----------------------------------------------------------------------------#
+# Geohash encoding and offline geocoding.
+#----------------------------------------------------------------------------#
+import csv
+import math
+import os
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+GEOHASH_PRECISION = 9
+CITY_CENTROIDS_PATH = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'data',
+                                   'city_centroids.csv')
+
+_city_centroids = None
+
+
+def encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    """Encode a coordinate as a geohash string of the given precision"""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+
+    while len(chars) < precision:
+        if even:
+            mid = (lon_range[0] + lon_range[1]) / 2
+            if longitude >= mid:
+                bits = (bits << 1) | 1
+                lon_range[0] = mid
+            else:
+                bits = bits << 1
+                lon_range[1] = mid
+        else:
+            mid = (lat_range[0] + lat_range[1]) / 2
+            if latitude >= mid:
+                bits = (bits << 1) | 1
+                lat_range[0] = mid
+            else:
+                bits = bits << 1
+                lat_range[1] = mid
+        even = not even
+
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(BASE32[bits])
+            bits = 0
+            bit_count = 0
+
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    """Return (height, width) in degrees of a geohash cell of the given precision"""
+    lat_bits = (5 * precision) // 2
+    lon_bits = 5 * precision - lat_bits
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lon_bits)
+
+
+def precision_for_radius(latitude, radius_km):
+    """Return the longest geohash precision whose cells are at least radius_km on each side.
+
+    With cells that large, the circle around a point always fits inside the point's own
+    cell plus its eight neighbours.
+    """
+    cos_lat = max(math.cos(math.radians(latitude)), 0.01)
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        height, width = cell_size(precision)
+        if height * KM_PER_DEGREE >= radius_km and width * KM_PER_DEGREE * cos_lat >= radius_km:
+            return precision
+    return 0
+
+
+def covering_cells(latitude, longitude, radius_km):
+    """Return the geohash prefixes covering a circle, or None when it spans the whole globe"""
+    precision = precision_for_radius(latitude, radius_km)
+    if precision == 0:
+        return None
+
+    height, width = cell_size(precision)
+    cells = set()
+    for d_lat in (-height, 0, height):
+        for d_lon in (-width, 0, width):
+            lat = latitude + d_lat
+            if lat < -90 or lat > 90:
+                continue
+            lon = (longitude + d_lon + 180) % 360 - 180
+            cells.add(encode(lat, lon, precision))
+    return sorted(cells)
+
+
+def prefix_range(prefix):
+    """Return the inclusive (low, high) range of full-precision geohashes under a prefix.
+
+    Range comparisons stay index-friendly under any collation, unlike LIKE 'prefix%'.
+    """
+    padding = GEOHASH_PRECISION - len(prefix)
+    return prefix + BASE32[0] * padding, prefix + BASE32[-1] * padding
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """Return (min_lat, max_lat, min_lon, max_lon) around a point"""
+    d_lat = radius_km / KM_PER_DEGREE
+    d_lon = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(latitude)), 0.01))
+    return latitude - d_lat, latitude + d_lat, longitude - d_lon, longitude + d_lon
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two coordinates in kilometres"""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2)**2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2)**2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _centroid_key(city, state):
+    return ' '.join((city or '').lower().split()), (state or '').strip().upper()
+
+
+def city_centroids():
+    """Load the bundled city-centroid table on first use"""
+    global _city_centroids
+    if _city_centroids is None:
+        centroids = {}
+        with open(CITY_CENTROIDS_PATH, newline='') as f:
+            for row in csv.DictReader(f):
+                centroids[_centroid_key(row['city'], row['state'])] = (float(row['latitude']),
+                                                                       float(row['longitude']))
+        _city_centroids = centroids
+    return _city_centroids
+
+
+def geocode(city, state):
+    """Return the (latitude, longitude) centroid of a city, or None when it is unknown"""
+    return city_centroids().get(_centroid_key(city, state))
+
+
+def parse_city_and_state(value):
+    """Split a "City, ST" string, returning (None, None) when it is not one"""
+    city, sep, state = (value or '').rpartition(',')
+    if not sep or not city.strip() or not state.strip():
+        return None, None
+    return city.strip(), state.strip()
@@ -0,0 +1,67 @@
+#----------------------------------------------------------------------------#
+# Gunicorn settings for production.
+#----------------------------------------------------------------------------#
+#  gunicorn -c gunicorn.conf.py
+#
+#  The app is imported and warmed once in the master, then forked. Workers start with
+#  the templates, city table and in-memory indexes already built, and share those pages
+#  with the master for as long as neither writes to them.
+import gc
+import multiprocessing
+import os
+
+# Gunicorn reads this file before it preloads the app. Collections during the preload
+# would touch, and so copy, every object in it; when_ready() turns the collector back on.
+gc.disable()
+
+wsgi_app = 'wsgi:app'
+bind = os.environ.get('BIND', '0.0.0.0:' + os.environ.get('PORT', '8000'))
+preload_app = True
+
+# Requests mostly wait on the database, so each worker runs a few threads. One worker per
+# core keeps the GIL from being the bottleneck; WEB_CONCURRENCY and THREADS override.
+#
+# Every open /shows/events stream holds one of those threads for as long as the client
+# stays connected, so a gthread worker takes at most half its threads' worth of streams
+# and answers further subscribers 503. Deployments with many event subscribers set
+# WORKER_CLASS=gevent (and install gevent), where a stream is a greenlet and each worker
+# holds up to half of WORKER_CONNECTIONS of them. SSE_MAX_SUBSCRIBERS overrides both.
+#
+# The event hub is per process: a subscriber only receives the shows created or deleted
+# through its own worker, so deployments that need every event on every stream run a
+# single worker.
+worker_class = os.environ.get('WORKER_CLASS', 'gthread')
+workers = int(os.environ.get('WEB_CONCURRENCY', max(2, multiprocessing.cpu_count())))
+threads = int(os.environ.get('THREADS', 4))
+worker_connections = int(os.environ.get('WORKER_CONNECTIONS', 1000))
+
+# Read by config.py when the app is preloaded, which happens after this file runs.
+os.environ.setdefault(
+    'SSE_MAX_SUBSCRIBERS',
+    str(max(1, threads // 2) if worker_class == 'gthread' else worker_connections // 2))
+
+accesslog = None
+errorlog = '-'
+
+
+def when_ready(server):
+    # Runs in the master after the preload and before the first fork.
+    import factory
+    import wsgi
+
+    factory.warm_up(wsgi.app)
+    gc.collect()
+    # Move everything allocated so far out of the collector's reach: a collection in a
+    # worker would otherwise write to the shared objects' headers and unshare their pages.
+    gc.freeze()
+    gc.enable()
+
+
+def post_fork(server, worker):
+    import wsgi
+    from models import db
+
+    # Connections opened in the master must not be shared between processes.
+    db.get_engine(wsgi.app).dispose()
+    wsgi.app.extensions['applog'].after_fork()
+    wsgi.app.extensions['shards'].after_fork()
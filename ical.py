@@ -0,0 +1,77 @@
+#----------------------------------------------------------------------------#
+# Incremental iCalendar (RFC 5545) writer.
+#----------------------------------------------------------------------------#
+from datetime import datetime
+
+PRODID = '-//Fyyur//Show Calendar//EN'
+CHUNK_SIZE = 8192
+
+
+def escape_text(value):
+    """Escape a TEXT property value"""
+    return (str(value).replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace(
+        '\r\n', '\\n').replace('\n', '\\n'))
+
+
+def format_datetime(value):
+    return value.strftime('%Y%m%dT%H%M%S')
+
+
+def fold(line):
+    """Fold a content line into 75-octet pieces joined by CRLF + space"""
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line + '\r\n'
+
+    pieces = []
+    limit = 75
+    while encoded:
+        cut = min(limit, len(encoded))
+        # Never split a multi-byte UTF-8 sequence.
+        while cut < len(encoded) and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        pieces.append(encoded[:cut].decode('utf-8'))
+        encoded = encoded[cut:]
+        limit = 74
+    return '\r\n '.join(pieces) + '\r\n'
+
+
+def event_lines(uid, start_time, summary, location=None, url=None, dtstamp=None):
+    yield 'BEGIN:VEVENT'
+    yield 'UID:' + uid
+    yield 'DTSTAMP:' + (dtstamp or format_datetime(datetime.utcnow()) + 'Z')
+    yield 'DTSTART:' + format_datetime(start_time)
+    yield 'SUMMARY:' + escape_text(summary)
+    if location:
+        yield 'LOCATION:' + escape_text(location)
+    if url:
+        yield 'URL:' + url
+    yield 'END:VEVENT'
+
+
+def generate_calendar(name, events):
+    """Yield a calendar as text chunks of roughly CHUNK_SIZE characters.
+
+    `events` is any iterable of dicts holding event_lines() keyword arguments; it is
+    consumed lazily so the whole calendar never has to be held in memory.
+    """
+    dtstamp = format_datetime(datetime.utcnow()) + 'Z'
+    header = [
+        'BEGIN:VCALENDAR', 'VERSION:2.0', 'PRODID:' + PRODID, 'CALSCALE:GREGORIAN',
+        'X-WR-CALNAME:' + escape_text(name)
+    ]
+
+    buffer = [fold(line) for line in header]
+    size = sum(map(len, buffer))
+    for event in events:
+        for line in event_lines(dtstamp=dtstamp, **event):
+            line = fold(line)
+            buffer.append(line)
+            size += len(line)
+        if size >= CHUNK_SIZE:
+            yield ''.join(buffer)
+            buffer = []
+            size = 0
+
+    buffer.append(fold('END:VCALENDAR'))
+    yield ''.join(buffer)
@@ -0,0 +1,356 @@
+#----------------------------------------------------------------------------#
+# Identity cache for venues and artists.
+#----------------------------------------------------------------------------#
+#  Primary-key lookups of venues and artists, with their genre names, are served as
+#  immutable snapshots detached from any session. Each process keeps a bounded LRU (L1)
+#  in front of a CacheStore shared by the workers (L2), which is only asked on an L1
+#  miss and to revalidate L1 entries older than IDENTITY_CACHE_TTL.
+#
+#  Every entity has a version in the store, bumped by the write hooks after commit.
+#  Snapshots are stored under the version read before they were loaded, so a snapshot
+#  loaded while a write commits is filed under the old version and never served once
+#  the new one is seen. Another process's L1 sees the new version within
+#  IDENTITY_CACHE_TTL seconds; this process's at once, since a load that an invalidation
+#  overlapped is returned but not kept in L1.
+#
+#  A store that is not shared (the default MemoryStore) never sees the other workers'
+#  versions, so with it the L2 is skipped and an L1 entry older than IDENTITY_CACHE_TTL
+#  is reloaded from the database rather than revalidated.
+import json
+import threading
+import time
+from collections import namedtuple, OrderedDict
+
+from flask import abort
+
+from models import Artist, ArtistGenre, Venue, VenueGenre
+
+VENUE = 'venue'
+ARTIST = 'artist'
+
+
+class VenueSnapshot(
+        namedtuple('VenueSnapshot', [
+            'id', 'name', 'city', 'state', 'address', 'phone', 'image_link', 'facebook_link',
+            'website', 'seeking_talent', 'seeking_description', 'latitude', 'longitude', 'genres'
+        ])):
+    __slots__ = ()
+
+    @property
+    def city_and_state(self):
+        return self.city + ', ' + self.state
+
+
+class ArtistSnapshot(
+        namedtuple('ArtistSnapshot', [
+            'id', 'name', 'city', 'state', 'phone', 'image_link', 'facebook_link', 'website',
+            'seeking_venue', 'seeking_description', 'genres'
+        ])):
+    __slots__ = ()
+
+    @property
+    def city_and_state(self):
+        return self.city + ', ' + self.state
+
+    @property
+    def serialize(self):
+        """The same dict as Artist.serialize"""
+        return {
+            'id': self.id,
+            'name': self.name,
+            'city': self.city,
+            'state': self.state,
+            'phone': self.phone,
+            'image_link': self.image_link,
+            'facebook_link': self.facebook_link,
+            'website': self.website,
+            'seeking_venue': self.seeking_venue,
+            'seeking_description': self.seeking_description,
+        }
+
+
+# Kind -> (model, genre model, genre owner column, snapshot type)
+KINDS = {
+    VENUE: (Venue, VenueGenre, VenueGenre.venue_id, VenueSnapshot),
+    ARTIST: (Artist, ArtistGenre, ArtistGenre.artist_id, ArtistSnapshot),
+}
+
+
+class CacheStore(object):
+    """The shared L2, holding strings under string keys.
+
+    A store shared by every worker process (a network cache implementing these three
+    methods) lets one worker's loads serve the others and its writes invalidate theirs.
+    """
+
+    # Whether every worker process sees the same store.
+    shared = True
+
+    def get_many(self, keys):
+        """{key: value} for those of `keys` that are stored and not expired"""
+        raise NotImplementedError
+
+    def set_many(self, values, ttl):
+        raise NotImplementedError
+
+    def incr(self, key):
+        """Add one to the integer under `key`, kept without expiry, and return it"""
+        raise NotImplementedError
+
+
+class MemoryStore(CacheStore):
+    """A local stand-in for a shared store: a dict, visible only to the current process"""
+
+    shared = False
+
+    def __init__(self, max_entries=100000):
+        self._lock = threading.Lock()
+        self._values = OrderedDict()
+        self.max_entries = max_entries
+
+    def get_many(self, keys):
+        now = time.monotonic()
+        found = {}
+        with self._lock:
+            for key in keys:
+                entry = self._values.get(key)
+                if entry is not None and (entry[1] is None or entry[1] > now):
+                    found[key] = entry[0]
+        return found
+
+    def set_many(self, values, ttl):
+        expires_at = time.monotonic() + ttl
+        with self._lock:
+            for key, value in values.items():
+                self._values[key] = (value, expires_at)
+                self._values.move_to_end(key)
+            self._evict()
+
+    def incr(self, key):
+        with self._lock:
+            value = int(self._values.get(key, (0, None))[0]) + 1
+            self._values[key] = (str(value), None)
+            self._values.move_to_end(key)
+            self._evict()
+        return value
+
+    def _evict(self):
+        while len(self._values) > self.max_entries:
+            self._values.popitem(last=False)
+
+
+EPOCH_KEY = 'identity:epoch'
+
+
+def version_key(epoch, kind, entity_id):
+    return 'identity:{}:{}:{}:version'.format(epoch, kind, entity_id)
+
+
+def snapshot_key(epoch, kind, entity_id, version):
+    return 'identity:{}:{}:{}:{}'.format(epoch, kind, entity_id, version)
+
+
+def load_snapshots(kind, ids):
+    """Entity id -> snapshot, for those of `ids` that exist"""
+    model, genre_model, genre_owner, snapshot = KINDS[kind]
+    fields = [field for field in snapshot._fields if field != 'genres']
+
+    genres = {}
+    for owner_id, genre_name in genre_model.query.with_entities(
+            genre_owner,
+            genre_model.genre_name).filter(genre_owner.in_(ids)).order_by(genre_model.id):
+        genres.setdefault(owner_id, []).append(genre_name)
+
+    query = model.query.with_entities(*[getattr(model, field) for field in fields])
+    return {
+        row.id: snapshot(*row, genres=tuple(genres.get(row.id, ())))
+        for row in query.filter(model.id.in_(ids))
+    }
+
+
+class IdentityCache(object):
+    """Read-through cache of venue and artist snapshots by primary key"""
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        # Invalidations by this process, numbered, and the number of the latest one for each
+        # recently invalidated (kind, id), oldest first. At most max_entries are remembered;
+        # _forgotten is the number of the latest one dropped.
+        self._invalidation = 0
+        self._invalidated = OrderedDict()
+        self._forgotten = 0
+        self.store = MemoryStore()
+        self.epoch = 0
+        self.max_entries = 10000
+        self.ttl = 5
+        self.store_ttl = 3600
+        self.hits = 0
+        self.misses = 0
+        self.store_hits = 0
+        self.store_misses = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('IDENTITY_CACHE_STORE', 'memory')
+        app.config.setdefault('IDENTITY_CACHE_SIZE', 10000)
+        app.config.setdefault('IDENTITY_CACHE_TTL', 5)
+        app.config.setdefault('IDENTITY_STORE_TTL', 3600)
+
+        kind = app.config['IDENTITY_CACHE_STORE']
+        if kind == 'memory':
+            store = MemoryStore()
+        elif isinstance(kind, CacheStore):
+            store = kind
+        else:
+            raise ValueError('unknown IDENTITY_CACHE_STORE {!r}'.format(kind))
+
+        self.store = store
+        self.max_entries = app.config['IDENTITY_CACHE_SIZE']
+        self.ttl = app.config['IDENTITY_CACHE_TTL']
+        self.store_ttl = app.config['IDENTITY_STORE_TTL']
+        self.epoch = int(self.store.get_many([EPOCH_KEY]).get(EPOCH_KEY, 0))
+        with self._lock:
+            self._entries.clear()
+        app.extensions['identity'] = self
+
+        metrics = app.extensions.get('metrics')
+        if metrics is not None:
+            metrics.register_cache('identity', lambda: (self.hits, self.misses))
+            metrics.register_cache('identity_store', lambda: (self.store_hits, self.store_misses))
+
+    def clear(self):
+        """Retire every snapshot, for when the tables are replaced wholesale.
+
+        Other processes keep the epoch they started with, so this is for single-process
+        jobs like `flask loadtest`, which reseeds the database and then serves it.
+        """
+        epoch = self.store.incr(EPOCH_KEY)
+        with self._lock:
+            self.epoch = epoch
+            self._entries.clear()
+
+    def get(self, kind, entity_id):
+        """The snapshot of one venue or artist, or None when it does not exist"""
+        return self.get_many(kind, [entity_id]).get(entity_id)
+
+    def get_or_404(self, kind, entity_id):
+        snapshot = self.get(kind, entity_id)
+        if snapshot is None:
+            abort(404)
+        return snapshot
+
+    def get_many(self, kind, ids):
+        """Entity id -> snapshot, for those of `ids` that exist"""
+        now = time.monotonic()
+        found = {}
+        stale = {}
+        with self._lock:
+            epoch = self.epoch
+            invalidation = self._invalidation
+            for entity_id in set(ids):
+                entry = self._entries.get((kind, entity_id))
+                if entry is None:
+                    continue
+                snapshot, version, checked_at = entry
+                if checked_at + self.ttl > now:
+                    self._entries.move_to_end((kind, entity_id))
+                    found[entity_id] = snapshot
+                else:
+                    stale[entity_id] = entry
+            self.hits += len(found)
+            self.misses += len(set(ids)) - len(found)
+        missing = [entity_id for entity_id in set(ids) if entity_id not in found]
+        if not missing:
+            return found
+        if not self.store.shared:
+            return self._load(kind, missing, found, epoch, invalidation, now)
+
+        version_keys = {entity_id: version_key(epoch, kind, entity_id) for entity_id in missing}
+        stored_versions = self.store.get_many(list(version_keys.values()))
+        versions = {
+            entity_id: int(stored_versions.get(key, 0)) for entity_id, key in version_keys.items()
+        }
+
+        # Stale L1 entries whose version has not moved are good for another TTL.
+        fresh = {}
+        for entity_id, (snapshot, version, _) in stale.items():
+            if versions[entity_id] == version:
+                fresh[entity_id] = snapshot
+        found.update(fresh)
+        missing = [entity_id for entity_id in missing if entity_id not in fresh]
+
+        loaded = {}
+        store_hits = len(fresh)
+        store_misses = 0
+        if missing:
+            keys = {
+                entity_id: snapshot_key(epoch, kind, entity_id, versions[entity_id])
+                for entity_id in missing
+            }
+            stored = self.store.get_many(list(keys.values()))
+            snapshot_type = KINDS[kind][3]
+            for entity_id, key in keys.items():
+                if key in stored:
+                    fields = json.loads(stored[key])
+                    fields['genres'] = tuple(fields['genres'])
+                    loaded[entity_id] = snapshot_type(**fields)
+            store_hits += len(loaded)
+            store_misses = len(missing) - len(loaded)
+
+            unstored = [entity_id for entity_id in missing if entity_id not in loaded]
+            if unstored:
+                from_database = load_snapshots(kind, unstored)
+                self.store.set_many(
+                    {
+                        keys[entity_id]: json.dumps(snapshot._asdict())
+                        for entity_id, snapshot in from_database.items()
+                    }, self.store_ttl)
+                loaded.update(from_database)
+            found.update(loaded)
+
+        with self._lock:
+            self.store_hits += store_hits
+            self.store_misses += store_misses
+        self._keep(kind, fresh, versions, epoch, invalidation, now)
+        self._keep(kind, loaded, versions, epoch, invalidation, now)
+        return found
+
+    def _load(self, kind, missing, found, epoch, invalidation, now):
+        """Load `missing` from the database into `found`, for a store that is not shared"""
+        loaded = load_snapshots(kind, missing)
+        self._keep(kind, loaded, {}, epoch, invalidation, now)
+        found.update(loaded)
+        return found
+
+    def _keep(self, kind, snapshots, versions, epoch, invalidation, now):
+        """Put snapshots read since invalidation number `invalidation` into L1"""
+        with self._lock:
+            # An invalidation since then may have been forgotten: keep none of them.
+            if self.epoch != epoch or self._forgotten > invalidation:
+                return
+            for entity_id, snapshot in snapshots.items():
+                key = (kind, entity_id)
+                # Invalidated during the load: return the snapshot but don't keep it.
+                if self._invalidated.get(key, 0) > invalidation:
+                    continue
+                self._entries[key] = (snapshot, versions.get(entity_id, 0), now)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, kind, entity_id):
+        """Retire the cached snapshots of an entity; called after its changes commit"""
+        self.store.incr(version_key(self.epoch, kind, entity_id))
+        key = (kind, entity_id)
+        with self._lock:
+            self._entries.pop(key, None)
+            self._invalidation += 1
+            self._invalidated[key] = self._invalidation
+            self._invalidated.move_to_end(key)
+            while len(self._invalidated) > self.max_entries:
+                _, self._forgotten = self._invalidated.popitem(last=False)
+
+
+entities = IdentityCache()
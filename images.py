@@ -0,0 +1,265 @@
+#----------------------------------------------------------------------------#
+# Image proxy: fetched originals, resized variants and their disk cache.
+#----------------------------------------------------------------------------#
+#  Venue and artist image links point anywhere. The proxy fetches each original once,
+#  renders fixed-size JPEG and WebP variants from it and keeps both in a size-bounded
+#  disk LRU. Variant URLs embed a digest of the image link, so the bytes behind a URL
+#  never change and can be cached by browsers for good.
+import hashlib
+import io
+import ipaddress
+import os
+import socket
+import threading
+import urllib.error
+import urllib.request
+from collections import OrderedDict
+from urllib.parse import urlsplit
+
+# Variant name -> bounding box. Images are scaled down to fit, never up or cropped.
+SIZES = {
+    'tile': (400, 400),
+    'profile': (1000, 1000),
+}
+
+FORMATS = {
+    'webp': ('WEBP', 'image/webp', {
+        'quality': 80,
+        'method': 4
+    }),
+    'jpg': ('JPEG', 'image/jpeg', {
+        'quality': 85,
+        'optimize': True,
+        'progressive': True
+    }),
+}
+
+LOCK_STRIPES = 64
+
+
+class ImageError(Exception):
+    """The original could not be fetched or decoded"""
+
+
+def link_digest(image_link):
+    return hashlib.sha256(image_link.encode('utf-8')).hexdigest()[:32]
+
+
+def render(original, size, format):
+    """Scale `original` (encoded image bytes) to fit `size` and encode it as `format`"""
+    from PIL import Image, ImageOps
+
+    try:
+        image = Image.open(io.BytesIO(original))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail(size, Image.LANCZOS)
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        raise ImageError('cannot decode image: {}'.format(e))
+
+    has_alpha = image.mode in ('RGBA', 'LA') or 'transparency' in image.info
+    if format == 'jpg' and has_alpha:
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    else:
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+
+    pil_format, _, options = FORMATS[format]
+    encoded = io.BytesIO()
+    image.save(encoded, pil_format, **options)
+    return encoded.getvalue()
+
+
+#  Fetching
+#  ----------------------------------------------------------------
+
+
+def check_public_url(url):
+    """Refuse non-HTTP URLs and hosts resolving to private, loopback or link-local addresses"""
+    parts = urlsplit(url)
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        raise ImageError('not an http(s) URL: {}'.format(url))
+    try:
+        addresses = socket.getaddrinfo(parts.hostname, parts.port or 80, proto=socket.IPPROTO_TCP)
+    except (socket.gaierror, UnicodeError) as e:
+        raise ImageError('cannot resolve {}: {}'.format(parts.hostname, e))
+    for _, _, _, _, sockaddr in addresses:
+        if not ipaddress.ip_address(sockaddr[0].split('%')[0]).is_global:
+            raise ImageError('refusing to fetch from {}'.format(parts.hostname))
+
+
+class CheckedRedirectHandler(urllib.request.HTTPRedirectHandler):
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        check_public_url(newurl)
+        return super(CheckedRedirectHandler, self).redirect_request(req, fp, code, msg, headers,
+                                                                    newurl)
+
+
+class HTTPFetcher(object):
+    """Fetch an original over HTTP(S), returning its bytes.
+
+    Any callable taking a URL and returning bytes, or raising ImageError, can stand in
+    for it through IMAGE_FETCHER.
+    """
+
+    def __init__(self, timeout=10, max_bytes=10 * 1024 * 1024, allow_private_hosts=False):
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.allow_private_hosts = allow_private_hosts
+        handlers = [] if allow_private_hosts else [CheckedRedirectHandler]
+        self.opener = urllib.request.build_opener(*handlers)
+
+    def __call__(self, url):
+        if not self.allow_private_hosts:
+            check_public_url(url)
+        request = urllib.request.Request(url, headers={'User-Agent': 'fyyur-image-proxy'})
+        try:
+            with self.opener.open(request, timeout=self.timeout) as response:
+                data = response.read(self.max_bytes + 1)
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            raise ImageError('cannot fetch {}: {}'.format(url, e))
+        if len(data) > self.max_bytes:
+            raise ImageError('{} is larger than {} bytes'.format(url, self.max_bytes))
+        return data
+
+
+#  Disk cache
+#  ----------------------------------------------------------------
+
+
+class DiskLRU(object):
+    """Files in one directory, evicted least recently used first past `max_bytes`.
+
+    Recency is kept in memory and mirrored to file mtimes, so it survives restarts.
+    Processes sharing the directory each track it separately; a file another process
+    evicted simply reads as a miss.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.size = 0
+
+        os.makedirs(directory, exist_ok=True)
+        files = [entry for entry in os.scandir(directory) if entry.is_file()]
+        for entry in sorted(files, key=lambda entry: entry.stat().st_mtime):
+            if '.tmp-' in entry.name:
+                os.remove(entry.path)
+            else:
+                self._entries[entry.name] = entry.stat().st_size
+                self.size += entry.stat().st_size
+
+    def path(self, key):
+        return os.path.join(self.directory, key)
+
+    def open(self, key):
+        """An open binary file for `key`, or None on a miss"""
+        try:
+            f = open(self.path(key), 'rb')
+        except FileNotFoundError:
+            with self._lock:
+                self.size -= self._entries.pop(key, 0)
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            else:
+                size = os.fstat(f.fileno()).st_size
+                self._entries[key] = size
+                self.size += size
+        try:
+            os.utime(self.path(key))
+        except OSError:
+            pass
+        return f
+
+    def put(self, key, data):
+        scratch = '{}.tmp-{}-{}'.format(self.path(key), os.getpid(), threading.get_ident())
+        with open(scratch, 'wb') as f:
+            f.write(data)
+        os.replace(scratch, self.path(key))
+
+        with self._lock:
+            self.size += len(data) - self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            evicted = []
+            while self.size > self.max_bytes and len(self._entries) > 1:
+                name, size = self._entries.popitem(last=False)
+                self.size -= size
+                evicted.append(name)
+        for name in evicted:
+            try:
+                os.remove(self.path(name))
+            except FileNotFoundError:
+                pass
+
+
+#  Proxy
+#  ----------------------------------------------------------------
+
+
+class ImageProxy(object):
+    """Serve resized variants of image links out of a DiskLRU"""
+
+    def __init__(self, app=None, fetcher=None):
+        self.fetcher = fetcher
+        self.cache = None
+        # Striped so one fetch or render runs per key at a time; the others wait and then
+        # read the cache. Variants take an original's lock while holding their own, so
+        # the two kinds never share a stripe.
+        self._variant_locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+        self._original_locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('IMAGE_CACHE_DIR', os.path.join(app.instance_path, 'images'))
+        app.config.setdefault('IMAGE_CACHE_MAX_BYTES', 256 * 1024 * 1024)
+        app.config.setdefault('IMAGE_FETCH_TIMEOUT', 10)
+        app.config.setdefault('IMAGE_MAX_BYTES', 10 * 1024 * 1024)
+        app.config.setdefault('IMAGE_ALLOW_PRIVATE_HOSTS', False)
+        app.config.setdefault('IMAGE_FETCHER', None)
+
+        if self.fetcher is None:
+            self.fetcher = app.config['IMAGE_FETCHER'] or HTTPFetcher(
+                app.config['IMAGE_FETCH_TIMEOUT'], app.config['IMAGE_MAX_BYTES'],
+                app.config['IMAGE_ALLOW_PRIVATE_HOSTS'])
+        self.cache = DiskLRU(app.config['IMAGE_CACHE_DIR'], app.config['IMAGE_CACHE_MAX_BYTES'])
+
+        metrics = app.extensions.get('metrics')
+        if metrics is not None:
+            metrics.register_cache('images', lambda: (self.cache.hits, self.cache.misses))
+        app.extensions['images'] = self
+
+    def original(self, image_link, digest):
+        key = digest + '.orig'
+        with self._original_locks[hash(key) % LOCK_STRIPES]:
+            f = self.cache.open(key)
+            if f is not None:
+                with f:
+                    return f.read()
+            data = self.fetcher(image_link)
+            self.cache.put(key, data)
+            return data
+
+    def variant(self, image_link, digest, size, format):
+        """An open file of the variant, rendering it first if it isn't cached"""
+        key = '{}-{}.{}'.format(digest, size, format)
+        f = self.cache.open(key)
+        if f is not None:
+            return f
+        with self._variant_locks[hash(key) % LOCK_STRIPES]:
+            f = self.cache.open(key)
+            if f is None:
+                self.cache.put(key, render(self.original(image_link, digest), SIZES[size], format))
+                f = self.cache.open(key)
+        return f
@@ -0,0 +1,339 @@
+#----------------------------------------------------------------------------#
+# In-memory indexes, caches and write hooks.
+#----------------------------------------------------------------------------#
+from datetime import datetime
+import time
+
+from flask import current_app
+
+import availability
+import events
+import facets
+import identity
+import matching
+import profiles
+import search_cache
+import sharding
+import typeahead
+from models import (db, Artist, ArtistAvailabilityRule, ArtistAvailableTime, ArtistGenre,
+                    IndexGeneration, Show, Venue)
+
+search_results = search_cache.SearchCache()
+
+
+def init_app(app):
+    search_results.max_entries = app.config['SEARCH_CACHE_SIZE']
+    search_results.ttl = app.config['SEARCH_CACHE_TTL']
+    metrics = app.extensions.get('metrics')
+    if metrics is not None:
+        metrics.register_cache('search', lambda: (search_results.hits, search_results.misses))
+        metrics.register_cache('typeahead', lambda:
+                               (typeahead_index.index.hits, typeahead_index.index.misses))
+
+
+#  In-memory indexes are built on first use and then kept in step by the
+#  *_changed() hooks, which every write handler calls after committing.
+#
+#  The hooks only reach the indexes of the process that handled the write, so they also
+#  bump the index's generation in the database. Every process rebuilds its copy once it
+#  sees the generation move, asking at most every INDEX_CHECK_INTERVAL seconds.
+
+
+class SharedGeneration(object):
+    """The generation of an index in the database, and the one this process's copy is of"""
+
+    def __init__(self, name):
+        self.name = name
+        self.built = None
+        self.checked_at = None
+
+    def read(self):
+        return db.session.query(
+            IndexGeneration.generation).filter(IndexGeneration.name == self.name).scalar() or 0
+
+    def is_current(self, interval):
+        """Whether no other process has changed the index since this copy was built"""
+        now = time.monotonic()
+        if self.checked_at is not None and now - self.checked_at < interval:
+            return True
+        self.checked_at = now
+        return self.read() == self.built
+
+    def mark_built(self, generation):
+        self.built = generation
+        self.checked_at = time.monotonic()
+
+    def bumped(self, generation):
+        # This process's copy is updated in step with its own writes, so it is only stale
+        # when another process bumped the generation too.
+        if self.built == generation - 1:
+            self.built = generation
+
+
+def bump_generations(*generations):
+    # A failed bump leaves the other processes' copies stale until the next one.
+    names = [generation.name for generation in generations]
+    table = IndexGeneration.__table__
+    try:
+        updated = db.session.execute(table.update().where(
+            table.c.name.in_(names)).values(generation=table.c.generation + 1)).rowcount
+        if updated < len(names):
+            existing = set(name for (name,) in db.session.query(IndexGeneration.name).filter(
+                IndexGeneration.name.in_(names)))
+            db.session.execute(table.insert(), [{
+                'name': name,
+                'generation': 1
+            } for name in names if name not in existing])
+        current = dict(
+            db.session.query(IndexGeneration.name,
+                             IndexGeneration.generation).filter(IndexGeneration.name.in_(names)))
+        db.session.commit()
+    except:
+        db.session.rollback()
+        current_app.logger.exception('Index generations could not be bumped',
+                                     extra={'indexes': names})
+        return
+
+    for generation in generations:
+        generation.bumped(current[generation.name])
+
+
+match_index = matching.MatchIndex()
+match_generation = SharedGeneration('match')
+
+
+def load_match_entries(artist_ids=None):
+    """Yield (artist_id, genres, dates, recurring) for artists seeking venues.
+
+    `dates` are the available dates from today onwards and `recurring` tells whether the
+    artist has recurring availability rules, which are expanded when matching.
+    """
+    query_artists = Artist.query.with_entities(Artist.id).filter(Artist.seeking_venue == True)
+    query_genres = ArtistGenre.query.join(Artist).with_entities(
+        ArtistGenre.artist_id, ArtistGenre.genre_name).filter(Artist.seeking_venue == True)
+    query_dates = ArtistAvailableTime.query.join(Artist).with_entities(
+        ArtistAvailableTime.artist_id,
+        ArtistAvailableTime.date).filter(Artist.seeking_venue == True,
+                                         ArtistAvailableTime.date >= datetime.now().date())
+    query_recurring = ArtistAvailabilityRule.query.join(Artist).with_entities(
+        ArtistAvailabilityRule.artist_id).filter(Artist.seeking_venue == True).distinct()
+    if artist_ids is not None:
+        query_artists = query_artists.filter(Artist.id.in_(artist_ids))
+        query_genres = query_genres.filter(ArtistGenre.artist_id.in_(artist_ids))
+        query_dates = query_dates.filter(ArtistAvailableTime.artist_id.in_(artist_ids))
+        query_recurring = query_recurring.filter(ArtistAvailabilityRule.artist_id.in_(artist_ids))
+
+    genres = {}
+    for artist_id, genre_name in query_genres:
+        genres.setdefault(artist_id, []).append(genre_name)
+    dates = {}
+    for artist_id, date in query_dates:
+        dates.setdefault(artist_id, []).append(date)
+
+    recurring = set(artist_id for (artist_id,) in query_recurring)
+
+    for (artist_id,) in query_artists:
+        yield artist_id, genres.get(artist_id, []), dates.get(artist_id, []), artist_id in recurring
+
+
+def ensure_match_index():
+    """Build the match index, or rebuild it once another process has changed its artists"""
+    if match_index.built and match_generation.is_current(
+            current_app.config['INDEX_CHECK_INTERVAL']):
+        return
+
+    generation = match_generation.read()
+    match_index.build(load_match_entries())
+    match_generation.mark_built(generation)
+
+
+typeahead_index = typeahead.Typeahead()
+typeahead_generation = SharedGeneration('typeahead')
+
+
+def upcoming_show_counts(column, ids=None):
+    query = db.session.query(column,
+                             db.func.count(Show.id)).filter(Show.start_time > datetime.now())
+    if ids is not None:
+        query = query.filter(column.in_(ids))
+    return dict(query.group_by(column))
+
+
+def ensure_typeahead_index():
+    """Build the typeahead index, or rebuild it once it has gone stale.
+
+    It goes stale when its show counts are TYPEAHEAD_REBUILD_INTERVAL seconds old, or when
+    another process has changed venues, artists or shows.
+    """
+    built_at = typeahead_index.built_at
+    if (built_at is not None and
+            time.monotonic() - built_at < current_app.config['TYPEAHEAD_REBUILD_INTERVAL'] and
+            typeahead_generation.is_current(current_app.config['INDEX_CHECK_INTERVAL'])):
+        return
+
+    generation = typeahead_generation.read()
+    venue_counts = upcoming_show_counts(Show.venue_id)
+    artist_counts = upcoming_show_counts(Show.artist_id)
+    typeahead_index.build(
+        [(venue.id, venue.name, venue.city_and_state, venue_counts.get(venue.id, 0))
+         for venue in Venue.query.with_entities(Venue.id, Venue.name, Venue.city_and_state)],
+        [(artist.id, artist.name, artist.city_and_state, artist_counts.get(artist.id, 0))
+         for artist in Artist.query.with_entities(Artist.id, Artist.name, Artist.city_and_state)])
+    typeahead_generation.mark_built(generation)
+
+
+def refresh_profiles(venue_ids=(), artist_ids=()):
+    # The write itself is already committed; a failed refresh leaves the old documents.
+    try:
+        profiles.refresh(venue_ids, artist_ids)
+    except:
+        db.session.rollback()
+        current_app.logger.exception('Profile documents could not be refreshed',
+                                     extra={
+                                         'venue_ids': sorted(venue_ids),
+                                         'artist_ids': sorted(artist_ids)
+                                     })
+
+
+def sync_shards(sync, *args):
+    # As with the profiles, a failed sync leaves the shards stale; `flask shards rebuild`
+    # brings them back in step.
+    try:
+        sync(*args)
+    except:
+        db.session.rollback()
+        current_app.logger.exception('Shards could not be updated', extra={'sync': sync.__name__})
+
+
+def venue_changed(venue_id):
+    bump_generations(typeahead_generation)
+    search_results.invalidate('venues')
+    identity.entities.invalidate(identity.VENUE, venue_id)
+    # Artist profiles list the venue's name and image beside each show.
+    _, artist_ids, _ = profiles.show_participants(venue_ids=[venue_id])
+    refresh_profiles([venue_id], artist_ids)
+    sync_shards(sharding.sync_venues, [venue_id])
+
+    if typeahead_index.built_at is not None:
+        venue = Venue.query.with_entities(
+            Venue.id, Venue.name, Venue.city_and_state).filter(Venue.id == venue_id).first()
+        if venue is None:
+            typeahead_index.remove_venue(venue_id)
+        else:
+            typeahead_index.put_venue(
+                venue.id, venue.name, venue.city_and_state,
+                upcoming_show_counts(Show.venue_id, [venue_id]).get(venue_id, 0))
+
+
+def artist_changed(artist_id):
+    bump_generations(match_generation, typeahead_generation)
+    search_results.invalidate('artists')
+    availability.expansions.invalidate(artist_id)
+    identity.entities.invalidate(identity.ARTIST, artist_id)
+    venue_ids, _, _ = profiles.show_participants(artist_ids=[artist_id])
+    refresh_profiles(venue_ids, [artist_id])
+    sync_shards(sharding.sync_artists, [artist_id])
+
+    if match_index.built:
+        match_index.remove_artist(artist_id)
+        for entry in load_match_entries([artist_id]):
+            match_index.update_artist(*entry)
+
+    if typeahead_index.built_at is not None:
+        artist = Artist.query.with_entities(
+            Artist.id, Artist.name, Artist.city_and_state).filter(Artist.id == artist_id).first()
+        if artist is None:
+            typeahead_index.remove_artist(artist_id)
+        else:
+            typeahead_index.put_artist(
+                artist.id, artist.name, artist.city_and_state,
+                upcoming_show_counts(Show.artist_id, [artist_id]).get(artist_id, 0))
+
+
+def entities_deleted(venue_ids=(), artist_ids=(), participants=((), (), ())):
+    """Hook for deletes, which also cascade to shows and so to upcoming-show counts.
+
+    `participants` are the (venue_ids, artist_ids, show_ids) that
+    profiles.show_participants() found for the deleted rows before they were deleted.
+    """
+    generations = [typeahead_generation]
+    if artist_ids:
+        generations.append(match_generation)
+    bump_generations(*generations)
+    search_results.invalidate('venues')
+    search_results.invalidate('artists')
+    typeahead_index.invalidate()
+    for artist_id in artist_ids:
+        match_index.remove_artist(artist_id)
+        availability.expansions.invalidate(artist_id)
+        identity.entities.invalidate(identity.ARTIST, artist_id)
+    for venue_id in venue_ids:
+        identity.entities.invalidate(identity.VENUE, venue_id)
+    refresh_profiles(set(venue_ids) | set(participants[0]), set(artist_ids) | set(participants[1]))
+    sync_shards(sharding.delete, venue_ids, artist_ids, participants[2])
+    for show_id in sorted(participants[2]):
+        events.show_events.publish('show_deleted', {'id': show_id})
+
+
+def shows_created(shows):
+    """Hook for new shows, given as (show_id, venue_id, artist_id, start_time) tuples"""
+    bump_generations(typeahead_generation)
+    search_results.invalidate('venues')
+    search_results.invalidate('artists')
+
+    if typeahead_index.built_at is not None:
+        now = datetime.now()
+        for _, venue_id, artist_id, start_time in shows:
+            if start_time > now:
+                typeahead_index.add_upcoming_show(venue_id, artist_id)
+
+    refresh_profiles(set(show[1] for show in shows), set(show[2] for show in shows))
+    sync_shards(sharding.sync_shows, [show[0] for show in shows])
+
+    for show_id, venue_id, artist_id, start_time in shows:
+        events.show_events.publish(
+            'show_created', {
+                'id': show_id,
+                'venue_id': venue_id,
+                'artist_id': artist_id,
+                'start_time': start_time.isoformat(),
+            })
+
+
+def show_created(show_id, venue_id, artist_id, start_time):
+    shows_created([(show_id, venue_id, artist_id, start_time)])
+
+
+#  Search
+#  ----------------------------------------------------------------
+
+
+def search(namespace, search_term, filters=None, limit=None, offset=0):
+    """Partial name or exact "City, ST" matches, served from the search cache when possible.
+
+    Results carry the facet counts of all matches, and `filters` narrows them by facet value.
+    With shards enabled, unfiltered searches of every match are served by the shards,
+    without facet counts.
+    """
+    filters = filters or {}
+    term = search_cache.normalize_term(search_term)
+    variant = facets.cache_variant(filters, limit, offset)
+    results, generation = search_results.get(namespace, term, variant)
+    if results is not None:
+        return results
+
+    if sharding.shards.enabled and not filters and limit is None and not offset:
+        rows = sharding.search(namespace, term)
+        results = {
+            "count": len(rows),
+            "data": [{
+                "id": id,
+                "name": name,
+                "num_upcoming_shows": num_upcoming_shows,
+            } for id, name, num_upcoming_shows in rows],
+            "facets": None,
+        }
+    else:
+        results = facets.search(namespace, term, filters, limit, offset)
+    search_results.set(namespace, term, results, generation, variant)
+    return results
@@ -0,0 +1,116 @@
+#----------------------------------------------------------------------------#
+# Loader policies and query budgets.
+#----------------------------------------------------------------------------#
+#  Relationships on the models are lazy, so a template that walks `venue.genres` for
+#  every venue on a page issues one query per venue. Routes that need relationships
+#  or only a few columns get them through a loader policy instead, and @query_budget
+#  catches a route that starts issuing more queries than it was written for.
+import functools
+
+from flask import current_app, g, has_request_context, request, stream_with_context
+from sqlalchemy.orm import load_only, selectinload
+
+from models import Artist, Venue
+
+# Endpoint -> model -> loader options applied by policy_query().
+POLICIES = {
+    'index': {
+        Venue: (
+            load_only('id', 'name', 'city', 'state', 'image_link'),
+            selectinload(Venue.genres).load_only('genre_name'),
+        ),
+        Artist: (
+            load_only('id', 'name', 'city', 'state', 'image_link'),
+            selectinload(Artist.genres).load_only('genre_name'),
+        ),
+    },
+    'venues.venues': {
+        Venue: (load_only('id', 'name', 'city', 'state'),),
+    },
+    'artists.artists': {
+        Artist: (load_only('id', 'name'),),
+    },
+}
+
+
+class LoaderPolicies(object):
+    """Registry of the loader options each endpoint applies to each model"""
+
+    def __init__(self, policies=None):
+        self.policies = {}
+        for endpoint, models in (policies or {}).items():
+            for model, options in models.items():
+                self.register(endpoint, model, *options)
+
+    def register(self, endpoint, model, *options):
+        self.policies.setdefault(endpoint, {}).setdefault(model, []).extend(options)
+
+    def options(self, model, endpoint=None):
+        if endpoint is None and has_request_context():
+            endpoint = request.endpoint
+        return self.policies.get(endpoint, {}).get(model, [])
+
+
+loader_policies = LoaderPolicies(POLICIES)
+
+
+def policy_query(model):
+    """`model.query` with the current endpoint's loader policy applied"""
+    return model.query.options(*loader_policies.options(model))
+
+
+#  Query budgets
+#  ----------------------------------------------------------------
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def check_query_budget(limit, used):
+    if used <= limit:
+        return
+    if current_app.testing or current_app.config['QUERY_BUDGET_RAISE']:
+        raise QueryBudgetExceeded('{} ran {} queries, over its budget of {}'.format(
+            request.endpoint, used, limit))
+    current_app.logger.warning('Query budget exceeded', extra={'budget': limit, 'queries': used})
+
+
+def query_budget(limit):
+    """Allow a view at most `limit` queries, counted by the metrics extension.
+
+    An overrun raises QueryBudgetExceeded when the app is testing or
+    QUERY_BUDGET_RAISE is set, and is logged as a warning otherwise. A streamed response
+    is checked once it has been sent, so the queries it runs while streaming count too.
+    """
+
+    def decorator(f):
+
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            before = getattr(g, 'db_queries', None)
+            response = f(*args, **kwargs)
+            if before is None:
+                return response
+
+            if getattr(response, 'is_streamed', False):
+                response.response = stream_with_context(
+                    checked_stream(response.response, limit, before))
+            else:
+                check_query_budget(limit, g.db_queries - before)
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def checked_stream(chunks, limit, before):
+    # Runs inside stream_with_context, so g is still this request's.
+    try:
+        for chunk in chunks:
+            yield chunk
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+    check_query_budget(limit, g.db_queries - before)
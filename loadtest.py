@@ -0,0 +1,259 @@
+#----------------------------------------------------------------------------#
+# Load generator for `flask loadtest`.
+#----------------------------------------------------------------------------#
+import http.client
+import math
+import random
+import threading
+import time
+from datetime import date, datetime, time as clock, timedelta
+from urllib.parse import urlencode
+
+from werkzeug.serving import make_server
+
+import geo
+
+GENRES = ('Alternative', 'Blues', 'Classical', 'Country', 'Electronic', 'Folk', 'Funk', 'Hip-Hop',
+          'Heavy Metal', 'Instrumental', 'Jazz', 'Musical Theatre', 'Pop', 'Punk', 'R&B', 'Reggae',
+          'Rock n Roll', 'Soul', 'Other')
+WORDS = ('Blue', 'Red', 'Velvet', 'Electric', 'Golden', 'Midnight', 'Silver', 'Wild', 'Lucky',
+         'Iron', 'Crystal', 'Neon', 'Hollow', 'Rolling', 'Howling', 'Paper', 'Stone', 'Echo')
+VENUE_KINDS = ('Room', 'Hall', 'Lounge', 'Tavern', 'Theatre', 'Club', 'Garden', 'Cellar')
+ARTIST_KINDS = ('Band', 'Collective', 'Trio', 'Quartet', 'Orchestra', 'Project', 'Choir')
+
+# Route name -> relative weight in the request mix.
+DEFAULT_MIX = {
+    'home': 5,
+    'venues': 15,
+    'artists': 15,
+    'shows': 10,
+    'search_venues': 10,
+    'search_artists': 10,
+    'show_venue': 15,
+    'show_artist': 15,
+    'create_show': 5,
+}
+
+
+def generate_dataset(venues=200, artists=500, shows=2000, available_days=60, seed=0):
+    """Build table name -> rows of a reproducible catalogue, with explicit ids"""
+    rng = random.Random(seed)
+    cities = sorted(geo.city_centroids().items())
+    today = date.today()
+    now = datetime.now().replace(minute=0, second=0, microsecond=0)
+
+    def name(kinds):
+        return '{} {} {}'.format(rng.choice(WORDS), rng.choice(WORDS), rng.choice(kinds))
+
+    def phone():
+        return '{}-{}-{}'.format(rng.randint(200, 999), rng.randint(200, 999),
+                                 rng.randint(1000, 9999))
+
+    dataset = {
+        table: [] for table in ('venues', 'venue_genres', 'artists', 'artist_genres',
+                                'artist_available_times', 'shows')
+    }
+    for venue_id in range(1, venues + 1):
+        (city, state), (latitude, longitude) = rng.choice(cities)
+        dataset['venues'].append({
+            'id': venue_id,
+            'name': name(VENUE_KINDS),
+            'city': city.title(),
+            'state': state,
+            'address': '{} Main Street'.format(rng.randint(1, 9999)),
+            'phone': phone(),
+            'seeking_talent': rng.random() < 0.5,
+            'seeking_description': None,
+            'latitude': latitude,
+            'longitude': longitude,
+            'geohash': geo.encode(latitude, longitude),
+        })
+        for genre in rng.sample(GENRES, rng.randint(1, 3)):
+            dataset['venue_genres'].append({'venue_id': venue_id, 'genre_name': genre})
+
+    for artist_id in range(1, artists + 1):
+        (city, state), _ = rng.choice(cities)
+        dataset['artists'].append({
+            'id': artist_id,
+            'name': name(ARTIST_KINDS),
+            'city': city.title(),
+            'state': state,
+            'phone': phone(),
+            'seeking_venue': True,
+            'seeking_description': None,
+        })
+        for genre in rng.sample(GENRES, rng.randint(1, 3)):
+            dataset['artist_genres'].append({'artist_id': artist_id, 'genre_name': genre})
+        for day in rng.sample(range(1, available_days + 1), min(10, available_days)):
+            dataset['artist_available_times'].append({
+                'artist_id': artist_id,
+                'date': today + timedelta(days=day),
+                'time_from': clock(18),
+                'time_to': clock(23),
+            })
+
+    for show_id in range(1, shows + 1):
+        dataset['shows'].append({
+            'id': show_id,
+            'venue_id': rng.randint(1, venues),
+            'artist_id': rng.randint(1, artists),
+            'start_time': now + timedelta(hours=rng.randint(-24 * 150, 24 * 90)),
+        })
+    return dataset
+
+
+def build_requests(dataset):
+    """Route name -> function(rng) returning (method, path, form data or None)"""
+    venue_ids = [row['id'] for row in dataset['venues']]
+    artist_ids = [row['id'] for row in dataset['artists']]
+    slots = dataset['artist_available_times']
+
+    def create_show(rng):
+        slot = rng.choice(slots)
+        start_time = datetime.combine(slot['date'], clock(rng.randint(18, 22)))
+        return 'POST', '/shows/create', {
+            'artist_id': slot['artist_id'],
+            'venue_id': rng.choice(venue_ids),
+            'start_time': start_time.strftime('%Y-%m-%d %H:%M:%S'),
+        }
+
+    return {
+        'home':
+            lambda rng: ('GET', '/', None),
+        'venues':
+            lambda rng: ('GET', '/venues', None),
+        'artists':
+            lambda rng: ('GET', '/artists', None),
+        'shows':
+            lambda rng: ('GET', '/shows', None),
+        'search_venues':
+            lambda rng: ('POST', '/venues/search', {
+                'search_term': rng.choice(WORDS)[:rng.randint(2, 4)]
+            }),
+        'search_artists':
+            lambda rng: ('POST', '/artists/search', {
+                'search_term': rng.choice(WORDS)[:rng.randint(2, 4)]
+            }),
+        'show_venue':
+            lambda rng: ('GET', '/venues/{}'.format(rng.choice(venue_ids)), None),
+        'show_artist':
+            lambda rng: ('GET', '/artists/{}'.format(rng.choice(artist_ids)), None),
+        'create_show':
+            create_show,
+    }
+
+
+class LocalServer(object):
+    """Serve `app` from a background thread on an ephemeral port"""
+
+    def __init__(self, app, host='127.0.0.1', port=0):
+        self.server = make_server(host, port, app, threaded=True)
+        self.host = host
+        self.port = self.server.port
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self._thread.join()
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an ascending list"""
+    if not ordered:
+        return None
+    return ordered[max(0, int(math.ceil(fraction * len(ordered))) - 1)]
+
+
+def run(host, port, requests, mix, concurrency=8, duration=30, warmup=5, seed=0, timeout=30):
+    """Replay the weighted route mix from `concurrency` threads for warmup + duration seconds.
+
+    Returns route name -> list of (latency in seconds, status or None on a connection
+    error), for requests started after the warmup.
+    """
+    names = sorted(mix)
+    weights = [mix[name] for name in names]
+    started = time.perf_counter()
+    measure_from = started + warmup
+    stop_at = measure_from + duration
+    samples = [{} for _ in range(concurrency)]
+
+    def worker(index):
+        rng = random.Random('{}:{}'.format(seed, index))
+        own = samples[index]
+        while True:
+            name = rng.choices(names, weights)[0]
+            method, path, form = requests[name](rng)
+            request_started = time.perf_counter()
+            if request_started >= stop_at:
+                return
+
+            status = None
+            connection = http.client.HTTPConnection(host, port, timeout=timeout)
+            try:
+                if form is None:
+                    connection.request(method, path)
+                else:
+                    connection.request(method, path, urlencode(form),
+                                       {'Content-Type': 'application/x-www-form-urlencoded'})
+                response = connection.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException):
+                pass
+            finally:
+                connection.close()
+
+            if request_started >= measure_from:
+                own.setdefault(name, []).append((time.perf_counter() - request_started, status))
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    merged = {}
+    for own in samples:
+        for name, route_samples in own.items():
+            merged.setdefault(name, []).extend(route_samples)
+    return merged
+
+
+def summarize(samples, duration):
+    """Throughput and latency percentiles (ms) per route and in total"""
+
+    def stats(route_samples):
+        latencies = sorted(latency * 1000 for latency, _ in route_samples)
+        errors = sum(1 for _, status in route_samples if status is None or status >= 500)
+        return {
+            'requests': len(route_samples),
+            'errors': errors,
+            'throughput': round(len(route_samples) / duration, 2),
+            'mean_ms': round(sum(latencies) / len(latencies), 3) if latencies else None,
+            'p50_ms': round(percentile(latencies, 0.50), 3) if latencies else None,
+            'p95_ms': round(percentile(latencies, 0.95), 3) if latencies else None,
+            'p99_ms': round(percentile(latencies, 0.99), 3) if latencies else None,
+            'max_ms': round(latencies[-1], 3) if latencies else None,
+        }
+
+    return {
+        'routes': {name: stats(route_samples) for name, route_samples in sorted(samples.items())},
+        'total': stats([sample for route_samples in samples.values() for sample in route_samples]),
+    }
+
+
+def format_report(summary):
+    lines = [
+        '{:<16} {:>8} {:>7} {:>9} {:>9} {:>9} {:>9}'.format('route', 'requests', 'errors', 'req/s',
+                                                            'p50 ms', 'p95 ms', 'p99 ms')
+    ]
+    rows = list(summary['routes'].items()) + [('TOTAL', summary['total'])]
+    for name, stats in rows:
+        lines.append('{:<16} {:>8} {:>7} {:>9} {:>9} {:>9} {:>9}'.format(
+            name, stats['requests'], stats['errors'], stats['throughput'], stats['p50_ms'],
+            stats['p95_ms'], stats['p99_ms']))
+    return '\n'.join(lines)
@@ -0,0 +1,132 @@
+#----------------------------------------------------------------------------#
+# Talent matchmaking over inverted indexes.
+#----------------------------------------------------------------------------#
+import heapq
+import threading
+from collections import Counter
+from datetime import timedelta
+
+
+class MatchIndex(object):
+    """In-memory inverted indexes of artists seeking venues.
+
+    genre -> artist ids and date -> artist ids let a venue's request be answered with a
+    handful of set operations instead of a join over every artist and availability row.
+    Recurring availability is not expanded into the index: it only records which artists
+    have rules, and match() is given their dates for the window it is asked about.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.built = False
+        self.artists_by_genre = {}
+        self.artists_by_date = {}
+        self.genres_by_artist = {}
+        self.dates_by_artist = {}
+        self.recurring = set()
+
+    def build(self, entries):
+        """Replace the index with `entries`, (artist_id, genres, dates, recurring) tuples.
+
+        `recurring` tells whether the artist also has recurring availability rules.
+        """
+        with self._lock:
+            self.artists_by_genre = {}
+            self.artists_by_date = {}
+            self.genres_by_artist = {}
+            self.dates_by_artist = {}
+            self.recurring = set()
+            for artist_id, genres, dates, recurring in entries:
+                self._add(artist_id, genres, dates, recurring)
+            self.built = True
+
+    def update_artist(self, artist_id, genres, dates, recurring=False):
+        with self._lock:
+            self._remove(artist_id)
+            self._add(artist_id, genres, dates, recurring)
+
+    def remove_artist(self, artist_id):
+        with self._lock:
+            self._remove(artist_id)
+
+    def _add(self, artist_id, genres, dates, recurring=False):
+        genres = frozenset(genres)
+        dates = frozenset(dates)
+        self.genres_by_artist[artist_id] = genres
+        self.dates_by_artist[artist_id] = dates
+        if recurring:
+            self.recurring.add(artist_id)
+        for genre in genres:
+            self.artists_by_genre.setdefault(genre, set()).add(artist_id)
+        for date in dates:
+            self.artists_by_date.setdefault(date, set()).add(artist_id)
+
+    def _remove(self, artist_id):
+        self.recurring.discard(artist_id)
+        for genre in self.genres_by_artist.pop(artist_id, ()):
+            artist_ids = self.artists_by_genre[genre]
+            artist_ids.discard(artist_id)
+            if not artist_ids:
+                del self.artists_by_genre[genre]
+        for date in self.dates_by_artist.pop(artist_id, ()):
+            artist_ids = self.artists_by_date[date]
+            artist_ids.discard(artist_id)
+            if not artist_ids:
+                del self.artists_by_date[date]
+
+    def recurring_artists(self, genres):
+        """Artists with recurring availability who share one of `genres`"""
+        genres = set(genres)
+        with self._lock:
+            return [
+                artist_id for artist_id in self.recurring
+                if self.genres_by_artist[artist_id] & genres
+            ]
+
+    def match(self, genres, start_date, end_date, limit=20, recurring_dates=None):
+        """Rank artists sharing `genres` and available on a day in [start_date, end_date].
+
+        `recurring_dates` maps artists to the dates their recurring availability adds in
+        the window. Returns (artist_id, shared_genres, available_dates) tuples, best match
+        first: most shared genres, then most available days, then lowest id.
+        """
+        genres = set(genres)
+        with self._lock:
+            dates_by_artist = {}
+            for artist_id, dates in (recurring_dates or {}).items():
+                if artist_id in self.genres_by_artist and dates:
+                    dates_by_artist[artist_id] = set(dates)
+
+            available = set(dates_by_artist)
+            date = start_date
+            while date <= end_date:
+                for artist_id in self.artists_by_date.get(date, ()):
+                    available.add(artist_id)
+                    dates_by_artist.setdefault(artist_id, set()).add(date)
+                date += timedelta(days=1)
+
+            shared = Counter()
+            for genre in genres:
+                shared.update(self.artists_by_genre.get(genre, set()) & available)
+            if not shared:
+                return []
+
+            # Walk tiers of equal shared-genre counts, best first, and only rank as many
+            # tiers as are needed to fill the limit.
+            tiers = {}
+            for artist_id, count in shared.items():
+                tiers.setdefault(count, []).append(artist_id)
+
+            ranked = []
+            for count in sorted(tiers, reverse=True):
+                tier = tiers[count]
+                ranked.extend(
+                    heapq.nsmallest(limit - len(ranked),
+                                    tier,
+                                    key=lambda artist_id:
+                                    (-len(dates_by_artist[artist_id]), artist_id)))
+                if len(ranked) >= limit:
+                    break
+
+            return [(artist_id, sorted(self.genres_by_artist[artist_id] & genres),
+                     sorted(dates_by_artist[artist_id])) for artist_id in ranked]
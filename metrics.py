@@ -0,0 +1,278 @@
+#----------------------------------------------------------------------------#
+# Prometheus-style metrics.
+#----------------------------------------------------------------------------#
+import threading
+import time
+from bisect import bisect_left
+
+from flask import Response, current_app, g, has_app_context, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Metric(object):
+    """Base for metrics recorded into per-thread shards.
+
+    Each thread only ever writes to its own shard, so recording takes no lock; the lock
+    is only taken the first time a thread records, and when a scrape merges the shards.
+    """
+    type = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._shards = []
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append(shard)
+        return shard
+
+    def _snapshot(self):
+        with self._lock:
+            return [dict(shard) for shard in self._shards]
+
+    def _labels(self, values, extra=()):
+        pairs = list(zip(self.labelnames, values)) + list(extra)
+        if not pairs:
+            return ''
+        return '{' + ','.join(
+            '{}="{}"'.format(name, escape_label(value)) for name, value in pairs) + '}'
+
+    def render(self):
+        lines = [
+            '# HELP {} {}'.format(self.name, self.help),
+            '# TYPE {} {}'.format(self.name, self.type)
+        ]
+        lines.extend(self.samples())
+        return lines
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, labels=(), amount=1):
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    def values(self):
+        totals = {}
+        for shard in self._snapshot():
+            for labels, value in shard.items():
+                totals[labels] = totals.get(labels, 0) + value
+        return totals
+
+    def samples(self):
+        for labels, value in sorted(self.values().items()):
+            yield '{}{} {}'.format(self.name, self._labels(labels), format_value(value))
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        super(Histogram, self).__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, labels, value):
+        shard = self._shard()
+        state = shard.get(labels)
+        if state is None:
+            state = shard[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        state[0][bisect_left(self.buckets, value)] += 1
+        state[1] += value
+        state[2] += 1
+
+    def samples(self):
+        totals = {}
+        for shard in self._snapshot():
+            for labels, (counts, total, count) in shard.items():
+                merged = totals.setdefault(labels, [[0] * (len(self.buckets) + 1), 0.0, 0])
+                for i, bucket_count in enumerate(counts):
+                    merged[0][i] += bucket_count
+                merged[1] += total
+                merged[2] += count
+
+        for labels, (counts, total, count) in sorted(totals.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                yield '{}_bucket{} {}'.format(self.name,
+                                              self._labels(labels, [('le', format_value(bound))]),
+                                              cumulative)
+            yield '{}_sum{} {}'.format(self.name, self._labels(labels), format_value(total))
+            yield '{}_count{} {}'.format(self.name, self._labels(labels), count)
+
+
+class Gauge(Metric):
+    """A gauge read at scrape time from `collect`, which returns {labels: value}"""
+    type = 'gauge'
+
+    def __init__(self, name, help, labelnames=(), collect=None):
+        super(Gauge, self).__init__(name, help, labelnames)
+        self.collect = collect
+
+    def samples(self):
+        for labels, value in sorted(self.collect().items()):
+            yield '{}{} {}'.format(self.name, self._labels(labels), format_value(value))
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return repr(value)
+    return str(value)
+
+
+class Registry(object):
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+class AppMetrics(object):
+    """Request, database and cache instrumentation served at /metrics"""
+
+    # The instance of the app created last, which records statements run outside any app
+    # context, such as those of the shards' fan-out threads.
+    latest = None
+
+    def __init__(self, app=None, db=None):
+        self.registry = Registry()
+        self.caches = {}
+        self.db = db
+
+        self.request_latency = self.registry.register(
+            Histogram('fyyur_request_duration_seconds', 'Request latency.',
+                      ('endpoint', 'method', 'status')))
+        self.response_size = self.registry.register(
+            Histogram('fyyur_response_size_bytes',
+                      'Response body size, for responses with a known length.', ('endpoint',),
+                      buckets=SIZE_BUCKETS))
+        self.request_errors = self.registry.register(
+            Counter('fyyur_request_errors_total', 'Requests answered with a 5xx status.',
+                    ('endpoint', 'status')))
+        self.db_queries = self.registry.register(
+            Histogram('fyyur_db_query_duration_seconds',
+                      'Database statement execution time.',
+                      buckets=QUERY_BUCKETS))
+        self.registry.register(
+            Gauge('fyyur_db_pool_connections', 'Connections in the SQLAlchemy pool by state.',
+                  ('state',), self.collect_pool))
+        self.registry.register(
+            Gauge('fyyur_cache_hits', 'Cache hits since start.', ('cache',),
+                  lambda: self.collect_caches(0)))
+        self.registry.register(
+            Gauge('fyyur_cache_misses', 'Cache misses since start.', ('cache',),
+                  lambda: self.collect_caches(1)))
+        self.registry.register(
+            Gauge('fyyur_cache_hit_ratio', 'Hits over lookups since start.', ('cache',),
+                  self.collect_hit_ratios))
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+        app.add_url_rule('/metrics', 'metrics', self.serve)
+        # The listeners are attached once per process however many apps are created, so
+        # that each statement is recorded once, by the app it ran under.
+        for name, listener in (('before_cursor_execute', before_cursor_execute),
+                               ('after_cursor_execute', after_cursor_execute)):
+            if not event.contains(Engine, name, listener):
+                event.listen(Engine, name, listener)
+        AppMetrics.latest = self
+        app.extensions['metrics'] = self
+
+    def register_cache(self, name, stats):
+        """Report a cache; `stats` returns its (hits, misses)"""
+        self.caches[name] = stats
+
+    def before_request(self):
+        g.request_started = time.perf_counter()
+        g.db_queries = 0
+        g.db_time = 0.0
+
+    def after_request(self, response):
+        started = getattr(g, 'request_started', None)
+        if started is None:
+            return response
+
+        endpoint = request.endpoint or 'unmatched'
+        status = str(response.status_code)
+        self.request_latency.observe((endpoint, request.method, status),
+                                     time.perf_counter() - started)
+        if not response.is_streamed and response.content_length is not None:
+            self.response_size.observe((endpoint,), response.content_length)
+        if response.status_code >= 500:
+            self.request_errors.inc((endpoint, status))
+        return response
+
+    def observe_query(self, elapsed):
+        self.db_queries.observe((), elapsed)
+        if has_request_context() and hasattr(g, 'db_queries'):
+            g.db_queries += 1
+            g.db_time += elapsed
+
+    def collect_pool(self):
+        if self.db is None:
+            return {}
+        pool = self.db.engine.pool
+        gauges = {}
+        for state, method in (('checked_out', 'checkedout'), ('checked_in', 'checkedin'),
+                              ('overflow', 'overflow'), ('size', 'size')):
+            if hasattr(pool, method):
+                gauges[(state,)] = getattr(pool, method)()
+        return gauges
+
+    def collect_caches(self, index):
+        return {(name,): stats()[index] for name, stats in self.caches.items()}
+
+    def collect_hit_ratios(self):
+        ratios = {}
+        for name, stats in self.caches.items():
+            hits, misses = stats()
+            ratios[(name,)] = float(hits) / (hits + misses) if hits + misses else 0.0
+        return ratios
+
+    def serve(self):
+        return Response(self.registry.render(), content_type=CONTENT_TYPE)
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_started'].pop()
+    app_metrics = current_app.extensions.get('metrics') if has_app_context() else AppMetrics.latest
+    if app_metrics is not None:
+        app_metrics.observe_query(elapsed)
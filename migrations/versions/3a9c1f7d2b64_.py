@@ -0,0 +1,29 @@
+"""Add venue coordinates and geohash index
+
+Revision ID: 3a9c1f7d2b64
+Revises: 5f263d2aea7e
+Create Date: 2026-10-19 09:12:31.402177
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '3a9c1f7d2b64'
+down_revision = '5f263d2aea7e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('venues', sa.Column('latitude', sa.Float(), nullable=True))
+    op.add_column('venues', sa.Column('longitude', sa.Float(), nullable=True))
+    op.add_column('venues', sa.Column('geohash', sa.String(length=12), nullable=True))
+    op.create_index(op.f('ix_venues_geohash'), 'venues', ['geohash'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_venues_geohash'), table_name='venues')
+    op.drop_column('venues', 'geohash')
+    op.drop_column('venues', 'longitude')
+    op.drop_column('venues', 'latitude')
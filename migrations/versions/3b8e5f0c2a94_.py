@@ -0,0 +1,36 @@
+"""Add artist_availability_rules for recurring availability
+
+Revision ID: 3b8e5f0c2a94
+Revises: 9a4d2c6e1b70
+Create Date: 2026-10-19 19:05:27.641930
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '3b8e5f0c2a94'
+down_revision = '9a4d2c6e1b70'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('artist_availability_rules', sa.Column('id', sa.Integer(), nullable=False),
+                    sa.Column('artist_id', sa.Integer(), nullable=False),
+                    sa.Column('rrule', sa.String(length=255), nullable=False),
+                    sa.Column('dtstart', sa.Date(), nullable=False),
+                    sa.Column('time_from', sa.Time(), nullable=False),
+                    sa.Column('time_to', sa.Time(), nullable=False),
+                    sa.Column('exdates', sa.Text(), nullable=True),
+                    sa.ForeignKeyConstraint(['artist_id'], ['artists.id'], ondelete='CASCADE'),
+                    sa.PrimaryKeyConstraint('id'))
+    op.create_index(op.f('ix_artist_availability_rules_artist_id'),
+                    'artist_availability_rules', ['artist_id'],
+                    unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_artist_availability_rules_artist_id'),
+                  table_name='artist_availability_rules')
+    op.drop_table('artist_availability_rules')
@@ -0,0 +1,27 @@
+"""Add profile_documents read model
+
+Revision ID: 5c2e7a91d4f3
+Revises: f18b6d3e9c57
+Create Date: 2026-10-19 15:12:40.518207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '5c2e7a91d4f3'
+down_revision = 'f18b6d3e9c57'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('profile_documents', sa.Column('kind', sa.String(length=16), nullable=False),
+                    sa.Column('entity_id', sa.Integer(), autoincrement=False, nullable=False),
+                    sa.Column('document', sa.Text(), nullable=False),
+                    sa.Column('updated_at', sa.DateTime(), nullable=False),
+                    sa.PrimaryKeyConstraint('kind', 'entity_id'))
+
+
+def downgrade():
+    op.drop_table('profile_documents')
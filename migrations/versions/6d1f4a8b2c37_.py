@@ -0,0 +1,25 @@
+"""Add index_generations so workers can tell when their in-memory indexes are stale
+
+Revision ID: 6d1f4a8b2c37
+Revises: 3b8e5f0c2a94
+Create Date: 2026-10-19 21:12:48.509316
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '6d1f4a8b2c37'
+down_revision = '3b8e5f0c2a94'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('index_generations', sa.Column('name', sa.String(length=32), nullable=False),
+                    sa.Column('generation', sa.Integer(), nullable=False),
+                    sa.PrimaryKeyConstraint('name'))
+
+
+def downgrade():
+    op.drop_table('index_generations')
@@ -0,0 +1,29 @@
+"""Index show start times for calendar range queries
+
+Revision ID: 8e41b0c5d9a2
+Revises: 3a9c1f7d2b64
+Create Date: 2026-10-19 10:03:52.118945
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '8e41b0c5d9a2'
+down_revision = '3a9c1f7d2b64'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(op.f('ix_shows_start_time'), 'shows', ['start_time'], unique=False)
+    op.create_index('ix_shows_venue_id_start_time', 'shows', ['venue_id', 'start_time'],
+                    unique=False)
+    op.create_index('ix_shows_artist_id_start_time', 'shows', ['artist_id', 'start_time'],
+                    unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_shows_artist_id_start_time', table_name='shows')
+    op.drop_index('ix_shows_venue_id_start_time', table_name='shows')
+    op.drop_index(op.f('ix_shows_start_time'), table_name='shows')
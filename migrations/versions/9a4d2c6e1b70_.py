@@ -0,0 +1,23 @@
+"""Index venues by area for the streamed venue listing
+
+Revision ID: 9a4d2c6e1b70
+Revises: 5c2e7a91d4f3
+Create Date: 2026-10-19 17:40:12.304118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '9a4d2c6e1b70'
+down_revision = '5c2e7a91d4f3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_venues_state_city_id', 'venues', ['state', 'city', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_venues_state_city_id', table_name='venues')
@@ -0,0 +1,52 @@
+"""Add shows_archive, partitioned by month on Postgres
+
+Revision ID: c7d2e8a41f03
+Revises: 8e41b0c5d9a2
+Create Date: 2026-10-19 13:41:07.530216
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'c7d2e8a41f03'
+down_revision = '8e41b0c5d9a2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        # The partition key has to be part of the primary key. Monthly partitions are
+        # created on demand by `flask shows archive`; the default one catches the rest.
+        op.execute("""
+            CREATE TABLE shows_archive (
+                id INTEGER NOT NULL,
+                start_time TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+                venue_id INTEGER NOT NULL REFERENCES venues (id) ON DELETE CASCADE,
+                artist_id INTEGER NOT NULL REFERENCES artists (id) ON DELETE CASCADE,
+                PRIMARY KEY (id, start_time)
+            ) PARTITION BY RANGE (start_time)
+        """)
+        op.execute('CREATE TABLE shows_archive_default PARTITION OF shows_archive DEFAULT')
+    else:
+        op.create_table(
+            'shows_archive', sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+            sa.Column('start_time', sa.DateTime(), nullable=False),
+            sa.Column('venue_id', sa.Integer(), nullable=False),
+            sa.Column('artist_id', sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(['artist_id'], ['artists.id'], ondelete='CASCADE'),
+            sa.ForeignKeyConstraint(['venue_id'], ['venues.id'], ondelete='CASCADE'),
+            sa.PrimaryKeyConstraint('id'))
+    op.create_index(op.f('ix_shows_archive_venue_id'), 'shows_archive', ['venue_id'],
+                    unique=False)
+    op.create_index(op.f('ix_shows_archive_artist_id'), 'shows_archive', ['artist_id'],
+                    unique=False)
+
+
+def downgrade():
+    op.execute('INSERT INTO shows (id, start_time, venue_id, artist_id) '
+               'SELECT id, start_time, venue_id, artist_id FROM shows_archive')
+    op.drop_index(op.f('ix_shows_archive_artist_id'), table_name='shows_archive')
+    op.drop_index(op.f('ix_shows_archive_venue_id'), table_name='shows_archive')
+    op.drop_table('shows_archive')
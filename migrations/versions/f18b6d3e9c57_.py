@@ -0,0 +1,59 @@
+"""Cascade deletes in the database and index foreign keys
+
+Revision ID: f18b6d3e9c57
+Revises: c7d2e8a41f03
+Create Date: 2026-10-19 14:26:48.903311
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'f18b6d3e9c57'
+down_revision = 'c7d2e8a41f03'
+branch_labels = None
+depends_on = None
+
+FOREIGN_KEYS = [
+    ('shows', 'venue_id', 'venues'),
+    ('shows', 'artist_id', 'artists'),
+    ('venue_genres', 'venue_id', 'venues'),
+    ('artist_genres', 'artist_id', 'artists'),
+    ('artist_available_times', 'artist_id', 'artists'),
+]
+INDEXES = [
+    ('venue_genres', 'venue_id'),
+    ('artist_genres', 'artist_id'),
+    ('artist_available_times', 'artist_id'),
+]
+
+
+def replace_foreign_keys(ondelete):
+    sqlite = op.get_bind().dialect.name == 'sqlite'
+    for table, column, referred_table in FOREIGN_KEYS:
+        name = '{}_{}_fkey'.format(table, column)
+        if sqlite:
+            # SQLite cannot alter constraints in place, so batch mode rebuilds the table;
+            # the naming convention gives its unnamed foreign keys the Postgres names.
+            with op.batch_alter_table(
+                    table, naming_convention={'fk': '%(table_name)s_%(column_0_name)s_fkey'
+                                             }) as batch_op:
+                batch_op.drop_constraint(name, type_='foreignkey')
+                batch_op.create_foreign_key(name,
+                                            referred_table, [column], ['id'],
+                                            ondelete=ondelete)
+        else:
+            op.drop_constraint(name, table, type_='foreignkey')
+            op.create_foreign_key(name, table, referred_table, [column], ['id'], ondelete=ondelete)
+
+
+def upgrade():
+    replace_foreign_keys('CASCADE')
+    for table, column in INDEXES:
+        op.create_index(op.f('ix_{}_{}'.format(table, column)), table, [column], unique=False)
+
+
+def downgrade():
+    for table, column in INDEXES:
+        op.drop_index(op.f('ix_{}_{}'.format(table, column)), table_name=table)
+    replace_foreign_keys(None)
@@ -0,0 +1,252 @@
+#----------------------------------------------------------------------------#
+# Models.
+#----------------------------------------------------------------------------#
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+import geo
+
+db = SQLAlchemy()
+
+
+@event.listens_for(Engine, 'connect')
+def enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    # SQLite only enforces foreign keys, and so ON DELETE CASCADE, when asked to.
+    if type(dbapi_connection).__module__ == 'sqlite3':
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA foreign_keys=ON')
+        cursor.close()
+
+
+class Venue(db.Model):
+    __tablename__ = 'venues'
+    # The order /venues streams them in, grouped by area.
+    __table_args__ = (db.Index('ix_venues_state_city_id', 'state', 'city', 'id'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String, nullable=False)
+    city = db.Column(db.String(120), nullable=False)
+    state = db.Column(db.String(120), nullable=False)
+    city_and_state = db.column_property(city + ", " + state)
+    address = db.Column(db.String(120), nullable=False)
+    phone = db.Column(db.String(120), nullable=False)
+    image_link = db.Column(db.String(500))
+    facebook_link = db.Column(db.String(120))
+    website = db.Column(db.String(120))
+    seeking_talent = db.Column(db.Boolean, default=False, nullable=False)
+    seeking_description = db.Column(db.String)
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    geohash = db.Column(db.String(12), index=True)
+    genres = db.relationship('VenueGenre',
+                             cascade='all, delete-orphan',
+                             passive_deletes=True,
+                             backref='venue',
+                             lazy=True)
+    shows = db.relationship('Show',
+                            cascade='all, delete-orphan',
+                            passive_deletes=True,
+                            backref='venue',
+                            lazy=True)
+
+    def geocode(self):
+        """Place the venue on its city centroid from the bundled table"""
+        coordinates = geo.geocode(self.city, self.state)
+        if coordinates is None:
+            self.latitude = self.longitude = self.geohash = None
+        else:
+            self.latitude, self.longitude = coordinates
+            self.geohash = geo.encode(self.latitude, self.longitude)
+
+
+class Artist(db.Model):
+    __tablename__ = 'artists'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String, nullable=False)
+    city = db.Column(db.String(120), nullable=False)
+    state = db.Column(db.String(120), nullable=False)
+    city_and_state = db.column_property(city + ", " + state)
+    phone = db.Column(db.String(120), nullable=False)
+    image_link = db.Column(db.String(500))
+    facebook_link = db.Column(db.String(120))
+    website = db.Column(db.String(120))
+    seeking_venue = db.Column(db.Boolean, default=False, nullable=False)
+    seeking_description = db.Column(db.String)
+    genres = db.relationship('ArtistGenre',
+                             cascade='all, delete-orphan',
+                             passive_deletes=True,
+                             backref='artist',
+                             lazy=True)
+    shows = db.relationship('Show',
+                            cascade='all, delete-orphan',
+                            passive_deletes=True,
+                            backref='artist',
+                            lazy=True)
+    available_times = db.relationship('ArtistAvailableTime',
+                                      cascade='all, delete-orphan',
+                                      passive_deletes=True,
+                                      backref='artist',
+                                      lazy=True)
+    availability_rules = db.relationship('ArtistAvailabilityRule',
+                                         cascade='all, delete-orphan',
+                                         passive_deletes=True,
+                                         backref='artist',
+                                         lazy=True)
+
+    @property
+    def serialize(self):
+        """Return object data in easily serializable format"""
+        return {
+            'id': self.id,
+            'name': self.name,
+            'city': self.city,
+            'state': self.state,
+            'phone': self.phone,
+            'image_link': self.image_link,
+            'facebook_link': self.facebook_link,
+            'website': self.website,
+            'seeking_venue': self.seeking_venue,
+            'seeking_description': self.seeking_description,
+        }
+
+
+class Show(db.Model):
+    __tablename__ = 'shows'
+    __table_args__ = (
+        db.Index('ix_shows_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_shows_artist_id_start_time', 'artist_id', 'start_time'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    start_time = db.Column(db.DateTime, nullable=False, index=True)
+    venue_id = db.Column(db.Integer, db.ForeignKey('venues.id', ondelete='CASCADE'), nullable=False)
+    artist_id = db.Column(db.Integer,
+                          db.ForeignKey('artists.id', ondelete='CASCADE'),
+                          nullable=False)
+
+
+class ArchivedShow(db.Model):
+    """Shows moved out of the hot `shows` table by `flask shows archive`.
+
+    On Postgres the table is range-partitioned by month on start_time; on SQLite it is a
+    plain table.
+    """
+    __tablename__ = 'shows_archive'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    start_time = db.Column(db.DateTime, nullable=False)
+    venue_id = db.Column(db.Integer,
+                         db.ForeignKey('venues.id', ondelete='CASCADE'),
+                         nullable=False,
+                         index=True)
+    artist_id = db.Column(db.Integer,
+                          db.ForeignKey('artists.id', ondelete='CASCADE'),
+                          nullable=False,
+                          index=True)
+
+
+def show_history():
+    """Hot and archived shows as one selectable, for queries that reach into the past"""
+    columns = ('id', 'start_time', 'venue_id', 'artist_id')
+    return db.union_all(db.select([Show.__table__.c[column] for column in columns]),
+                        db.select([ArchivedShow.__table__.c[column] for column in columns
+                                  ])).alias('show_history')
+
+
+class VenueGenre(db.Model):
+    __tablename__ = 'venue_genres'
+
+    id = db.Column(db.Integer, primary_key=True)
+    genre_name = db.Column(db.String)
+    venue_id = db.Column(db.Integer,
+                         db.ForeignKey('venues.id', ondelete='CASCADE'),
+                         nullable=False,
+                         index=True)
+
+
+class ArtistGenre(db.Model):
+    __tablename__ = 'artist_genres'
+
+    id = db.Column(db.Integer, primary_key=True)
+    genre_name = db.Column(db.String)
+    artist_id = db.Column(db.Integer,
+                          db.ForeignKey('artists.id', ondelete='CASCADE'),
+                          nullable=False,
+                          index=True)
+
+
+class ArtistAvailableTime(db.Model):
+    __tablename__ = 'artist_available_times'
+
+    id = db.Column(db.Integer, primary_key=True)
+    artist_id = db.Column(db.Integer,
+                          db.ForeignKey('artists.id', ondelete='CASCADE'),
+                          nullable=False,
+                          index=True)
+    date = db.Column(db.Date, nullable=False)
+    time_from = db.Column(db.Time, nullable=False)
+    time_to = db.Column(db.Time, nullable=False)
+
+    @property
+    def serialize(self):
+        """Return object data in easily serializable format"""
+        return {
+            'id': self.id,
+            'artist_id': self.artist_id,
+            'date': self.date.strftime("%Y/%m/%d"),
+            'time_from': self.time_from.strftime("%H:%M"),
+            'time_to': self.time_to.strftime("%H:%M")
+        }
+
+
+class ArtistAvailabilityRule(db.Model):
+    """Recurring availability: an RRULE (FREQ=WEEKLY or MONTHLY) counted from `dtstart`.
+
+    Dates listed in `exdates` (comma-separated YYYY-MM-DD) are skipped. Rules are expanded
+    into dates only for the window asked about, by availability.occurrences().
+    """
+    __tablename__ = 'artist_availability_rules'
+
+    id = db.Column(db.Integer, primary_key=True)
+    artist_id = db.Column(db.Integer,
+                          db.ForeignKey('artists.id', ondelete='CASCADE'),
+                          nullable=False,
+                          index=True)
+    rrule = db.Column(db.String(255), nullable=False)
+    dtstart = db.Column(db.Date, nullable=False)
+    time_from = db.Column(db.Time, nullable=False)
+    time_to = db.Column(db.Time, nullable=False)
+    exdates = db.Column(db.Text)
+
+    @property
+    def serialize(self):
+        """Return object data in easily serializable format"""
+        return {
+            'id': self.id,
+            'artist_id': self.artist_id,
+            'rrule': self.rrule,
+            'dtstart': self.dtstart.strftime("%Y/%m/%d"),
+            'time_from': self.time_from.strftime("%H:%M"),
+            'time_to': self.time_to.strftime("%H:%M"),
+            'exdates': self.exdates.replace('-', '/').split(',') if self.exdates else [],
+        }
+
+
+class ProfileDocument(db.Model):
+    """Precomputed venue and artist profiles, kept up to date by `profiles.refresh()`"""
+    __tablename__ = 'profile_documents'
+
+    kind = db.Column(db.String(16), primary_key=True)
+    entity_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    document = db.Column(db.Text, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False)
+
+
+class IndexGeneration(db.Model):
+    """How often the data behind each in-memory index has changed, across processes"""
+    __tablename__ = 'index_generations'
+
+    name = db.Column(db.String(32), primary_key=True)
+    generation = db.Column(db.Integer, nullable=False, default=0)
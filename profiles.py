@@ -0,0 +1,234 @@
+#----------------------------------------------------------------------------#
+# Profile read model.
+#----------------------------------------------------------------------------#
+#  Each venue and artist page is stored as one JSON document in profile_documents,
+#  rebuilt by refresh() whenever the entity, its genres, its availability or its shows
+#  change, so a profile is served from a single primary-key lookup.
+#
+#  Documents list every show with its start time rather than splitting past from
+#  upcoming, which would go stale as time passes; split_shows() does that when serving.
+import json
+from datetime import datetime
+
+from sqlalchemy.exc import IntegrityError
+
+import availability
+from models import (db, show_history, Artist, ArtistAvailabilityRule, ArtistAvailableTime,
+                    ArtistGenre, ProfileDocument, Venue, VenueGenre)
+
+VENUE = 'venue'
+ARTIST = 'artist'
+
+
+def build_venue_documents(venue_ids):
+    """Venue id -> profile document, for those of `venue_ids` that exist"""
+    genres = {}
+    for venue_id, genre_name in VenueGenre.query.with_entities(
+            VenueGenre.venue_id, VenueGenre.genre_name).filter(VenueGenre.venue_id.in_(venue_ids)):
+        genres.setdefault(venue_id, []).append(genre_name)
+
+    shows = show_history()
+    venue_shows = {}
+    for show in db.session.query(
+            shows.c.venue_id, shows.c.artist_id, Artist.name.label('artist_name'),
+            Artist.image_link.label('artist_image_link'),
+            shows.c.start_time).join(Artist, Artist.id == shows.c.artist_id).filter(
+                shows.c.venue_id.in_(venue_ids)).order_by(shows.c.start_time):
+        venue_shows.setdefault(show.venue_id, []).append({
+            "artist_id": show.artist_id,
+            "artist_name": show.artist_name,
+            "artist_image_link": show.artist_image_link,
+            "start_time": show.start_time.isoformat(),
+        })
+
+    return {
+        venue.id: {
+            "id": venue.id,
+            "name": venue.name,
+            "genres": genres.get(venue.id, []),
+            "address": venue.address,
+            "city": venue.city,
+            "state": venue.state,
+            "phone": venue.phone,
+            "website": venue.website,
+            "facebook_link": venue.facebook_link,
+            "seeking_talent": venue.seeking_talent,
+            "seeking_description": venue.seeking_description,
+            "image_link": venue.image_link,
+            "shows": venue_shows.get(venue.id, []),
+        } for venue in Venue.query.filter(Venue.id.in_(venue_ids))
+    }
+
+
+def build_artist_documents(artist_ids):
+    """Artist id -> profile document, for those of `artist_ids` that exist"""
+    genres = {}
+    for artist_id, genre_name in ArtistGenre.query.with_entities(
+            ArtistGenre.artist_id,
+            ArtistGenre.genre_name).filter(ArtistGenre.artist_id.in_(artist_ids)):
+        genres.setdefault(artist_id, []).append(genre_name)
+
+    available_times = {}
+    for available_time in ArtistAvailableTime.query.filter(
+            ArtistAvailableTime.artist_id.in_(artist_ids)).order_by(ArtistAvailableTime.date,
+                                                                    ArtistAvailableTime.time_from):
+        available_times.setdefault(available_time.artist_id, []).append(available_time.serialize)
+
+    availability_rules = {}
+    for rule in ArtistAvailabilityRule.query.filter(
+            ArtistAvailabilityRule.artist_id.in_(artist_ids)).order_by(ArtistAvailabilityRule.id):
+        availability_rules.setdefault(rule.artist_id, []).append(
+            dict(rule.serialize, description=availability.describe(rule.rrule)))
+
+    shows = show_history()
+    artist_shows = {}
+    for show in db.session.query(
+            shows.c.artist_id, shows.c.venue_id, Venue.name.label('venue_name'),
+            Venue.image_link.label('venue_image_link'),
+            shows.c.start_time).join(Venue, Venue.id == shows.c.venue_id).filter(
+                shows.c.artist_id.in_(artist_ids)).order_by(shows.c.start_time):
+        artist_shows.setdefault(show.artist_id, []).append({
+            "venue_id": show.venue_id,
+            "venue_name": show.venue_name,
+            "venue_image_link": show.venue_image_link,
+            "start_time": show.start_time.isoformat(),
+        })
+
+    return {
+        artist.id: {
+            "id": artist.id,
+            "name": artist.name,
+            "genres": genres.get(artist.id, []),
+            "city": artist.city,
+            "state": artist.state,
+            "phone": artist.phone,
+            "website": artist.website,
+            "facebook_link": artist.facebook_link,
+            "seeking_venue": artist.seeking_venue,
+            "seeking_description": artist.seeking_description,
+            "image_link": artist.image_link,
+            "shows": artist_shows.get(artist.id, []),
+            "available_times": available_times.get(artist.id, []),
+            "availability_rules": availability_rules.get(artist.id, []),
+        } for artist in Artist.query.filter(Artist.id.in_(artist_ids))
+    }
+
+
+BUILDERS = {VENUE: build_venue_documents, ARTIST: build_artist_documents}
+
+
+def store(kind, ids, documents):
+    """Replace the stored documents of `ids`; ids missing from `documents` are dropped"""
+    table = ProfileDocument.__table__
+    db.session.execute(table.delete().where(
+        db.and_(table.c.kind == kind, table.c.entity_id.in_(ids))))
+    if documents:
+        updated_at = datetime.utcnow()
+        db.session.execute(table.insert(), [{
+            'kind': kind,
+            'entity_id': entity_id,
+            'document': json.dumps(document),
+            'updated_at': updated_at,
+        } for entity_id, document in documents.items()])
+
+
+def refresh(venue_ids=(), artist_ids=()):
+    """Rebuild and commit the documents of the given venues and artists"""
+    for kind, ids in ((VENUE, set(venue_ids)), (ARTIST, set(artist_ids))):
+        if ids:
+            store(kind, ids, BUILDERS[kind](ids))
+    db.session.commit()
+
+
+def rebuild_all(batch_size=500):
+    """Rebuild every document in batches and drop those of deleted entities.
+
+    Returns the number of (venues, artists) rebuilt.
+    """
+    table = ProfileDocument.__table__
+    counts = []
+    for kind, model in ((VENUE, Venue), (ARTIST, Artist)):
+        db.session.execute(table.delete().where(
+            db.and_(table.c.kind == kind, ~table.c.entity_id.in_(db.select([model.id])))))
+        db.session.commit()
+
+        rebuilt = 0
+        last_id = 0
+        while True:
+            ids = [
+                entity_id for (entity_id,) in db.session.query(model.id).filter(
+                    model.id > last_id).order_by(model.id).limit(batch_size)
+            ]
+            if not ids:
+                break
+            store(kind, ids, BUILDERS[kind](ids))
+            db.session.commit()
+            rebuilt += len(ids)
+            last_id = ids[-1]
+        counts.append(rebuilt)
+    return tuple(counts)
+
+
+def load(kind, entity_id):
+    """The stored document, built and stored on a miss; None if the entity doesn't exist"""
+    document = db.session.query(ProfileDocument.document).filter(
+        ProfileDocument.kind == kind, ProfileDocument.entity_id == entity_id).scalar()
+    if document is not None:
+        return json.loads(document)
+
+    document = BUILDERS[kind]([entity_id]).get(entity_id)
+    if document is not None:
+        try:
+            store(kind, [entity_id], {entity_id: document})
+            db.session.commit()
+        except IntegrityError:
+            # A concurrent request stored it first.
+            db.session.rollback()
+    return document
+
+
+def split_shows(document, now=None):
+    """Replace the document's show list with past and upcoming shows and their counts"""
+    now = now or datetime.now()
+    past_shows = []
+    upcoming_shows = []
+    for show in document.pop('shows'):
+        if datetime.fromisoformat(show['start_time']) > now:
+            upcoming_shows.append(show)
+        else:
+            past_shows.append(show)
+
+    document.update({
+        "past_shows": past_shows,
+        "upcoming_shows": upcoming_shows,
+        "past_shows_count": len(past_shows),
+        "upcoming_shows_count": len(upcoming_shows),
+    })
+    return document
+
+
+def show_participants(venue_ids=(), artist_ids=(), show_ids=()):
+    """Ids of (venues, artists, shows) for the shows involving the given entities.
+
+    The venues and artists are those whose documents list such a show, less the given
+    ones. Deletes cascade to shows, so callers collect these before deleting and refresh
+    them after.
+    """
+    shows = show_history()
+    conditions = []
+    if venue_ids:
+        conditions.append(shows.c.venue_id.in_(venue_ids))
+    if artist_ids:
+        conditions.append(shows.c.artist_id.in_(artist_ids))
+    if show_ids:
+        conditions.append(shows.c.id.in_(show_ids))
+    if not conditions:
+        return set(), set(), set()
+
+    venues, artists, found = set(), set(), set()
+    query = db.session.query(shows.c.id, shows.c.venue_id, shows.c.artist_id)
+    for show_id, venue_id, artist_id in query.filter(db.or_(*conditions)):
+        venues.add(venue_id)
+        artists.add(artist_id)
+        found.add(show_id)
+    return venues - set(venue_ids), artists - set(artist_ids), found
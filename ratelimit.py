@@ -0,0 +1,159 @@
+#----------------------------------------------------------------------------#
+# Token-bucket rate limiting and load shedding.
+#----------------------------------------------------------------------------#
+import functools
+import math
+import threading
+import time
+
+from flask import Response, current_app, request
+
+
+class BucketStore(object):
+    """Where token buckets live.
+
+    A shared implementation (e.g. Redis with a Lua script) must apply the refill and
+    the take atomically, since several workers consume from the same bucket.
+    """
+
+    def consume(self, key, rate, capacity, cost=1):
+        """Take `cost` tokens from the bucket at `key`.
+
+        Returns 0 when the tokens were taken, otherwise the number of seconds until
+        enough tokens will have been refilled.
+        """
+        raise NotImplementedError
+
+    def refund(self, key, rate, capacity, cost=1):
+        """Put back `cost` tokens taken by consume(), up to the bucket's capacity"""
+        raise NotImplementedError
+
+
+class MemoryBucketStore(BucketStore):
+    """Per-process buckets, for a single worker or local development"""
+
+    def __init__(self, max_keys=100000):
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self.max_keys = max_keys
+
+    def consume(self, key, rate, capacity, cost=1):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated, _ = self._buckets.get(key, (capacity, now, None))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+
+            if tokens >= cost:
+                tokens -= cost
+                wait = 0
+            else:
+                wait = (cost - tokens) / rate
+            self._buckets[key] = (tokens, now, now + (capacity - tokens) / rate)
+
+            if len(self._buckets) > self.max_keys:
+                self._sweep(now)
+            return wait
+
+    def refund(self, key, rate, capacity, cost=1):
+        now = time.monotonic()
+        with self._lock:
+            if key not in self._buckets:
+                return
+            tokens, updated, _ = self._buckets[key]
+            tokens = min(capacity, tokens + (now - updated) * rate + cost)
+            self._buckets[key] = (tokens, now, now + (capacity - tokens) / rate)
+
+    def _sweep(self, now):
+        # A bucket that has refilled completely is the same as no bucket at all.
+        self._buckets = {key: bucket for key, bucket in self._buckets.items() if bucket[2] > now}
+
+
+class ConcurrencyLimiter(object):
+    """Caps the number of expensive requests in flight in this process"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self._semaphore = threading.BoundedSemaphore(limit)
+
+    def try_acquire(self):
+        return self._semaphore.acquire(blocking=False)
+
+    def release(self):
+        self._semaphore.release()
+
+
+class RateLimiter(object):
+
+    def __init__(self, app=None, store=None):
+        self.store = store or MemoryBucketStore()
+        self.concurrency = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('RATELIMIT_ENABLED', True)
+        app.config.setdefault('RATELIMITS', {})
+        app.config.setdefault('RATELIMIT_MAX_CONCURRENT', 16)
+        app.config.setdefault('RATELIMIT_SHED_RETRY_AFTER', 1)
+        self.concurrency = ConcurrencyLimiter(app.config['RATELIMIT_MAX_CONCURRENT'])
+        app.extensions['ratelimit'] = self
+
+    def check(self, limit_class, endpoint, client):
+        """Return seconds to wait before `client` may call `endpoint`, or 0.
+
+        The client's bucket is shared by every route of `limit_class`; each route has a
+        bucket of its own.
+        """
+        limits = current_app.config['RATELIMITS'].get(limit_class, {})
+        client_key = '{}:client:{}'.format(limit_class, client)
+        if 'client' in limits:
+            wait = self.store.consume(client_key, *limits['client'])
+            if wait:
+                return wait
+        if 'route' in limits:
+            wait = self.store.consume('{}:route:{}'.format(limit_class, endpoint), *limits['route'])
+            if wait:
+                # The request is rejected anyway; don't charge the client for it.
+                if 'client' in limits:
+                    self.store.refund(client_key, *limits['client'])
+                return wait
+        return 0
+
+
+def too_many_requests(status, retry_after):
+    response = Response('Too many requests, please retry later.\n',
+                        status=status,
+                        mimetype='text/plain')
+    response.headers['Retry-After'] = str(max(1, int(math.ceil(retry_after))))
+    return response
+
+
+def limited(limit_class):
+    """Rate-limit a view and run it under the global concurrency limit.
+
+    Both checks happen before the view runs, so a rejected request costs next to nothing:
+    429 when the client or route bucket is empty, 503 when too many requests are in flight.
+    """
+
+    def decorator(f):
+
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            if not current_app.config['RATELIMIT_ENABLED']:
+                return f(*args, **kwargs)
+
+            limiter = current_app.extensions['ratelimit']
+            wait = limiter.check(limit_class, request.endpoint, request.remote_addr)
+            if wait:
+                return too_many_requests(429, wait)
+
+            if not limiter.concurrency.try_acquire():
+                return too_many_requests(503, current_app.config['RATELIMIT_SHED_RETRY_AFTER'])
+            try:
+                return f(*args, **kwargs)
+            finally:
+                limiter.concurrency.release()
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,64 @@
+#----------------------------------------------------------------------------#
+# Result cache with per-namespace invalidation.
+#----------------------------------------------------------------------------#
+import threading
+import time
+from collections import OrderedDict
+
+
+def normalize_term(term):
+    """Case-fold and collapse whitespace, so equivalent searches share an entry"""
+    return ' '.join((term or '').casefold().split())
+
+
+class SearchCache(object):
+    """LRU cache of results with a TTL and per-namespace generations.
+
+    A namespace is whatever is invalidated together: a kind of search, or a single artist
+    for the availability expansions. Bumping a namespace's generation invalidates all of
+    its entries at once: they are keyed by the generation they were computed under and
+    simply age out of the LRU. A miss hands out the generation it was looked up under, and
+    a result is only stored if that is still current, so one computed before an
+    invalidation is never filed under the new generation.
+    """
+
+    def __init__(self, max_entries=1024, ttl=60):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._generations = {}
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, namespace, key, variant=None):
+        """(result or None, generation to pass to set() on a miss).
+
+        `key` is any hashable, such as a normalized search term, and `variant` tells apart
+        results of the same key, such as other filters or pages.
+        """
+        with self._lock:
+            generation = self._generations.get(namespace, 0)
+            cache_key = namespace, generation, key, variant
+            entry = self._entries.get(cache_key)
+            if entry is None or entry[0] < time.monotonic():
+                self.misses += 1
+                return None, generation
+            self._entries.move_to_end(cache_key)
+            self.hits += 1
+            return entry[1], generation
+
+    def set(self, namespace, key, value, generation, variant=None):
+        """Store `value` unless the namespace was invalidated since `generation` was read"""
+        with self._lock:
+            if self._generations.get(namespace, 0) != generation:
+                return
+            cache_key = namespace, generation, key, variant
+            self._entries[cache_key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, namespace):
+        with self._lock:
+            self._generations[namespace] = self._generations.get(namespace, 0) + 1
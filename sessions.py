@@ -0,0 +1,251 @@
+#----------------------------------------------------------------------------#
+# Server-side sessions.
+#----------------------------------------------------------------------------#
+#  The session cookie holds only a random id; the data lives in a SessionStore. A
+#  request's session is read from the store the first time the request touches it, so
+#  routes that never use the session never pay for a lookup.
+import re
+import secrets
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+
+SESSION_ID = re.compile(r'^[A-Za-z0-9_-]{22}$')
+
+
+def new_session_id():
+    """128 random bits, URL-safe"""
+    return secrets.token_urlsafe(16)
+
+
+class SessionStore(object):
+    """Where session data lives, as serialized strings with an expiry time.
+
+    A store shared by every worker process (SQLite on one host, or a network store
+    implementing these four methods) keeps users' sessions across workers.
+    """
+
+    def load(self, sid, now):
+        """The data saved under `sid`, or None when it is unknown or expired"""
+        raise NotImplementedError
+
+    def save(self, sid, data, expires_at):
+        raise NotImplementedError
+
+    def delete(self, sid):
+        raise NotImplementedError
+
+    def sweep(self, now):
+        """Delete the sessions expired by `now` and return how many there were"""
+        raise NotImplementedError
+
+
+class MemoryStore(SessionStore):
+    """Sessions in a dict, visible only to the current process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sessions = {}
+
+    def load(self, sid, now):
+        with self._lock:
+            entry = self._sessions.get(sid)
+        if entry is None or entry[1] <= now:
+            return None
+        return entry[0]
+
+    def save(self, sid, data, expires_at):
+        with self._lock:
+            self._sessions[sid] = (data, expires_at)
+
+    def delete(self, sid):
+        with self._lock:
+            self._sessions.pop(sid, None)
+
+    def sweep(self, now):
+        with self._lock:
+            expired = [sid for sid, (_, expires_at) in self._sessions.items() if expires_at <= now]
+            for sid in expired:
+                del self._sessions[sid]
+        return len(expired)
+
+
+class SQLiteStore(SessionStore):
+    """Sessions in a SQLite file, shared by every process on the host"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        # Not kept: connections must not outlive a fork, and workers fork after this.
+        connection = self._connect()
+        try:
+            connection.execute('CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, '
+                               'data TEXT NOT NULL, expires_at REAL NOT NULL)')
+            connection.execute(
+                'CREATE INDEX IF NOT EXISTS ix_sessions_expires_at ON sessions (expires_at)')
+        finally:
+            connection.close()
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        connection.execute('PRAGMA journal_mode=WAL')
+        return connection
+
+    @property
+    def connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = self._connect()
+        return connection
+
+    def load(self, sid, now):
+        row = self.connection.execute('SELECT data FROM sessions WHERE id = ? AND expires_at > ?',
+                                      (sid, now)).fetchone()
+        return row[0] if row else None
+
+    def save(self, sid, data, expires_at):
+        self.connection.execute('INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)',
+                                (sid, data, expires_at))
+
+    def delete(self, sid):
+        self.connection.execute('DELETE FROM sessions WHERE id = ?', (sid,))
+
+    def sweep(self, now):
+        return self.connection.execute('DELETE FROM sessions WHERE expires_at <= ?',
+                                       (now,)).rowcount
+
+
+class ServerSession(SessionMixin):
+    """A session whose data is only fetched, through `load(sid)`, when first used"""
+
+    def __init__(self, sid, load):
+        self.sid = sid
+        self.new = sid is None
+        self.modified = False
+        self._load = load
+        self._data = None
+
+    @property
+    def loaded(self):
+        return self._data is not None
+
+    @property
+    def data(self):
+        if self._data is None:
+            data = self._load(self.sid) if self.sid is not None else None
+            if data is None:
+                # Unknown or expired: never adopt an id the client made up.
+                self.sid = None
+                self.new = True
+            self._data = data or {}
+        return self._data
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def __setitem__(self, key, value):
+        self.data[key] = value
+        self.modified = True
+
+    def __delitem__(self, key):
+        del self.data[key]
+        self.modified = True
+
+    def __iter__(self):
+        return iter(self.data)
+
+    def __len__(self):
+        return len(self.data)
+
+
+class ServerSessionInterface(SessionInterface):
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, store, lifetime, sweep_interval):
+        self.store = store
+        self.lifetime = lifetime
+        self.sweep_interval = sweep_interval
+        self._next_sweep = time.monotonic() + sweep_interval
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(app.session_cookie_name)
+        if sid is not None and not SESSION_ID.match(sid):
+            sid = None
+        return ServerSession(sid, self.load)
+
+    def load(self, sid):
+        data = self.store.load(sid, time.time())
+        return self.serializer.loads(data) if data is not None else None
+
+    def save_session(self, app, session, response):
+        if not session.loaded:
+            return
+        response.vary.add('Cookie')
+        if not session.modified:
+            return
+
+        name = app.session_cookie_name
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        if not session:
+            if session.sid is not None:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        if session.sid is None:
+            session.sid = new_session_id()
+        expires_at = time.time() + self.lifetime
+        self.store.save(session.sid, self.serializer.dumps(dict(session)), expires_at)
+        response.set_cookie(name,
+                            session.sid,
+                            expires=datetime.utcfromtimestamp(expires_at),
+                            httponly=self.get_cookie_httponly(app),
+                            domain=domain,
+                            path=path,
+                            secure=self.get_cookie_secure(app),
+                            samesite=self.get_cookie_samesite(app))
+        self.maybe_sweep()
+
+    def maybe_sweep(self):
+        # Piggybacks on session writes; `flask sessions sweep` does the same from cron.
+        if time.monotonic() >= self._next_sweep:
+            self._next_sweep = time.monotonic() + self.sweep_interval
+            self.store.sweep(time.time())
+
+
+class ServerSessions(object):
+    """Install the server-side session interface configured by SESSION_STORE"""
+
+    def __init__(self, app=None):
+        self.interface = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('SESSION_STORE', 'memory')
+        app.config.setdefault('SESSION_SQLITE_PATH', 'sessions.db')
+        app.config.setdefault('SESSION_LIFETIME', 86400)
+        app.config.setdefault('SESSION_SWEEP_INTERVAL', 300)
+
+        kind = app.config['SESSION_STORE']
+        if kind == 'memory':
+            store = MemoryStore()
+        elif kind == 'sqlite':
+            store = SQLiteStore(app.config['SESSION_SQLITE_PATH'])
+        elif isinstance(kind, SessionStore):
+            store = kind
+        else:
+            raise ValueError('unknown SESSION_STORE {!r}'.format(kind))
+
+        self.interface = ServerSessionInterface(store, app.config['SESSION_LIFETIME'],
+                                                app.config['SESSION_SWEEP_INTERVAL'])
+        app.session_interface = self.interface
+        app.extensions['sessions'] = self
+
+    def sweep(self):
+        return self.interface.store.sweep(time.time())
@@ -0,0 +1,488 @@
+#----------------------------------------------------------------------------#
+# Regional shards of the catalogue listings.
+#----------------------------------------------------------------------------#
+#  Optional, and off unless SHARDS is configured. Each shard is a database holding the
+#  venues and artists of its states and the shows of its venues, denormalized for the
+#  listing and search pages. The primary database stays the system of record: the
+#  write hooks route every changed row to the shard that owns its state, and the
+#  listing and search routes read the shards instead of the primary, querying them in
+#  parallel and merging the results in order.
+#
+#  Shards are plain SQLAlchemy URLs, so several SQLite files stand in for regional
+#  servers locally.
+import heapq
+import os
+import queue
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from sqlalchemy import (Boolean, Column, DateTime, Index, Integer, MetaData, String, Table,
+                        bindparam, create_engine, func, or_, select)
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
+
+from models import db, Artist, Show, Venue
+
+
+class bytewise(FunctionElement):
+    """A string column ordered by code point, the order Python compares strings in
+
+    A shard's default collation may be locale-aware ('a' < 'B'), which would hand the
+    merge rows out of the order its key expects.
+    """
+    type = String()
+    name = 'bytewise'
+
+
+@compiles(bytewise)
+def compile_bytewise(element, compiler, **kw):
+    # SQLite compares text with memcmp (BINARY) unless told otherwise.
+    return compiler.process(element.clauses, **kw)
+
+
+@compiles(bytewise, 'postgresql')
+def compile_bytewise_postgresql(element, compiler, **kw):
+    return '%s COLLATE "C"' % compiler.process(element.clauses, **kw)
+
+
+metadata = MetaData()
+
+shard_venues = Table(
+    'shard_venues',
+    metadata,
+    Column('id', Integer, primary_key=True, autoincrement=False),
+    Column('name', String, nullable=False),
+    Column('city', String(120), nullable=False),
+    Column('state', String(120), nullable=False),
+    Column('image_link', String(500)),
+    Column('seeking_talent', Boolean, nullable=False),
+)
+# In the order venues() reads it, so the listing is an index scan.
+Index('ix_shard_venues_state_city_id', bytewise(shard_venues.c.state),
+      bytewise(shard_venues.c.city), shard_venues.c.id)
+
+shard_artists = Table(
+    'shard_artists',
+    metadata,
+    Column('id', Integer, primary_key=True, autoincrement=False),
+    Column('name', String, nullable=False),
+    Column('city', String(120), nullable=False),
+    Column('state', String(120), nullable=False),
+    Column('image_link', String(500)),
+    Column('seeking_venue', Boolean, nullable=False),
+    Index('ix_shard_artists_state', 'state'),
+)
+
+# Shows live in their venue's shard, next to it, whichever shard their artist is in.
+shard_shows = Table(
+    'shard_shows',
+    metadata,
+    Column('id', Integer, primary_key=True, autoincrement=False),
+    Column('venue_id', Integer, nullable=False),
+    Column('artist_id', Integer, nullable=False, index=True),
+    Column('start_time', DateTime, nullable=False, index=True),
+    Column('venue_name', String, nullable=False),
+    Column('artist_name', String, nullable=False),
+    Column('artist_image_link', String(500)),
+    Index('ix_shard_shows_venue_id_start_time', 'venue_id', 'start_time'),
+)
+
+
+class ShardError(Exception):
+    pass
+
+
+class ShardSet(object):
+    """The configured shards, and parallel queries across them"""
+
+    def __init__(self, app=None):
+        self.engines = {}
+        self.states = {}
+        self.default = None
+        self._executor = None
+        self._executor_pid = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('SHARDS', {})
+        app.config.setdefault('SHARD_DEFAULT', None)
+        app.config.setdefault('SHARD_WORKERS', 8)
+        app.config.setdefault('SHARD_BATCH_SIZE', 500)
+
+        shards = app.config['SHARDS']
+        self.batch_size = app.config['SHARD_BATCH_SIZE']
+        self.workers = app.config['SHARD_WORKERS']
+        self.engines = {}
+        self.states = {}
+        for name, shard in sorted(shards.items()):
+            self.engines[name] = create_sqlite_dirs(create_engine(shard['uri']))
+            for state in shard.get('states', ()):
+                if state in self.states:
+                    raise ShardError('{} is in shards {} and {}'.format(
+                        state, self.states[state], name))
+                self.states[state] = name
+        self.default = app.config['SHARD_DEFAULT']
+        if shards and self.default not in shards:
+            raise ShardError('SHARD_DEFAULT must name one of SHARDS')
+
+        for engine in self.engines.values():
+            metadata.create_all(engine)
+            # Leave no pooled connections for forked workers to inherit.
+            engine.dispose()
+        app.extensions['shards'] = self
+
+    @property
+    def enabled(self):
+        return bool(self.engines)
+
+    def shard_for_state(self, state):
+        return self.states.get(state, self.default)
+
+    def after_fork(self):
+        for engine in self.engines.values():
+            engine.dispose()
+        self._executor = None
+
+    @property
+    def executor(self):
+        # Threads do not survive a fork, so each process starts its own pool.
+        if self._executor is None or self._executor_pid != os.getpid():
+            self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='shard')
+            self._executor_pid = os.getpid()
+        return self._executor
+
+    #  Scatter-gather
+    #  ----------------------------------------------------------------
+
+    def scatter(self, fn, names=None):
+        """Run `fn(name, connection)` in a transaction on each shard in parallel.
+
+        Returns {name: result}. Shards commit independently: when one fails, the others
+        keep their changes and the first error is raised.
+        """
+        names = sorted(self.engines) if names is None else sorted(names)
+        if len(names) == 1:
+            return {names[0]: self._run(fn, names[0])}
+        futures = {name: self.executor.submit(self._run, fn, name) for name in names}
+        return {name: future.result() for name, future in futures.items()}
+
+    def _run(self, fn, name):
+        with self.engines[name].begin() as connection:
+            return fn(name, connection)
+
+    def merged(self, query, key, names=None):
+        """Rows of `query` from each shard, merged in `key` order.
+
+        Every shard must return its rows in `key` order, with strings ordered by
+        `bytewise` so that SQL and Python agree on it. Each shard is read on its own
+        thread, SHARD_BATCH_SIZE rows at a time and at most two batches ahead of the
+        merge, so all shards are queried at once and none is read into memory whole.
+        """
+        names = sorted(self.engines) if names is None else sorted(names)
+        return heapq.merge(*[self._stream(name, query) for name in names], key=key)
+
+    def _stream(self, name, query):
+        batches = queue.Queue(maxsize=2)
+        stopped = threading.Event()
+
+        def produce():
+            try:
+                with self.engines[name].connect() as connection:
+                    result = connection.execution_options(stream_results=True).execute(query)
+                    while not stopped.is_set():
+                        rows = result.fetchmany(self.batch_size)
+                        put(rows)
+                        if not rows:
+                            break
+            except Exception as e:
+                put(e)
+
+        def put(item):
+            while not stopped.is_set():
+                try:
+                    batches.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    pass
+
+        # A thread per stream, not the pool: a producer blocks until its consumer reads,
+        # and a pool shared by concurrent merges could fill up with blocked producers.
+        threading.Thread(target=produce, name='shard-' + name, daemon=True).start()
+
+        def consume():
+            try:
+                while True:
+                    rows = batches.get()
+                    if isinstance(rows, Exception):
+                        raise rows
+                    if not rows:
+                        return
+                    yield from rows
+            finally:
+                stopped.set()
+
+        return consume()
+
+
+shards = ShardSet()
+
+
+def create_sqlite_dirs(engine):
+    if engine.url.get_backend_name() == 'sqlite' and engine.url.database:
+        directory = os.path.dirname(os.path.abspath(engine.url.database))
+        os.makedirs(directory, exist_ok=True)
+    return engine
+
+
+#  Reads
+#  ----------------------------------------------------------------
+
+
+def venues():
+    """Venues with their upcoming show counts, ordered by (state, city, id)"""
+    is_upcoming = ((shard_shows.c.venue_id == shard_venues.c.id) &
+                   (shard_shows.c.start_time > datetime.now()))
+    upcoming = select([func.count(shard_shows.c.id)]).where(is_upcoming).as_scalar()
+    query = select([
+        shard_venues.c.id, shard_venues.c.name, shard_venues.c.city, shard_venues.c.state,
+        upcoming.label('num_upcoming_shows')
+    ]).order_by(bytewise(shard_venues.c.state), bytewise(shard_venues.c.city), shard_venues.c.id)
+    return shards.merged(query, key=lambda venue: (venue.state, venue.city, venue.id))
+
+
+def artists():
+    """Artists ordered by id"""
+    query = select([shard_artists.c.id, shard_artists.c.name]).order_by(shard_artists.c.id)
+    return shards.merged(query, key=lambda artist: artist.id)
+
+
+def upcoming_shows():
+    """Shows starting after now, ordered by start time"""
+    query = select([
+        shard_shows.c.id, shard_shows.c.venue_id, shard_shows.c.venue_name, shard_shows.c.artist_id,
+        shard_shows.c.artist_name, shard_shows.c.artist_image_link, shard_shows.c.start_time
+    ]).where(shard_shows.c.start_time > datetime.now())
+    query = query.order_by(shard_shows.c.start_time, shard_shows.c.id)
+    return shards.merged(query, key=lambda show: (show.start_time, show.id))
+
+
+def search(kind, term):
+    """(id, name, num_upcoming_shows) of the venues or artists matching a normalized search
+    term by name or exact "city, st", ordered by id"""
+    table, show_column = ((shard_venues, shard_shows.c.venue_id) if kind == 'venues' else
+                          (shard_artists, shard_shows.c.artist_id))
+    query = select([table.c.id, table.c.name]).where(
+        or_(table.c.name.ilike('%' + term + '%'),
+            func.lower(table.c.city + ', ' + table.c.state) == term)).order_by(table.c.id)
+    rows = list(shards.merged(query, key=lambda row: row.id))
+    if not rows:
+        return []
+
+    # An artist's shows are spread over its venues' shards, so counts are summed.
+    ids = [row.id for row in rows]
+
+    def count(name, connection):
+        upcoming = show_column.in_(ids) & (shard_shows.c.start_time > datetime.now())
+        query = select([show_column, func.count(shard_shows.c.id)]).where(upcoming)
+        return connection.execute(query.group_by(show_column)).fetchall()
+
+    counts = defaultdict(int)
+    for shard_counts in shards.scatter(count).values():
+        for id, upcoming in shard_counts:
+            counts[id] += upcoming
+    return [(row.id, row.name, counts[row.id]) for row in rows]
+
+
+#  Writes
+#  ----------------------------------------------------------------
+#  Every change is applied to all shards at once: each deletes the rows it may hold for
+#  the changed ids and inserts the ones it owns now, so a row whose state changed moves
+#  shards in the same step.
+
+
+def show_rows(condition):
+    query = db.session.query(Show.id, Show.venue_id, Show.artist_id, Show.start_time,
+                             Venue.name.label('venue_name'), Venue.state.label('venue_state'),
+                             Artist.name.label('artist_name'),
+                             Artist.image_link.label('artist_image_link'))
+    query = query.join(Venue, Venue.id == Show.venue_id).join(Artist, Artist.id == Show.artist_id)
+    return [dict(show._asdict()) for show in query.filter(condition)]
+
+
+def by_shard(rows, state_key):
+    owned = defaultdict(list)
+    for row in rows:
+        owned[shards.shard_for_state(row.pop(state_key))].append(row)
+    return owned
+
+
+def sync_venues(venue_ids):
+    """Copy venues, and the shows they hold, from the primary to their shards"""
+    venue_ids = list(venue_ids)
+    if not shards.enabled or not venue_ids:
+        return
+    venues = by_shard([
+        dict(venue._asdict(), shard_state=venue.state) for venue in Venue.query.with_entities(
+            Venue.id, Venue.name, Venue.city, Venue.state, Venue.image_link,
+            Venue.seeking_talent).filter(Venue.id.in_(venue_ids))
+    ], 'shard_state')
+    shows = by_shard(show_rows(Show.venue_id.in_(venue_ids)), 'venue_state')
+
+    def apply(name, connection):
+        connection.execute(shard_shows.delete().where(shard_shows.c.venue_id.in_(venue_ids)))
+        connection.execute(shard_venues.delete().where(shard_venues.c.id.in_(venue_ids)))
+        if venues[name]:
+            connection.execute(shard_venues.insert(), venues[name])
+        if shows[name]:
+            connection.execute(shard_shows.insert(), shows[name])
+
+    shards.scatter(apply)
+
+
+def sync_artists(artist_ids):
+    """Copy artists from the primary to their shards, and their names to their shows"""
+    artist_ids = list(artist_ids)
+    if not shards.enabled or not artist_ids:
+        return
+    rows = [
+        dict(artist._asdict(), shard_state=artist.state) for artist in Artist.query.with_entities(
+            Artist.id, Artist.name, Artist.city, Artist.state, Artist.image_link,
+            Artist.seeking_venue).filter(Artist.id.in_(artist_ids))
+    ]
+    names = [{
+        'artist': row['id'],
+        'artist_name': row['name'],
+        'artist_image_link': row['image_link']
+    } for row in rows]
+    artists = by_shard(rows, 'shard_state')
+
+    def apply(name, connection):
+        connection.execute(shard_artists.delete().where(shard_artists.c.id.in_(artist_ids)))
+        if artists[name]:
+            connection.execute(shard_artists.insert(), artists[name])
+        if names:
+            connection.execute(
+                shard_shows.update().where(shard_shows.c.artist_id == bindparam('artist')).values(
+                    artist_name=bindparam('artist_name'),
+                    artist_image_link=bindparam('artist_image_link')), names)
+
+    shards.scatter(apply)
+
+
+def sync_shows(show_ids):
+    """Copy shows from the primary to their venues' shards"""
+    show_ids = list(show_ids)
+    if not shards.enabled or not show_ids:
+        return
+    shows = by_shard(show_rows(Show.id.in_(show_ids)), 'venue_state')
+
+    def apply(name, connection):
+        connection.execute(shard_shows.delete().where(shard_shows.c.id.in_(show_ids)))
+        connection.execute(shard_shows.insert(), shows[name])
+
+    # New shows are only in the primary, so only their venues' shards change.
+    if shows:
+        shards.scatter(apply, names=shows.keys())
+
+
+def delete(venue_ids=(), artist_ids=(), show_ids=()):
+    """Remove deleted rows, and the shows deleted with them, from every shard"""
+    venue_ids, artist_ids, show_ids = list(venue_ids), list(artist_ids), list(show_ids)
+    if not shards.enabled or not (venue_ids or artist_ids or show_ids):
+        return
+
+    def apply(name, connection):
+        connection.execute(shard_shows.delete().where(
+            shard_shows.c.venue_id.in_(venue_ids) | shard_shows.c.artist_id.in_(artist_ids) |
+            shard_shows.c.id.in_(show_ids)))
+        connection.execute(shard_venues.delete().where(shard_venues.c.id.in_(venue_ids)))
+        connection.execute(shard_artists.delete().where(shard_artists.c.id.in_(artist_ids)))
+
+    shards.scatter(apply)
+
+
+#  Maintenance
+#  ----------------------------------------------------------------
+
+
+def rebuild(batch_size=500):
+    """Empty every shard and copy the catalogue back from the primary; returns (venues,
+    artists) copied"""
+
+    def clear(name, connection):
+        for table in (shard_shows, shard_venues, shard_artists):
+            connection.execute(table.delete())
+
+    shards.scatter(clear)
+    copied = []
+    for model, sync in ((Venue, sync_venues), (Artist, sync_artists)):
+        ids = [id for (id,) in model.query.with_entities(model.id).order_by(model.id)]
+        for start in range(0, len(ids), batch_size):
+            sync(ids[start:start + batch_size])
+        copied.append(len(ids))
+    return tuple(copied)
+
+
+def rebalance(batch_size=500):
+    """Move rows whose state another shard now owns, after SHARDS has changed.
+
+    Works from shard to shard without the primary. Returns {table: rows moved}.
+    """
+    moved = {'venues': 0, 'artists': 0, 'shows': 0}
+    for source in sorted(shards.engines):
+        for kind, table, shows_column in (('venues', shard_venues, shard_shows.c.venue_id),
+                                          ('artists', shard_artists, None)):
+            with shards.engines[source].connect() as connection:
+                states = [
+                    row.state for row in connection.execute(select([table.c.state]).distinct())
+                ]
+            for state in states:
+                target = shards.shard_for_state(state)
+                if target == source:
+                    continue
+                while True:
+                    rows, shows = move_batch(source, target, table, shows_column, state, batch_size)
+                    if not rows:
+                        break
+                    moved[kind] += rows
+                    moved['shows'] += shows
+    return moved
+
+
+def move_batch(source, target, table, shows_column, state, batch_size):
+    """Move up to `batch_size` rows of `state`, with their shows, from `source` to `target`.
+
+    The rows are committed in `target` before they are deleted from `source`, so an
+    interrupted move leaves duplicates rather than gaps, and running it again finishes it.
+    """
+    with shards.engines[source].connect() as connection:
+        rows = [
+            dict(row) for row in connection.execute(
+                select([table]).where(
+                    table.c.state == state).order_by(table.c.id).limit(batch_size))
+        ]
+        ids = [row['id'] for row in rows]
+        shows = []
+        if rows and shows_column is not None:
+            shows = [
+                dict(row)
+                for row in connection.execute(select([shard_shows]).where(shows_column.in_(ids)))
+            ]
+    if not rows:
+        return 0, 0
+
+    with shards.engines[target].begin() as connection:
+        connection.execute(table.delete().where(table.c.id.in_(ids)))
+        connection.execute(table.insert(), rows)
+        if shows:
+            connection.execute(shard_shows.delete().where(
+                shard_shows.c.id.in_([show['id'] for show in shows])))
+            connection.execute(shard_shows.insert(), shows)
+    with shards.engines[source].begin() as connection:
+        if shows:
+            connection.execute(shard_shows.delete().where(shows_column.in_(ids)))
+        connection.execute(table.delete().where(table.c.id.in_(ids)))
+    return len(rows), len(shows)
@@ -0,0 +1,287 @@
+#----------------------------------------------------------------------------#
+# In-memory prefix index for autocomplete.
+#----------------------------------------------------------------------------#
+import heapq
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import Counter, OrderedDict
+
+VENUE = 'venue'
+ARTIST = 'artist'
+CITY = 'city'
+
+MAX_RESULTS = 20
+
+
+def normalize(text):
+    """Case-fold and collapse whitespace"""
+    return ' '.join((text or '').casefold().split())
+
+
+def index_keys(label):
+    """Keys under which `label` is found: the whole string and every word suffix"""
+    words = normalize(label).split(' ')
+    return tuple(sorted(set(' '.join(words[i:]) for i in range(len(words)) if words[i])))
+
+
+class PrefixIndex(object):
+    """Sorted array of (key, entry) pairs searched with bisect.
+
+    The top results for each prefix are memoised. Writes patch the memoised lists they
+    affect instead of dropping them, so short, popular prefixes stay warm while the
+    catalogue changes.
+    """
+
+    def __init__(self, max_cached_prefixes=50000, preload_min_keys=1000):
+        self._lock = threading.RLock()
+        self._keys = []
+        self._entries = {}
+        self._cache = OrderedDict()
+        self.max_cached_prefixes = max_cached_prefixes
+        self.preload_min_keys = preload_min_keys
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def load(self, entries):
+        """Replace the contents with (entry, label, score) triples in one sort"""
+        with self._lock:
+            self._entries = {}
+            keys = []
+            for entry, label, score in entries:
+                entry_keys = index_keys(label)
+                self._entries[entry] = (label, score, entry_keys)
+                keys.extend((key, entry) for key in entry_keys)
+            keys.sort()
+            self._keys = keys
+            self._cache.clear()
+            self._preload()
+
+    def _preload(self):
+        # Rank up front every prefix wide enough that a cold scan would be slow.
+        pending = ['']
+        while pending:
+            prefix = pending.pop()
+            lo, hi = self._range(prefix)
+            while lo < hi:
+                key = self._keys[lo][0]
+                if len(key) == len(prefix):
+                    lo += 1
+                    continue
+                child = key[:len(prefix) + 1]
+                child_lo, child_hi = lo, self._range(child)[1]
+                if child_hi - child_lo >= self.preload_min_keys:
+                    self._cache[(child, None)] = self._scan(child, None)
+                    pending.append(child)
+                lo = child_hi
+
+    def put(self, entry, label, score=0):
+        """Insert or replace `entry`, a hashable (kind, id) pair"""
+        with self._lock:
+            keys = index_keys(label)
+            existing = self._entries.get(entry)
+            if existing is not None and existing[2] == keys:
+                if existing[0] != label:
+                    self._patch(entry, keys, removed=True)
+                    self._entries[entry] = (label,) + existing[1:]
+                    self._patch(entry, keys)
+                self.set_score(entry, score)
+                return
+
+            self.remove(entry)
+            self._entries[entry] = (label, score, keys)
+            for key in keys:
+                insort(self._keys, (key, entry))
+            self._patch(entry, keys)
+
+    def remove(self, entry):
+        with self._lock:
+            existing = self._entries.get(entry)
+            if existing is None:
+                return
+            self._patch(entry, existing[2], removed=True)
+            del self._entries[entry]
+            for key in existing[2]:
+                i = bisect_left(self._keys, (key, entry))
+                del self._keys[i]
+
+    def set_score(self, entry, score):
+        with self._lock:
+            existing = self._entries.get(entry)
+            if existing is None or existing[1] == score:
+                return
+            self._entries[entry] = (existing[0], score, existing[2])
+            self._patch(entry, existing[2])
+
+    def score(self, entry):
+        existing = self._entries.get(entry)
+        return existing[1] if existing is not None else 0
+
+    def search(self, prefix, kind=None, limit=10):
+        """Return up to `limit` (entry, label, score) tuples, highest score first"""
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        limit = min(limit, MAX_RESULTS)
+
+        cache_key = (prefix, kind)
+        with self._lock:
+            cached = self._cache.get(cache_key)
+            if cached is not None and (cached[1] or len(cached[0]) >= limit):
+                self._cache.move_to_end(cache_key)
+                self.hits += 1
+                return cached[0][:limit]
+
+            self.misses += 1
+            results, complete = self._scan(prefix, kind)
+            self._cache[cache_key] = (results, complete)
+            self._cache.move_to_end(cache_key)
+            if len(self._cache) > self.max_cached_prefixes:
+                self._cache.popitem(last=False)
+            return results[:limit]
+
+    @staticmethod
+    def _rank(result):
+        return -result[2], result[1], result[0]
+
+    def _range(self, prefix):
+        return (bisect_left(self._keys, (prefix,)), bisect_left(self._keys,
+                                                                (prefix + '\U0010ffff',)))
+
+    def _scan(self, prefix, kind):
+        """Return the top matches of a prefix and whether they are all of its matches"""
+        lo, hi = self._range(prefix)
+        matches = set(entry for _, entry in self._keys[lo:hi] if kind is None or entry[0] == kind)
+        results = heapq.nsmallest(MAX_RESULTS + 1,
+                                  ((entry,) + self._entries[entry][:2] for entry in matches),
+                                  key=self._rank)
+        return results[:MAX_RESULTS], len(results) <= MAX_RESULTS
+
+    def _patch(self, entry, keys, removed=False):
+        """Fold a write to `entry` into the memoised results of every prefix it matches.
+
+        Each memoised list is the top of its prefix's matches and is flagged complete when
+        it holds all of them. An incomplete list may lose items without being rescanned; it
+        is only rescanned once it is shorter than the limit a search asks for.
+        """
+        cache_keys = set()
+        for key in keys:
+            for i in range(1, len(key) + 1):
+                for kind in (None, entry[0]):
+                    if (key[:i], kind) in self._cache:
+                        cache_keys.add((key[:i], kind))
+
+        result = (entry,) + self._entries[entry][:2]
+        for cache_key in cache_keys:
+            results, complete = self._cache[cache_key]
+            results = [item for item in results if item[0] != entry]
+            if not removed and (complete or
+                                (results and self._rank(result) < self._rank(results[-1]))):
+                results.append(result)
+                results.sort(key=self._rank)
+                if len(results) > MAX_RESULTS:
+                    del results[MAX_RESULTS:]
+                    complete = False
+            self._cache[cache_key] = (results, complete)
+
+
+class Typeahead(object):
+    """Venue, artist and "City, ST" suggestions ranked by upcoming-show count"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.index = PrefixIndex()
+        self.built_at = None
+        self._cities = {}
+        self._city_refs = Counter()
+        self._city_scores = Counter()
+
+    def build(self, venues, artists):
+        """Rebuild from iterables of (id, name, city_and_state, upcoming_shows)"""
+        cities = {}
+        city_refs = Counter()
+        city_scores = Counter()
+        entries = []
+        for kind, rows in ((VENUE, venues), (ARTIST, artists)):
+            for entity_id, name, city_and_state, upcoming_shows in rows:
+                entries.append(((kind, entity_id), name, upcoming_shows))
+                cities[(kind, entity_id)] = city_and_state
+                city_refs[city_and_state] += 1
+                if kind == VENUE:
+                    city_scores[city_and_state] += upcoming_shows
+        entries.extend(((CITY, city_and_state), city_and_state, city_scores[city_and_state])
+                       for city_and_state in city_refs)
+
+        index = PrefixIndex()
+        index.load(entries)
+        with self._lock:
+            self.index = index
+            self._cities = cities
+            self._city_refs = city_refs
+            self._city_scores = city_scores
+            self.built_at = time.monotonic()
+
+    def invalidate(self):
+        """Force a rebuild on next use, for writes too broad to apply incrementally"""
+        self.built_at = None
+
+    def put_venue(self, venue_id, name, city_and_state, upcoming_shows=0):
+        with self._lock:
+            self._remove_city((VENUE, venue_id))
+            self.index.put((VENUE, venue_id), name, upcoming_shows)
+            self._add_city((VENUE, venue_id), city_and_state, upcoming_shows)
+
+    def put_artist(self, artist_id, name, city_and_state, upcoming_shows=0):
+        with self._lock:
+            self._remove_city((ARTIST, artist_id))
+            self.index.put((ARTIST, artist_id), name, upcoming_shows)
+            self._add_city((ARTIST, artist_id), city_and_state, 0)
+
+    def remove_venue(self, venue_id):
+        with self._lock:
+            self._remove_city((VENUE, venue_id))
+            self.index.remove((VENUE, venue_id))
+
+    def remove_artist(self, artist_id):
+        with self._lock:
+            self._remove_city((ARTIST, artist_id))
+            self.index.remove((ARTIST, artist_id))
+
+    def add_upcoming_show(self, venue_id, artist_id):
+        with self._lock:
+            for entry in ((VENUE, venue_id), (ARTIST, artist_id)):
+                self.index.set_score(entry, self.index.score(entry) + 1)
+            city_and_state = self._cities.get((VENUE, venue_id))
+            if city_and_state is not None:
+                self._city_scores[city_and_state] += 1
+                self.index.set_score((CITY, city_and_state), self._city_scores[city_and_state])
+
+    def search(self, prefix, kind=None, limit=10):
+        return self.index.search(prefix, kind=kind, limit=limit)
+
+    def _add_city(self, owner, city_and_state, upcoming_shows):
+        self._cities[owner] = city_and_state
+        self._city_refs[city_and_state] += 1
+        self._city_scores[city_and_state] += upcoming_shows
+        if self._city_refs[city_and_state] == 1:
+            self.index.put((CITY, city_and_state), city_and_state,
+                           self._city_scores[city_and_state])
+        else:
+            self.index.set_score((CITY, city_and_state), self._city_scores[city_and_state])
+
+    def _remove_city(self, owner):
+        city_and_state = self._cities.pop(owner, None)
+        if city_and_state is None:
+            return
+        if owner[0] == VENUE:
+            self._city_scores[city_and_state] -= self.index.score(owner)
+        self._city_refs[city_and_state] -= 1
+        if self._city_refs[city_and_state] <= 0:
+            del self._city_refs[city_and_state]
+            del self._city_scores[city_and_state]
+            self.index.remove((CITY, city_and_state))
+        else:
+            self.index.set_score((CITY, city_and_state), self._city_scores[city_and_state])
@@ -0,0 +1,20 @@
+#----------------------------------------------------------------------------#
+# Blueprints.
+#----------------------------------------------------------------------------#
+import importlib
+
+# Blueprint name -> module defining it as `bp`. A blueprint's module, and whatever it imports, is
+# only loaded when an app registers it.
+BLUEPRINTS = {
+    'venues': 'views.venues',
+    'artists': 'views.artists',
+    'shows': 'views.shows',
+    'api': 'views.api',
+    'images': 'views.images',
+    'admin': 'views.admin',
+}
+
+
+def register_blueprints(app, names):
+    for name in names:
+        app.register_blueprint(importlib.import_module(BLUEPRINTS[name]).bp)
@@ -0,0 +1,266 @@
+#----------------------------------------------------------------------------#
+# Admin commands.
+#----------------------------------------------------------------------------#
+from datetime import datetime, timedelta
+import json
+import os
+import platform
+import tempfile
+
+import click
+from flask import Blueprint, current_app
+from flask.cli import AppGroup
+
+import identity
+import loadtest
+import profiles
+import sharding
+from indexes import match_index, search_results, typeahead_index
+from models import (db, ArchivedShow, Artist, ArtistAvailableTime, ArtistGenre, Show, Venue,
+                    VenueGenre)
+
+# Command-line only: its commands are added at the top level (`flask shows archive`).
+bp = Blueprint('admin', __name__, cli_group=None)
+
+
+@bp.record_once
+def init_migrate(state):
+    # Alembic is slow to import and only needed by `flask db`.
+    from flask_migrate import Migrate
+    Migrate(state.app, db)
+
+
+venues_cli = AppGroup('venues', help='Manage venues.')
+
+
+@venues_cli.command('geocode')
+def geocode_venues():
+    """Backfill venue coordinates and geohashes from the city-centroid table."""
+    located = 0
+    venues = Venue.query.all()
+    for venue in venues:
+        venue.geocode()
+        located += venue.geohash is not None
+    db.session.commit()
+    print('Geocoded {} of {} venues.'.format(located, len(venues)))
+
+
+bp.cli.add_command(venues_cli)
+
+shows_cli = AppGroup('shows', help='Manage shows.')
+
+
+def month_start(value):
+    return datetime(value.year, value.month, 1)
+
+
+def next_month(value):
+    return datetime(value.year + value.month // 12, value.month % 12 + 1, 1)
+
+
+def ensure_archive_partitions(first, last):
+    """Create the monthly Postgres partitions of shows_archive covering [first, last]"""
+    month = month_start(first)
+    while month <= last:
+        db.session.execute(
+            'CREATE TABLE IF NOT EXISTS shows_archive_y{:%Y}m{:%m} PARTITION OF shows_archive '
+            "FOR VALUES FROM ('{:%Y-%m-%d}') TO ('{:%Y-%m-%d}')".format(
+                month, month, month, next_month(month)))
+        month = next_month(month)
+
+
+@shows_cli.command('archive')
+@click.option('--days',
+              type=int,
+              default=None,
+              help='Archive shows that started more than this many days ago.')
+@click.option('--batch-size', type=int, default=1000, help='Shows moved per transaction.')
+def archive_shows(days, batch_size):
+    """Move old shows from the hot shows table into shows_archive."""
+    if days is None:
+        days = current_app.config['SHOW_ARCHIVE_AFTER_DAYS']
+    cutoff = datetime.now() - timedelta(days=days)
+    columns = ['id', 'start_time', 'venue_id', 'artist_id']
+    shows = Show.__table__
+
+    archived = 0
+    while True:
+        batch = db.session.query(Show.id,
+                                 Show.start_time).filter(Show.start_time < cutoff).order_by(
+                                     Show.start_time).limit(batch_size).all()
+        if not batch:
+            break
+
+        if db.engine.dialect.name == 'postgresql':
+            ensure_archive_partitions(batch[0].start_time, batch[-1].start_time)
+        ids = [show.id for show in batch]
+        db.session.execute(ArchivedShow.__table__.insert().from_select(
+            columns,
+            db.select([shows.c[column] for column in columns]).where(shows.c.id.in_(ids))))
+        db.session.execute(shows.delete().where(shows.c.id.in_(ids)))
+        db.session.commit()
+        archived += len(ids)
+
+    print('Archived {} shows that started before {:%Y-%m-%d}.'.format(archived, cutoff))
+
+
+bp.cli.add_command(shows_cli)
+
+profiles_cli = AppGroup('profiles', help='Manage the venue and artist profile documents.')
+
+
+@profiles_cli.command('rebuild')
+@click.option('--batch-size', type=int, default=500, help='Profiles rebuilt per transaction.')
+def rebuild_profiles(batch_size):
+    """Rebuild every profile document from the catalogue tables."""
+    venues, artists = profiles.rebuild_all(batch_size)
+    print('Rebuilt {} venue and {} artist profiles.'.format(venues, artists))
+
+
+bp.cli.add_command(profiles_cli)
+
+sessions_cli = AppGroup('sessions', help='Manage server-side sessions.')
+
+
+@sessions_cli.command('sweep')
+def sweep_sessions():
+    """Delete expired sessions from the session store."""
+    print('Deleted {} expired sessions.'.format(current_app.extensions['sessions'].sweep()))
+
+
+bp.cli.add_command(sessions_cli)
+
+shards_cli = AppGroup('shards', help='Manage the regional listing shards.')
+
+
+@shards_cli.command('rebuild')
+@click.option('--batch-size', type=int, default=500, help='Rows copied per transaction.')
+def rebuild_shards(batch_size):
+    """Copy the catalogue from the primary database into the shards."""
+    if not sharding.shards.enabled:
+        raise click.ClickException('SHARDS is not configured.')
+    venues, artists = sharding.rebuild(batch_size)
+    print('Copied {} venues and {} artists to {} shards.'.format(venues, artists,
+                                                                 len(sharding.shards.engines)))
+
+
+@shards_cli.command('rebalance')
+@click.option('--batch-size', type=int, default=500, help='Rows moved per transaction.')
+def rebalance_shards(batch_size):
+    """Move rows to the shards that own their states under the current SHARDS."""
+    if not sharding.shards.enabled:
+        raise click.ClickException('SHARDS is not configured.')
+    moved = sharding.rebalance(batch_size)
+    print('Moved {venues} venues, {artists} artists and {shows} shows.'.format(**moved))
+
+
+bp.cli.add_command(shards_cli)
+
+
+def seed_database(dataset):
+    """Replace the catalogue with a loadtest.generate_dataset() catalogue"""
+    db.drop_all()
+    db.create_all()
+    for model in (Venue, VenueGenre, Artist, ArtistGenre, ArtistAvailableTime, Show):
+        rows = dataset.get(model.__tablename__)
+        if rows:
+            db.session.execute(model.__table__.insert(), rows)
+    db.session.commit()
+
+    if db.engine.dialect.name == 'postgresql':
+        # Rows were inserted with explicit ids, so move the sequences past them.
+        for table in ('venues', 'artists', 'shows'):
+            db.session.execute("SELECT setval(pg_get_serial_sequence('{0}', 'id'), "
+                               "(SELECT coalesce(max(id), 1) FROM {0}))".format(table))
+        db.session.commit()
+
+
+@bp.cli.command('loadtest')
+@click.option('--database-uri',
+              default=None,
+              help='Database to seed and serve from. Defaults to a throwaway SQLite file; '
+              'any other database is dropped and recreated.')
+@click.option('--venues', default=200, show_default=True)
+@click.option('--artists', default=500, show_default=True)
+@click.option('--shows', default=2000, show_default=True)
+@click.option('--concurrency', '-c', default=8, show_default=True)
+@click.option('--duration', '-d', default=30, show_default=True, help='Measured seconds.')
+@click.option('--warmup', default=5, show_default=True, help='Unmeasured seconds first.')
+@click.option('--mix',
+              multiple=True,
+              help='Override a route weight as NAME=WEIGHT, e.g. --mix venues=50. Routes: ' +
+              ', '.join(sorted(loadtest.DEFAULT_MIX)) + '.')
+@click.option('--seed', default=0, show_default=True, help='Seed for the dataset and the mix.')
+@click.option('--output', '-o', default='loadtest.json', show_default=True, type=click.Path())
+def run_loadtest(database_uri, venues, artists, shows, concurrency, duration, warmup, mix, seed,
+                 output):
+    """Seed a dataset, serve it locally and replay a weighted route mix against it."""
+    weights = dict(loadtest.DEFAULT_MIX)
+    for item in mix:
+        name, _, weight = item.partition('=')
+        if name not in weights or not weight.isdigit():
+            routes = ', '.join(sorted(weights))
+            raise click.BadParameter('expected NAME=WEIGHT with NAME one of ' + routes,
+                                     param_hint='--mix')
+        weights[name] = int(weight)
+    weights = {name: weight for name, weight in weights.items() if weight}
+
+    scratch = None
+    if database_uri is None:
+        scratch = tempfile.NamedTemporaryFile(prefix='fyyur-loadtest-', suffix='.db', delete=False)
+        scratch.close()
+        database_uri = 'sqlite:///' + scratch.name
+    current_app.config['SQLALCHEMY_DATABASE_URI'] = database_uri
+    current_app.config['RATELIMIT_ENABLED'] = False
+    started_at = datetime.utcnow()
+    dialect = db.engine.dialect.name
+
+    try:
+        dataset = loadtest.generate_dataset(venues, artists, shows, seed=seed)
+        seed_database(dataset)
+        typeahead_index.invalidate()
+        match_index.built = False
+        search_results.invalidate('venues')
+        search_results.invalidate('artists')
+        identity.entities.clear()
+        click.echo('Seeded {} venues, {} artists and {} shows.'.format(venues, artists, shows))
+
+        with loadtest.LocalServer(current_app._get_current_object()) as server:
+            click.echo('Serving on port {}; {}s warmup, {}s measured, {} clients.'.format(
+                server.port, warmup, duration, concurrency))
+            samples = loadtest.run(server.host,
+                                   server.port,
+                                   loadtest.build_requests(dataset),
+                                   weights,
+                                   concurrency=concurrency,
+                                   duration=duration,
+                                   warmup=warmup,
+                                   seed=seed)
+    finally:
+        db.session.remove()
+        db.engine.dispose()
+        if scratch is not None:
+            os.remove(scratch.name)
+
+    summary = loadtest.summarize(samples, duration)
+    results = {
+        'started_at': started_at.isoformat() + 'Z',
+        'python': platform.python_version(),
+        'database': dialect,
+        'dataset': {
+            'venues': venues,
+            'artists': artists,
+            'shows': shows,
+            'seed': seed
+        },
+        'concurrency': concurrency,
+        'duration': duration,
+        'warmup': warmup,
+        'mix': weights,
+    }
+    results.update(summary)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+    click.echo(loadtest.format_report(summary))
+    click.echo('Wrote {}.'.format(output))
@@ -0,0 +1,237 @@
+#----------------------------------------------------------------------------#
+# JSON API.
+#----------------------------------------------------------------------------#
+from datetime import datetime, timedelta
+
+from flask import Blueprint, abort, jsonify, request, url_for
+
+import availability
+import facets
+import geo
+import identity
+import profiles
+import ratelimit
+import typeahead
+from indexes import (ensure_match_index, ensure_typeahead_index, match_index, search,
+                     typeahead_index)
+from loading import query_budget
+from models import db, Artist, ArtistAvailabilityRule, ArtistAvailableTime, Show, Venue
+from views.helpers import parse_date_arg
+
+bp = Blueprint('api', __name__)
+
+
+@bp.route('/autocomplete')
+def autocomplete():
+
+    ensure_typeahead_index()
+    results = typeahead_index.search(request.args.get('q', ''),
+                                     kind=request.args.get('kind'),
+                                     limit=request.args.get('limit', 10, type=int))
+
+    urls = {
+        typeahead.VENUE: lambda venue_id: url_for('venues.show_venue', venue_id=venue_id),
+        typeahead.ARTIST: lambda artist_id: url_for('artists.show_artist', artist_id=artist_id),
+        typeahead.CITY: lambda city_and_state: None,
+    }
+    return jsonify({
+        'results': [{
+            'kind': kind,
+            'id': entity_id,
+            'label': label,
+            'upcoming_shows': upcoming_shows,
+            'url': urls[kind](entity_id),
+        } for (kind, entity_id), label, upcoming_shows in results]
+    })
+
+
+SEARCH_MAX_LIMIT = 100
+
+
+@bp.route('/search/<any(venues, artists):kind>')
+@ratelimit.limited('search')
+@query_budget(1)
+def faceted_search(kind):
+
+    limit = min(max(request.args.get('limit', 20, type=int), 0), SEARCH_MAX_LIMIT)
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    results = search(kind, request.args.get('q', ''), facets.parse_filters(request.args), limit,
+                     offset)
+    return jsonify(dict(results, limit=limit, offset=offset))
+
+
+@bp.route('/venues/near')
+@ratelimit.limited('search')
+def venues_near():
+
+    radius = request.args.get('radius', 25, type=float)
+    limit = request.args.get('limit', 20, type=int)
+    latitude = request.args.get('lat', type=float)
+    longitude = request.args.get('lng', type=float)
+
+    if latitude is None or longitude is None:
+        city, state = geo.parse_city_and_state(request.args.get('city_and_state', ''))
+        coordinates = geo.geocode(city, state)
+        if coordinates is None:
+            abort(400)
+        latitude, longitude = coordinates
+
+    # Prune with the geohash index and the bounding box before computing any distance.
+    min_lat, max_lat, min_lon, max_lon = geo.bounding_box(latitude, longitude, radius)
+    query = Venue.query.with_entities(Venue.id, Venue.name, Venue.address, Venue.city, Venue.state,
+                                      Venue.image_link, Venue.latitude, Venue.longitude).filter(
+                                          Venue.latitude.between(min_lat, max_lat))
+    cells = geo.covering_cells(latitude, longitude, radius)
+    if cells is not None:
+        query = query.filter(
+            db.or_(*[Venue.geohash.between(*geo.prefix_range(cell)) for cell in cells]))
+    if min_lon >= -180 and max_lon <= 180:
+        query = query.filter(Venue.longitude.between(min_lon, max_lon))
+
+    nearby = []
+    for venue in query.all():
+        distance = geo.haversine_km(latitude, longitude, venue.latitude, venue.longitude)
+        if distance <= radius:
+            nearby.append((distance, venue))
+    nearby.sort(key=lambda item: (item[0], item[1].id))
+    nearby = nearby[:limit]
+
+    upcoming_shows = {}
+    if nearby:
+        query_upcoming_shows = Show.query.join(Artist).with_entities(
+            Show.venue_id, Show.artist_id, Artist.name.label('artist_name'),
+            Show.start_time).filter(Show.venue_id.in_([venue.id for _, venue in nearby]),
+                                    Show.start_time > datetime.now()).order_by(Show.start_time)
+        for show in query_upcoming_shows.all():
+            upcoming_shows.setdefault(show.venue_id, []).append({
+                'artist_id': show.artist_id,
+                'artist_name': show.artist_name,
+                'start_time': show.start_time.isoformat(),
+            })
+
+    return jsonify({
+        'latitude':
+            latitude,
+        'longitude':
+            longitude,
+        'radius':
+            radius,
+        'venues': [{
+            'id': venue.id,
+            'name': venue.name,
+            'address': venue.address,
+            'city': venue.city,
+            'state': venue.state,
+            'image_link': venue.image_link,
+            'distance_km': round(distance, 3),
+            'upcoming_shows': upcoming_shows.get(venue.id, []),
+        } for distance, venue in nearby]
+    })
+
+
+#  Matching
+#  ----------------------------------------------------------------
+
+MATCH_MAX_DAYS = 92
+MATCH_MAX_LIMIT = 100
+
+
+@bp.route('/venues/<int:venue_id>/matches')
+@ratelimit.limited('search')
+def match_artists(venue_id):
+
+    venue = identity.entities.get_or_404(identity.VENUE, venue_id)
+    genres = venue.genres
+
+    today = datetime.combine(datetime.now().date(), datetime.min.time())
+    start = parse_date_arg('from', today).date()
+    end = parse_date_arg('to', today + timedelta(days=30)).date()
+    if end < start or end - start > timedelta(days=MATCH_MAX_DAYS):
+        abort(400)
+    limit = min(max(request.args.get('limit', 20, type=int), 1), MATCH_MAX_LIMIT)
+
+    ensure_match_index()
+    windows = {artist_id: (start, end) for artist_id in match_index.recurring_artists(genres)}
+    recurring_dates = {}
+    for artist_id, occurrences in availability.occurrences(windows).items():
+        recurring_dates[artist_id] = [occurrence.date for occurrence in occurrences]
+    matches = match_index.match(genres, start, end, limit=limit, recurring_dates=recurring_dates)
+
+    artists = identity.entities.get_many(identity.ARTIST,
+                                         [artist_id for artist_id, _, _ in matches])
+
+    return jsonify({
+        'venue_id':
+            venue.id,
+        'from':
+            start.isoformat(),
+        'to':
+            end.isoformat(),
+        'artists': [
+            dict(artists[artist_id].serialize,
+                 shared_genres=shared_genres,
+                 available_dates=[date.isoformat()
+                                  for date in dates])
+            for artist_id, shared_genres, dates in matches
+            if artist_id in artists
+        ]
+    })
+
+
+@bp.route('/venues/<int:venue_id>/profile')
+@query_budget(6)
+def venue_profile(venue_id):
+
+    venue = profiles.load(profiles.VENUE, venue_id)
+    if venue is None:
+        abort(404)
+    return jsonify(profiles.split_shows(venue))
+
+
+@bp.route('/artists/<int:artist_id>/profile')
+@query_budget(8)
+def artist_profile(artist_id):
+
+    artist = profiles.load(profiles.ARTIST, artist_id)
+    if artist is None:
+        abort(404)
+    return jsonify(profiles.split_shows(artist))
+
+
+@bp.route('/artists/<int:artist_id>/available_times')
+@query_budget(5)
+def get_artist_available_times(artist_id):
+    """Dated availability, recurring rules, and the rules' occurrences from `from` to `to`"""
+
+    seeking_venue_only = request.args.get('seeking_venue_only')
+    response = {'artist': None, 'available_times': [], 'availability_rules': [], 'occurrences': []}
+
+    today = datetime.combine(datetime.now().date(), datetime.min.time())
+    start = parse_date_arg('from', today).date()
+    end = parse_date_arg('to', today + timedelta(days=30)).date()
+    if end < start or end - start > timedelta(days=MATCH_MAX_DAYS):
+        abort(400)
+
+    artist = identity.entities.get(identity.ARTIST, artist_id)
+    response['artist'] = artist.serialize if artist != None else None
+
+    if artist != None and artist.seeking_venue == True:
+
+        query = ArtistAvailableTime.query.filter(
+            ArtistAvailableTime.artist_id == artist_id).order_by(ArtistAvailableTime.date,
+                                                                 ArtistAvailableTime.time_from)
+        if seeking_venue_only:
+            query.join(Artist).filter(Artist.seeking_venue == True)
+
+        response['available_times'] = [available_time.serialize for available_time in query.all()]
+        response['availability_rules'] = [
+            dict(rule.serialize, description=availability.describe(rule.rrule))
+            for rule in ArtistAvailabilityRule.query.filter(
+                ArtistAvailabilityRule.artist_id == artist_id).order_by(ArtistAvailabilityRule.id)
+        ]
+        occurrences = availability.occurrences({artist_id: (start, end)}).get(artist_id, ())
+        response['occurrences'] = [
+            availability.serialize_occurrence(occurrence) for occurrence in occurrences
+        ]
+
+    return jsonify(response)
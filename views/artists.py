@@ -0,0 +1,234 @@
+#----------------------------------------------------------------------------#
+# Artists.
+#----------------------------------------------------------------------------#
+from datetime import datetime
+
+from flask import Blueprint, abort, current_app, flash, jsonify, render_template, request, url_for
+
+import availability
+import facets
+import identity
+import profiles
+import ratelimit
+import sharding
+from forms import ArtistForm
+from indexes import artist_changed, entities_deleted, search
+from loading import policy_query, query_budget
+from models import db, Artist, ArtistAvailabilityRule, ArtistAvailableTime, ArtistGenre
+from views.helpers import bulk_delete, iter_rows, parse_id_list, stream_template
+
+bp = Blueprint('artists', __name__)
+
+
+@bp.route('/artists')
+@query_budget(1)
+def artists():
+    if sharding.shards.enabled:
+        artists = sharding.artists()
+    else:
+        artists = iter_rows(policy_query(Artist).order_by(Artist.id))
+    return stream_template('pages/artists.html', artists=artists)
+
+
+@bp.route('/artists/search', methods=['GET', 'POST'])
+@ratelimit.limited('search')
+@query_budget(2)
+def search_artists():
+
+    search_term = request.values.get('search_term', '')
+    filters = facets.parse_filters(request.args)
+    return render_template('pages/search_artists.html',
+                           results=search('artists', search_term, filters),
+                           search_term=search_term,
+                           filters=filters)
+
+
+@bp.route('/artists/<int:artist_id>')
+@query_budget(8)
+def show_artist(artist_id):
+
+    artist = profiles.load(profiles.ARTIST, artist_id)
+    if artist is None:
+        abort(404)
+    return render_template('pages/show_artist.html', artist=profiles.split_shows(artist))
+
+
+#  Create Artist
+#  ----------------------------------------------------------------
+
+
+@bp.route('/artists/create', methods=['GET'])
+def create_artist_form():
+    form = ArtistForm()
+    return render_template('forms/new_artist.html', form=form)
+
+
+@bp.route('/artists/create', methods=['POST'])
+@ratelimit.limited('write')
+def create_artist_submission():
+    artist = Artist(name=request.form.get('name'),
+                    city=request.form.get('city'),
+                    state=request.form.get('state'),
+                    phone=request.form.get('phone'),
+                    image_link=request.form.get('image_link'),
+                    website=request.form.get('website'),
+                    facebook_link=request.form.get('facebook_link'),
+                    seeking_venue=request.form.get('seeking_venue') != None,
+                    seeking_description=request.form.get('seeking_description'))
+
+    for genre_name in request.form.getlist('genres'):
+        artist.genres.append(ArtistGenre(genre_name=genre_name))
+
+    try:
+        db.session.add(artist)
+        db.session.commit()
+        artist_changed(artist.id)
+        flash('Artist ' + request.form['name'] + ' was successfully listed!')
+    except:
+        db.session.rollback()
+        current_app.logger.exception('Artist could not be created')
+        flash('An error occurred. Artist ' + request.form['name'] + ' could not be listed.')
+
+    finally:
+        db.session.close()
+
+    return render_template('pages/home.html')
+
+
+#  Update
+#  ----------------------------------------------------------------
+
+
+@bp.route('/artists/<int:artist_id>/edit', methods=['GET'])
+@query_budget(2)
+def edit_artist(artist_id):
+    artist = identity.entities.get_or_404(identity.ARTIST, artist_id)
+    genres = list(artist.genres)
+
+    form = ArtistForm()
+    form.name.default = artist.name
+    form.city.default = artist.city
+    form.state.default = artist.state
+    form.phone.default = artist.phone
+    form.genres.default = genres
+    form.image_link.default = artist.image_link
+    form.website.default = artist.website
+    form.facebook_link.default = artist.facebook_link
+    form.seeking_venue.default = artist.seeking_venue
+    form.seeking_description.default = artist.seeking_description
+    form.process()
+
+    return render_template('forms/edit_artist.html', form=form, artist=artist)
+
+
+@bp.route('/artists/<int:artist_id>/edit', methods=['POST'])
+@ratelimit.limited('write')
+def edit_artist_submission(artist_id):
+
+    error = False
+
+    try:
+        input = request.get_json()
+
+        ArtistGenre.query.filter(ArtistGenre.artist_id == artist_id).delete()
+
+        artist = Artist.query.get(artist_id)
+
+        artist.name = input['name']
+        artist.city = input['city']
+        artist.state = input['state']
+        artist.phone = input['phone']
+        artist.image_link = input['image_link']
+        artist.website = input['website']
+        artist.facebook_link = input['facebook_link']
+        artist.seeking_venue = input['seeking_venue']
+        artist.seeking_description = input['seeking_description']
+
+        for genre_name in input['genres']:
+            artist.genres.append(ArtistGenre(genre_name=genre_name))
+
+        for available_time_input in input['available_times']:
+
+            time_from = available_time_input['time_from']
+            time_from = '00:00' if time_from == '' else time_from
+
+            time_to = available_time_input['time_to']
+            time_to = '23:59' if time_to == '' else time_to
+
+            if 'id' in available_time_input:
+                available_time = ArtistAvailableTime.query.get(available_time_input['id'])
+
+                if available_time_input['is_deleted']:
+                    db.session.delete(available_time)
+                else:
+                    available_time.date = available_time_input['date']
+                    available_time.time_from = time_from
+                    available_time.time_to = time_to
+            else:
+                artist.available_times.append(
+                    ArtistAvailableTime(date=available_time_input['date'],
+                                        time_from=time_from,
+                                        time_to=time_to))
+
+        # Recurring rules are optional in the body and edited like the dated times.
+        for rule_input in input.get('availability_rules', []):
+
+            if 'id' in rule_input:
+                rule = ArtistAvailabilityRule.query.filter(
+                    ArtistAvailabilityRule.id == rule_input['id'],
+                    ArtistAvailabilityRule.artist_id == artist_id).one()
+
+                if rule_input.get('is_deleted'):
+                    db.session.delete(rule)
+                    continue
+            else:
+                rule = ArtistAvailabilityRule(artist_id=artist_id)
+
+            dtstart = datetime.strptime(rule_input['dtstart'].replace('/', '-'), '%Y-%m-%d').date()
+            time_from = rule_input.get('time_from') or '00:00'
+            time_to = rule_input.get('time_to') or '23:59'
+
+            rule.rrule = availability.normalize_rrule(rule_input['rrule'], dtstart)
+            rule.dtstart = dtstart
+            rule.time_from = datetime.strptime(time_from, '%H:%M').time()
+            rule.time_to = datetime.strptime(time_to, '%H:%M').time()
+            rule.exdates = availability.format_exdates(rule_input.get('exdates', []))
+            db.session.add(rule)
+
+        db.session.commit()
+        artist_changed(artist_id)
+
+    except:
+        error = True
+        db.session.rollback()
+        current_app.logger.exception('Artist could not be updated', extra={'artist_id': artist_id})
+    finally:
+        db.session.close()
+
+    if error:
+        abort(500)
+    else:
+        return jsonify({"redirect_to": url_for('artists.show_artist', artist_id=artist_id)})
+
+
+#  Delete
+#  ----------------------------------------------------------------
+
+
+@bp.route('/artists/<int:artist_id>', methods=['DELETE'])
+@ratelimit.limited('write')
+def delete_artist(artist_id):
+    participants = profiles.show_participants(artist_ids=[artist_id])
+    bulk_delete(Artist, [artist_id])
+    entities_deleted(artist_ids=[artist_id], participants=participants)
+    return jsonify({"redirect_to": url_for('index')})
+
+
+@bp.route('/artists', methods=['DELETE'])
+@ratelimit.limited('write')
+def delete_artists():
+    ids = parse_id_list()
+    participants = profiles.show_participants(artist_ids=ids)
+    deleted = bulk_delete(Artist, ids) if ids else 0
+    entities_deleted(artist_ids=ids, participants=participants)
+    return jsonify({"deleted": deleted})
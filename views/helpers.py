@@ -0,0 +1,138 @@
+#----------------------------------------------------------------------------#
+# Helpers shared by the views.
+#----------------------------------------------------------------------------#
+from datetime import datetime
+
+from flask import (abort, current_app, get_flashed_messages, request, stream_with_context, url_for)
+
+import images
+
+from models import db
+
+
+def format_datetime(value, format='medium'):
+    # Imported on first use: babel and dateutil account for a good part of import time.
+    import babel.dates
+    import dateutil.parser
+
+    date = dateutil.parser.parse(value)
+    if format == 'full':
+        format = "EEEE MMMM, d, y 'at' h:mma"
+    elif format == 'medium':
+        format = "EE MM, dd, y h:mma"
+    return babel.dates.format_datetime(date, format)
+
+
+def stream_template(template_name, **context):
+    """Render a template as a stream of chunks of about STREAM_CHUNK_SIZE bytes.
+
+    Besides filling up, the buffer is flushed where the layout calls flush(), just before
+    the page content, so the header is sent before the content's queries run.
+    """
+    app = current_app._get_current_object()
+    # Pop flashed messages now: the session is saved before the body is streamed.
+    get_flashed_messages()
+
+    flush_requested = []
+    context['flush'] = lambda: flush_requested.append(True) or ''
+    app.update_template_context(context)
+    template = app.jinja_env.get_or_select_template(template_name)
+    chunk_size = app.config['STREAM_CHUNK_SIZE']
+
+    def generate():
+        buffer = []
+        size = 0
+        for piece in template.generate(context):
+            buffer.append(piece)
+            size += len(piece)
+            if size >= chunk_size or flush_requested:
+                yield ''.join(buffer)
+                buffer = []
+                size = 0
+                del flush_requested[:]
+        if buffer:
+            yield ''.join(buffer)
+
+    return current_app.response_class(stream_with_context(generate()), mimetype='text/html')
+
+
+def iter_rows(query):
+    """Iterate a query's rows, fetching STREAM_BATCH_SIZE of them at a time"""
+    return query.yield_per(current_app.config['STREAM_BATCH_SIZE'])
+
+
+def image_url(kind, entity_id, image_link, size, format):
+    """URL of a proxied variant of `image_link`, or the link itself without the proxy"""
+    if not image_link or 'images' not in current_app.extensions:
+        return image_link
+    return url_for('images.image',
+                   kind=kind,
+                   entity_id=entity_id,
+                   digest=images.link_digest(image_link),
+                   size=size,
+                   format=format)
+
+
+def facet_selected(filters, facet, value):
+    selected = filters.get(facet)
+    return value in selected if isinstance(selected, list) else selected == value
+
+
+def facet_url(endpoint, search_term, filters, facet, value):
+    """URL of a search with the facet value toggled in or out of `filters`"""
+    filters = dict(filters)
+    if facet_selected(filters, facet, value):
+        if isinstance(filters[facet], list):
+            filters[facet] = [selected for selected in filters[facet] if selected != value]
+        else:
+            del filters[facet]
+    elif facet == 'genre':
+        filters[facet] = filters.get(facet, []) + [value]
+    else:
+        filters[facet] = value
+    args = {
+        facet: str(value).lower() if isinstance(value, bool) else value
+        for facet, value in filters.items()
+    }
+    return url_for(endpoint, search_term=search_term, **args)
+
+
+def parse_date_arg(name, default):
+    """Parse a YYYY-MM-DD query argument, aborting with 400 when it is malformed"""
+    value = request.args.get(name)
+    if not value:
+        return default
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        abort(400)
+
+
+def parse_id_list():
+    """Read the {"ids": [...]} body of a bulk request, aborting with 400 when it is invalid"""
+    input = request.get_json(silent=True) or {}
+    ids = input.get('ids')
+    if (not isinstance(ids, list) or len(ids) > current_app.config['BULK_DELETE_MAX_IDS'] or
+            not all(isinstance(id, int) and not isinstance(id, bool) for id in ids)):
+        abort(400)
+    return ids
+
+
+def bulk_delete(model, ids):
+    """Delete rows by id in one statement, leaving dependants to ON DELETE CASCADE"""
+    error = False
+    deleted = 0
+
+    try:
+        deleted = model.query.filter(model.id.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+    except:
+        error = True
+        db.session.rollback()
+        current_app.logger.exception('Bulk delete failed', extra={'table': model.__tablename__})
+    finally:
+        db.session.close()
+
+    if error:
+        abort(500)
+    return deleted
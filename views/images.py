@@ -0,0 +1,48 @@
+#----------------------------------------------------------------------------#
+# Image proxy.
+#----------------------------------------------------------------------------#
+import re
+
+from flask import Blueprint, abort, current_app, redirect, request, send_file
+
+import images
+from models import db, Artist, Venue
+
+bp = Blueprint('images', __name__)
+
+DIGEST = re.compile(r'^[0-9a-f]{32}$')
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+@bp.record_once
+def init_images(state):
+    images.ImageProxy(state.app)
+
+
+@bp.route(
+    '/images/<any(venue, artist):kind>/<int:entity_id>/<digest>/<size>.<any(webp, jpg):format>')
+def image(kind, entity_id, digest, size, format):
+    if size not in images.SIZES or not DIGEST.match(digest):
+        abort(404)
+
+    proxy = current_app.extensions['images']
+    key = '{}-{}.{}'.format(digest, size, format)
+    f = proxy.cache.open(key)
+    if f is None:
+        # Only links stored on the entity are proxied, and only under their own digest.
+        model = Venue if kind == 'venue' else Artist
+        image_link = db.session.query(model.image_link).filter(model.id == entity_id).scalar()
+        if not image_link or images.link_digest(image_link) != digest:
+            abort(404)
+        try:
+            f = proxy.variant(image_link, digest, size, format)
+        except images.ImageError:
+            current_app.logger.warning('Image could not be proxied',
+                                       exc_info=True,
+                                       extra={'image_link': image_link})
+            return redirect(image_link)
+
+    response = send_file(f, mimetype=images.FORMATS[format][1], add_etags=False)
+    response.set_etag(key)
+    response.headers['Cache-Control'] = IMMUTABLE
+    return response.make_conditional(request)
@@ -0,0 +1,439 @@
+#----------------------------------------------------------------------------#
+# Shows and calendars.
+#----------------------------------------------------------------------------#
+from datetime import datetime, timedelta
+import hashlib
+import itertools
+
+from flask import (Blueprint, Response, abort, current_app, flash, jsonify, redirect,
+                   render_template, request, session, stream_with_context, url_for)
+
+import availability
+import ical
+import identity
+import profiles
+import ratelimit
+import sharding
+from events import show_events, stream_events, TooManySubscribers
+from forms import ShowForm
+from indexes import entities_deleted, show_created, shows_created
+from loading import query_budget
+from models import (db, show_history, ArchivedShow, Artist, ArtistAvailableTime, ArtistGenre,
+                    ProfileDocument, Show, Venue)
+from views.helpers import bulk_delete, iter_rows, parse_date_arg, parse_id_list, stream_template
+
+bp = Blueprint('shows', __name__)
+
+
+@bp.route('/shows')
+@query_budget(1)
+def shows():
+
+    if sharding.shards.enabled:
+        return stream_template('pages/shows.html', shows=sharding.upcoming_shows())
+
+    current_time = datetime.now()
+
+    shows = Show.query.join(Venue).join(Artist).with_entities(
+        Show.venue_id, Venue.name.label('venue_name'), Show.artist_id,
+        Artist.name.label('artist_name'), Artist.image_link.label('artist_image_link'),
+        Show.start_time).filter(Show.start_time > current_time).order_by(Show.start_time)
+
+    return stream_template('pages/shows.html', shows=iter_rows(shows))
+
+
+#  Calendar
+#  ----------------------------------------------------------------
+
+CALENDAR_MAX_DAYS = 366
+FEED_PAST_DAYS = 90
+
+
+def query_shows_between(start, end, venue_id=None, artist_id=None, city_and_state=None, genre=None):
+    """Shows starting in [start, end), or from start onwards when end is None.
+
+    Ranges that start in the past also read the archive.
+    """
+    shows = show_history() if start < datetime.now() else Show.__table__
+    query = db.session.query(
+        shows.c.id, shows.c.start_time, shows.c.venue_id, Venue.name.label('venue_name'),
+        Venue.address.label('venue_address'),
+        Venue.city_and_state.label('venue_city_and_state'), shows.c.artist_id,
+        Artist.name.label('artist_name')).join(Venue, Venue.id == shows.c.venue_id).join(
+            Artist, Artist.id == shows.c.artist_id).filter(shows.c.start_time >= start)
+
+    if end is not None:
+        query = query.filter(shows.c.start_time < end)
+    if venue_id is not None:
+        query = query.filter(shows.c.venue_id == venue_id)
+    if artist_id is not None:
+        query = query.filter(shows.c.artist_id == artist_id)
+    if city_and_state:
+        query = query.filter(Venue.city_and_state == city_and_state)
+    if genre:
+        query = query.filter(
+            shows.c.artist_id.in_(
+                db.session.query(ArtistGenre.artist_id).filter(ArtistGenre.genre_name == genre)))
+
+    return query.order_by(shows.c.start_time, shows.c.id)
+
+
+@bp.route('/calendar')
+@query_budget(1)
+def calendar():
+
+    today = datetime.combine(datetime.now().date(), datetime.min.time())
+    start = parse_date_arg('from', today)
+    end = parse_date_arg('to', start + timedelta(days=30))
+    if end < start or end - start > timedelta(days=CALENDAR_MAX_DAYS):
+        abort(400)
+
+    shows = query_shows_between(start,
+                                end + timedelta(days=1),
+                                venue_id=request.args.get('venue_id', type=int),
+                                artist_id=request.args.get('artist_id', type=int),
+                                city_and_state=request.args.get('city_and_state'),
+                                genre=request.args.get('genre'))
+
+    days = []
+    for date, day_shows in itertools.groupby(shows.all(), key=lambda show: show.start_time.date()):
+        days.append({
+            'date':
+                date.isoformat(),
+            'shows': [{
+                'id': show.id,
+                'start_time': show.start_time.isoformat(),
+                'venue_id': show.venue_id,
+                'venue_name': show.venue_name,
+                'artist_id': show.artist_id,
+                'artist_name': show.artist_name,
+            } for show in day_shows]
+        })
+
+    return jsonify({'from': start.date().isoformat(), 'to': end.date().isoformat(), 'days': days})
+
+
+def calendar_feed(name, filename, **criteria):
+    """Stream an .ics feed of the shows matching `criteria`, honouring If-None-Match"""
+    start = datetime.combine(datetime.now().date() - timedelta(days=FEED_PAST_DAYS),
+                             datetime.min.time())
+    shows = query_shows_between(start, None, **criteria)
+
+    # Cheap fingerprint of the feed contents, computed from the same indexed range. The
+    # names and addresses in each event change with their venue's or artist's profile
+    # document, which the write hooks rebuild after every edit.
+    feed = shows.order_by(None).subquery()
+    documents = ProfileDocument.__table__
+    feed_venues = db.select([feed.c.venue_id]).correlate(None)
+    feed_artists = db.select([feed.c.artist_id]).correlate(None)
+    documents_updated_at = db.select([db.func.max(documents.c.updated_at)]).where(
+        db.or_(
+            db.and_(documents.c.kind == profiles.VENUE, documents.c.entity_id.in_(feed_venues)),
+            db.and_(documents.c.kind == profiles.ARTIST,
+                    documents.c.entity_id.in_(feed_artists)))).as_scalar()
+    fingerprint = db.session.query(db.func.count(feed.c.id), db.func.max(feed.c.id),
+                                   db.func.min(feed.c.start_time), db.func.max(feed.c.start_time),
+                                   documents_updated_at).one()
+    etag = hashlib.md5(repr((name, start) + tuple(fingerprint)).encode('utf-8')).hexdigest()
+
+    # The feed may go out compressed, so the tag is a weak validator and the 304 varies on
+    # Accept-Encoding like the 200 it stands for.
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+        response.set_etag(etag, weak=True)
+        response.vary.add('Accept-Encoding')
+        return response
+
+    host = request.host
+    by_venue = 'venue_id' in criteria
+
+    def events():
+        for show in shows.yield_per(500):
+            if by_venue:
+                summary = show.artist_name
+                url = url_for('artists.show_artist', artist_id=show.artist_id, _external=True)
+            else:
+                summary = show.venue_name
+                url = url_for('venues.show_venue', venue_id=show.venue_id, _external=True)
+            yield {
+                'uid': 'show-{}@{}'.format(show.id, host),
+                'start_time': show.start_time,
+                'summary': summary,
+                'location': '{}, {}'.format(show.venue_address, show.venue_city_and_state),
+                'url': url,
+            }
+
+    response = Response(stream_with_context(ical.generate_calendar(name, events())),
+                        mimetype='text/calendar')
+    response.set_etag(etag, weak=True)
+    response.vary.add('Accept-Encoding')
+    response.headers['Content-Disposition'] = 'inline; filename="{}"'.format(filename)
+    return response
+
+
+@bp.route('/venues/<int:venue_id>/calendar.ics')
+def venue_calendar_feed(venue_id):
+    venue = identity.entities.get_or_404(identity.VENUE, venue_id)
+    return calendar_feed(venue.name, 'venue-{}.ics'.format(venue_id), venue_id=venue_id)
+
+
+@bp.route('/artists/<int:artist_id>/calendar.ics')
+def artist_calendar_feed(artist_id):
+    artist = identity.entities.get_or_404(identity.ARTIST, artist_id)
+    return calendar_feed(artist.name, 'artist-{}.ics'.format(artist_id), artist_id=artist_id)
+
+
+#  Live events
+#  ----------------------------------------------------------------
+
+
+@bp.route('/shows/events')
+def show_events_stream():
+    """Server-Sent Events for shows created and deleted, optionally for one venue or artist.
+
+    The stream outlives the request context on purpose: it holds no database session
+    while it waits, only a place in the event hub.
+    """
+    venue_id = request.args.get('venue_id', type=int)
+    artist_id = request.args.get('artist_id', type=int)
+
+    def matches(data):
+        # Deletions carry only the show id, so they go to every subscriber.
+        return ((venue_id is None or data.get('venue_id', venue_id) == venue_id) and
+                (artist_id is None or data.get('artist_id', artist_id) == artist_id))
+
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        stream = stream_events(show_events,
+                               last_event_id,
+                               keepalive=current_app.config['SSE_KEEPALIVE'],
+                               retry=current_app.config['SSE_RETRY'],
+                               matches=matches,
+                               max_subscribers=current_app.config['SSE_MAX_SUBSCRIBERS'])
+    except TooManySubscribers:
+        # Each stream holds a thread of a gthread worker; leave the rest to other requests.
+        return ratelimit.too_many_requests(503, current_app.config['SSE_RETRY'])
+
+    response = Response(stream, mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Tells nginx not to buffer the stream.
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+#  Create and delete
+#  ----------------------------------------------------------------
+
+
+@bp.route('/shows/create')
+def create_shows():
+
+    # renders form. do not touch.
+    subbmited = session.get('create_show')
+    form = ShowForm()
+    if subbmited:
+        form.artist_id.default = subbmited['artist_id']
+        form.venue_id.default = subbmited['venue_id']
+        form.start_time.default = datetime.strptime(subbmited['start_time'], '%Y-%m-%d %H:%M:%S')
+        session.pop('create_show')
+    else:
+        form.artist_id.default = request.args.get('artist_id')
+
+    form.process()
+
+    return render_template('forms/new_show.html', form=form)
+
+
+@bp.route('/shows/create', methods=['POST'])
+@ratelimit.limited('write')
+def create_show_submission():
+
+    try:
+        artist_id = request.form.get('artist_id', type=int)
+        start_time = datetime.strptime(request.form.get('start_time'), '%Y-%m-%d %H:%M:%S')
+
+        is_artist_available = ArtistAvailableTime.query.join(Artist).filter(
+            Artist.seeking_venue == True, ArtistAvailableTime.artist_id == artist_id,
+            ArtistAvailableTime.date == start_time.strftime('%Y-%m-%d'),
+            ArtistAvailableTime.time_from <= start_time.strftime('%H:%M:%S'),
+            ArtistAvailableTime.time_to >= start_time.strftime('%H:%M:%S')).count() > 0
+        if not is_artist_available and artist_id is not None:
+            is_artist_available = availability.is_available(artist_id, start_time)
+
+        if not is_artist_available:
+            flash('Artist is not available for the `Start Time`.')
+            session['create_show'] = request.form.to_dict()
+            return redirect(url_for('shows.create_shows'))
+
+        else:
+            show = Show(artist_id=artist_id,
+                        venue_id=request.form.get('venue_id'),
+                        start_time=start_time)
+
+            db.session.add(show)
+            db.session.commit()
+            show_created(show.id, show.venue_id, show.artist_id, start_time)
+            flash('Show was successfully listed!')
+    except:
+        db.session.rollback()
+        current_app.logger.exception('Show could not be created')
+        flash('An error occurred. Show could not be listed.')
+
+    return render_template('pages/home.html')
+
+
+def parse_show_batch(items):
+    """Split a batch into (index, artist_id, venue_id, start_time) tuples and per-item errors"""
+    shows = []
+    errors = {}
+    for index, item in enumerate(items):
+        try:
+            artist_id, venue_id = item['artist_id'], item['venue_id']
+            if not all(
+                    isinstance(id, int) and not isinstance(id, bool)
+                    for id in (artist_id, venue_id)):
+                raise TypeError
+            start_time = datetime.fromisoformat(item['start_time'])
+        except (KeyError, TypeError, ValueError):
+            errors[index] = ['artist_id and venue_id must be ids and start_time an ISO datetime']
+            continue
+        shows.append((index, artist_id, venue_id, start_time))
+    return shows, errors
+
+
+# Shows per statement of a batch. Each one binds up to five parameters, and SQLite before
+# 3.32 allows no more than 999 in a statement.
+SHOW_BATCH_CHUNK_SIZE = 150
+
+
+def chunked(shows):
+    return [
+        shows[start:start + SHOW_BATCH_CHUNK_SIZE]
+        for start in range(0, len(shows), SHOW_BATCH_CHUNK_SIZE)
+    ]
+
+
+def batch_items(shows):
+    """A derived table of `shows`, a UNION ALL of literal rows standing in for VALUES"""
+    return db.union_all(*[
+        db.select([
+            db.literal(index).label('idx'),
+            db.literal(artist_id).label('artist_id'),
+            db.literal(venue_id).label('venue_id'),
+            db.literal(start_time.date(), db.Date).label('date'),
+            db.literal(start_time.time(), db.Time).label('time'),
+        ]) for index, artist_id, venue_id, start_time in shows
+    ]).alias('items')
+
+
+def check_show_batch(shows):
+    """Yield (index, error) for the shows that cannot be created.
+
+    Each chunk of the batch is sent as one derived table and checked with two joins: one
+    against venues and artists, one against artist_available_times. Shows outside those
+    dates are checked against the recurring availability of their artists, expanded over
+    the dates of the batch.
+    """
+    chunks = [batch_items(chunk) for chunk in chunked(shows)]
+
+    available = set()
+    for items in chunks:
+        available.update(idx for (idx,) in db.session.query(items.c.idx).join(
+            ArtistAvailableTime,
+            db.and_(ArtistAvailableTime.artist_id == items.c.artist_id, ArtistAvailableTime.date ==
+                    items.c.date, ArtistAvailableTime.time_from <= items.c.time,
+                    ArtistAvailableTime.time_to >= items.c.time)).distinct())
+
+    windows = {}
+    for index, artist_id, _, start_time in shows:
+        if index not in available:
+            start, end = windows.get(artist_id, (start_time.date(), start_time.date()))
+            windows[artist_id] = (min(start, start_time.date()), max(end, start_time.date()))
+    if windows:
+        recurring = availability.occurrences(windows)
+        available.update(index for index, artist_id, _, start_time in shows
+                         if artist_id in windows and
+                         availability.covers(recurring.get(artist_id, ()), start_time))
+
+    for items in chunks:
+        found = db.session.query(items.c.idx, Venue.id.label('venue_id'),
+                                 Artist.id.label('artist_id'), Artist.seeking_venue).outerjoin(
+                                     Venue, Venue.id == items.c.venue_id).outerjoin(
+                                         Artist, Artist.id == items.c.artist_id)
+        for item in found:
+            if item.venue_id is None:
+                yield item.idx, 'venue does not exist'
+            if item.artist_id is None:
+                yield item.idx, 'artist does not exist'
+            elif not item.seeking_venue:
+                yield item.idx, 'artist is not seeking venues'
+            elif item.idx not in available:
+                yield item.idx, 'artist is not available at start_time'
+
+
+@bp.route('/shows/batch', methods=['POST'])
+@ratelimit.limited('write')
+def create_shows_batch():
+    """Create the valid shows of {"shows": [{artist_id, venue_id, start_time}, ...]}.
+
+    The valid shows are inserted together in one transaction, a statement per
+    SHOW_BATCH_CHUNK_SIZE shows; the response lists the errors of every rejected item by
+    its position in the request.
+    """
+    input = request.get_json(silent=True) or {}
+    items = input.get('shows')
+    if not isinstance(items, list) or len(items) > current_app.config['SHOW_BATCH_MAX_ITEMS']:
+        abort(400)
+
+    shows, errors = parse_show_batch(items)
+    if shows:
+        for index, error in check_show_batch(shows):
+            errors.setdefault(index, []).append(error)
+    shows = [show for show in shows if show[0] not in errors]
+
+    if shows:
+        try:
+            show_ids = []
+            for chunk in chunked(shows):
+                insert = Show.__table__.insert().values([{
+                    'artist_id': artist_id,
+                    'venue_id': venue_id,
+                    'start_time': start_time,
+                } for _, artist_id, venue_id, start_time in chunk])
+                if db.engine.dialect.implicit_returning:
+                    show_ids.extend(
+                        id for (id,) in db.session.execute(insert.returning(Show.__table__.c.id)))
+                else:
+                    # SQLite: a multi-row insert assigns consecutive rowids, ending at lastrowid.
+                    last_id = db.session.execute(insert).lastrowid
+                    show_ids.extend(range(last_id - len(chunk) + 1, last_id + 1))
+            db.session.commit()
+        except:
+            db.session.rollback()
+            current_app.logger.exception('Show batch could not be created',
+                                         extra={'shows': len(shows)})
+            abort(500)
+        finally:
+            db.session.close()
+
+        shows_created([(show_id, venue_id, artist_id, start_time)
+                       for show_id, (_, artist_id, venue_id, start_time) in zip(show_ids, shows)])
+
+    return jsonify({
+        'created':
+            len(shows),
+        'errors': [{
+            'index': index,
+            'errors': item_errors
+        } for index, item_errors in sorted(errors.items())],
+    })
+
+
+@bp.route('/shows', methods=['DELETE'])
+@ratelimit.limited('write')
+def delete_shows():
+    ids = parse_id_list()
+    participants = profiles.show_participants(show_ids=ids)
+    deleted = bulk_delete(Show, ids) + bulk_delete(ArchivedShow, ids) if ids else 0
+    entities_deleted(participants=participants)
+    return jsonify({"deleted": deleted})
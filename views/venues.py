@@ -0,0 +1,199 @@
+#----------------------------------------------------------------------------#
+# Venues.
+#----------------------------------------------------------------------------#
+import itertools
+
+from flask import Blueprint, abort, current_app, flash, jsonify, redirect, render_template, request, url_for
+
+import facets
+import identity
+import profiles
+import ratelimit
+import sharding
+from forms import VenueForm
+from indexes import entities_deleted, search, upcoming_show_counts, venue_changed
+from loading import policy_query, query_budget
+from models import db, Show, Venue, VenueGenre
+from views.helpers import bulk_delete, iter_rows, parse_id_list, stream_template
+
+bp = Blueprint('venues', __name__)
+
+
+@bp.route('/venues')
+@query_budget(2)
+def venues():
+
+    if sharding.shards.enabled:
+        # Shard rows come with their upcoming show counts.
+        venues = sharding.venues()
+        upcoming_shows = None
+    else:
+        venues = iter_rows(policy_query(Venue).order_by(Venue.state, Venue.city, Venue.id))
+        upcoming_shows = upcoming_show_counts(Show.venue_id)
+
+    def areas():
+        by_area = itertools.groupby(venues, key=lambda venue: (venue.city, venue.state))
+        for (city, state), area_venues in by_area:
+            area_venues = list(area_venues)
+            if upcoming_shows is not None:
+                for venue in area_venues:
+                    venue.num_upcoming_shows = upcoming_shows.get(venue.id, 0)
+            yield {'city': city, 'state': state, 'venues': area_venues}
+
+    return stream_template('pages/venues.html', areas=areas())
+
+
+@bp.route('/venues/search', methods=['GET', 'POST'])
+@ratelimit.limited('search')
+@query_budget(2)
+def search_venues():
+
+    search_term = request.values.get('search_term', '')
+    filters = facets.parse_filters(request.args)
+    return render_template('pages/search_venues.html',
+                           results=search('venues', search_term, filters),
+                           search_term=search_term,
+                           filters=filters)
+
+
+@bp.route('/venues/<int:venue_id>')
+@query_budget(6)
+def show_venue(venue_id):
+
+    venue = profiles.load(profiles.VENUE, venue_id)
+    if venue is None:
+        abort(404)
+    return render_template('pages/show_venue.html', venue=profiles.split_shows(venue))
+
+
+#  Create Venue
+#  ----------------------------------------------------------------
+
+
+@bp.route('/venues/create', methods=['GET'])
+def create_venue_form():
+    form = VenueForm()
+    return render_template('forms/new_venue.html', form=form)
+
+
+@bp.route('/venues/create', methods=['POST'])
+@ratelimit.limited('write')
+def create_venue_submission():
+
+    venue = Venue(name=request.form.get('name'),
+                  city=request.form.get('city'),
+                  state=request.form.get('state'),
+                  address=request.form.get('address'),
+                  phone=request.form.get('phone'),
+                  image_link=request.form.get('image_link'),
+                  website=request.form.get('website'),
+                  facebook_link=request.form.get('facebook_link'),
+                  seeking_talent=request.form.get('seeking_talent'),
+                  seeking_description=request.form.get('seeking_description'))
+    venue.geocode()
+
+    for genre_name in request.form.getlist('genres'):
+        venue.genres.append(VenueGenre(genre_name=genre_name))
+
+    try:
+        db.session.add(venue)
+        db.session.commit()
+        venue_changed(venue.id)
+        flash('Venue ' + request.form['name'] + ' was successfully listed!')
+    except:
+        db.session.rollback()
+        current_app.logger.exception('Venue could not be created')
+        flash('An error occurred. Venue ' + request.form['name'] + ' could not be listed.')
+    finally:
+        db.session.close()
+
+    return render_template('pages/home.html')
+
+
+#  Update
+#  ----------------------------------------------------------------
+
+
+@bp.route('/venues/<int:venue_id>/edit', methods=['GET'])
+@query_budget(2)
+def edit_venue(venue_id):
+    venue = identity.entities.get_or_404(identity.VENUE, venue_id)
+    genres = list(venue.genres)
+
+    form = VenueForm()
+    form.name.default = venue.name
+    form.city.default = venue.city
+    form.state.default = venue.state
+    form.address.default = venue.address
+    form.phone.default = venue.phone
+    form.genres.default = genres
+    form.image_link.default = venue.image_link
+    form.website.default = venue.website
+    form.facebook_link.default = venue.facebook_link
+    form.seeking_talent.default = venue.seeking_talent
+    form.seeking_description.default = venue.seeking_description
+    form.process()
+
+    return render_template('forms/edit_venue.html', form=form, venue=venue)
+
+
+@bp.route('/venues/<int:venue_id>/edit', methods=['POST'])
+@ratelimit.limited('write')
+def edit_venue_submission(venue_id):
+
+    try:
+        VenueGenre.query.filter(VenueGenre.venue_id == venue_id).delete()
+
+        venue = Venue.query.get(venue_id)
+
+        is_seeking_talent_checked = request.form.get('seeking_talent') != None
+        seeking_talent = is_seeking_talent_checked if venue.seeking_talent != is_seeking_talent_checked else venue.seeking_talent
+
+        venue.name = request.form.get('name', venue.name)
+        venue.city = request.form.get('city', venue.city)
+        venue.state = request.form.get('state', venue.state)
+        venue.phone = request.form.get('phone', venue.phone)
+        venue.image_link = request.form.get('image_link', venue.image_link)
+        venue.website = request.form.get('website', venue.website)
+        venue.facebook_link = request.form.get('facebook_link', venue.facebook_link)
+        venue.seeking_talent = seeking_talent
+        venue.seeking_description = request.form.get('seeking_description',
+                                                     venue.seeking_description)
+        venue.geocode()
+
+        for genre_name in request.form.getlist('genres'):
+            venue.genres.append(VenueGenre(genre_name=genre_name))
+
+        db.session.commit()
+        venue_changed(venue_id)
+
+    except:
+        db.session.rollback()
+        current_app.logger.exception('Venue could not be updated', extra={'venue_id': venue_id})
+    finally:
+        db.session.close()
+
+    return redirect(url_for('venues.show_venue', venue_id=venue_id))
+
+
+#  Delete
+#  ----------------------------------------------------------------
+
+
+@bp.route('/venues/<int:venue_id>', methods=['DELETE'])
+@ratelimit.limited('write')
+def delete_venue(venue_id):
+    participants = profiles.show_participants(venue_ids=[venue_id])
+    bulk_delete(Venue, [venue_id])
+    entities_deleted(venue_ids=[venue_id], participants=participants)
+    return jsonify({"redirect_to": url_for('index')})
+
+
+@bp.route('/venues', methods=['DELETE'])
+@ratelimit.limited('write')
+def delete_venues():
+    ids = parse_id_list()
+    participants = profiles.show_participants(venue_ids=ids)
+    deleted = bulk_delete(Venue, ids) if ids else 0
+    entities_deleted(venue_ids=ids, participants=participants)
+    return jsonify({"deleted": deleted})
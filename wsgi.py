@@ -0,0 +1,11 @@
+#----------------------------------------------------------------------------#
+# Production WSGI entrypoint.
+#----------------------------------------------------------------------------#
+#  gunicorn -c gunicorn.conf.py wsgi:app
+#
+#  Settings come from config_production.py unless FYYUR_CONFIG names another module.
+import os
+
+from factory import create_app
+
+app = create_app(os.environ.get('FYYUR_CONFIG', 'config_production'))